@@ -10,6 +10,7 @@ class ClaudeProvider(BaseAIProvider):
     def __init__(self):
         self.client = None
         self.model = None
+        self.api_base = None
         self.default_model = 'claude-3-5-sonnet-latest'
         
     async def initialize(self, **kwargs):
@@ -22,13 +23,18 @@ class ClaudeProvider(BaseAIProvider):
         api_base = os.getenv('CLAUDE_API_BASE', '').strip()
         if api_base:
             logger.info(f"使用自定义Claude API基础URL: {api_base}")
-            self.client = anthropic.Anthropic(
-                api_key=api_key,
-                base_url=api_base
-            )
         else:
             # 使用默认URL
-            self.client = anthropic.Anthropic(api_key=api_key)
+            api_base = 'https://api.anthropic.com'
+
+        # 使用异步客户端，流式输出期间不阻塞事件循环；重试统一由 AI 网关处理，关闭 SDK 内部的重试
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            base_url=api_base,
+            http_client=kwargs.get('http_client'),
+            max_retries=0
+        )
+        self.api_base = api_base
             
         self.model = kwargs.get('model', self.default_model)
         
@@ -42,10 +48,8 @@ class ClaudeProvider(BaseAIProvider):
             if not self.client:
                 await self.initialize(**kwargs)
                 
-            # 构建消息列表
+            # 构建消息列表，Claude 的系统提示词通过 system 参数传入
             messages = []
-            if prompt:
-                messages.append({"role": "system", "content": prompt})
             
             # 如果有图片，需要添加到消息中
             if images and len(images) > 0:
@@ -77,18 +81,21 @@ class ClaudeProvider(BaseAIProvider):
                 messages.append({"role": "user", "content": message})
             
             # 使用流式输出 - 按照官方文档正确实现
-            with self.client.messages.stream(
+            stream_kwargs = {"system": prompt} if prompt else {}
+            async with self.client.messages.stream(
                 model=self.model,
                 max_tokens=4096,
-                messages=messages
+                messages=messages,
+                **stream_kwargs
             ) as stream:
                 # 使用专用的text_stream迭代器直接获取文本
                 full_response = ""
-                for text in stream.text_stream:
+                async for text in stream.text_stream:
                     full_response += text
         
             return full_response
             
         except Exception as e:
             logger.error(f"Claude API 调用失败: {str(e)}")
-            return f"AI处理失败: {str(e)}" 
\ No newline at end of file
+            # 交给 AI 网关判断是否重试，调用方保留原文
+            raise 
\ No newline at end of file
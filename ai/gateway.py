@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+from utils.rate_limit import TokenBucket
+from .base import BaseAIProvider
+from utils.constants import (
+    AI_MAX_CONCURRENCY, AI_REQUESTS_PER_MINUTE, AI_MAX_RETRIES, AI_MAX_BACKOFF,
+    AI_BREAKER_THRESHOLD, AI_BREAKER_COOLDOWN
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 可以重试的HTTP状态码，529 为 Claude 过载
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class AIUnavailableError(Exception):
+    """AI提供者暂时不可用（熔断中或重试后仍然失败）"""
+
+
+def _status_code(error):
+    for attr in ('status_code', 'code', 'status'):
+        value = getattr(error, attr, None)
+        try:
+            if value is not None:
+                return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _retry_after(error):
+    """从错误响应的 Retry-After 头中读取需要等待的秒数"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if _status_code(error) in RETRYABLE_STATUS:
+        return True
+    # 各SDK的连接错误、超时错误没有共同的基类
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connection' in name or name in ('ServiceUnavailable', 'ResourceExhausted')
+
+
+class _ProviderState:
+    def __init__(self, name):
+        prefix = name.upper()
+        self.name = name
+        self.concurrency = int(os.getenv(f'{prefix}_MAX_CONCURRENCY', AI_MAX_CONCURRENCY))
+        self.base_rate = float(os.getenv(f'{prefix}_REQUESTS_PER_MINUTE', AI_REQUESTS_PER_MINUTE)) / 60
+        self.slots = asyncio.Semaphore(max(1, self.concurrency))
+        self.bucket = TokenBucket(self.base_rate, max(1, self.concurrency))
+        self.paused_until = 0
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+
+class AIGateway:
+    """
+    所有AI请求的统一入口
+
+    - 每个提供商独立的并发上限和每分钟请求数上限，可用 <提供商>_MAX_CONCURRENCY、
+      <提供商>_REQUESTS_PER_MINUTE 单独配置
+    - 遇到限流或服务端错误时按 Retry-After（没有时指数退避）等待后重试，
+      限流时同时降低该提供商的请求速率，之后逐步恢复
+    - 连续失败达到阈值后熔断，冷却期内直接抛出 AIUnavailableError，冷却结束后放行一个请求试探
+    """
+
+    def __init__(self, max_retries=AI_MAX_RETRIES, max_backoff=AI_MAX_BACKOFF,
+                 breaker_threshold=AI_BREAKER_THRESHOLD, breaker_cooldown=AI_BREAKER_COOLDOWN):
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._states = {}
+
+    def _state(self, name):
+        state = self._states.get(name)
+        if state is None:
+            state = _ProviderState(name)
+            self._states[name] = state
+        return state
+
+    def is_available(self, name):
+        """提供商当前是否接受请求（未熔断或冷却已结束）"""
+        state = self._state(name)
+        if state.opened_at is None:
+            return True
+        return time.monotonic() - state.opened_at >= self.breaker_cooldown and not state.probing
+
+    async def call(self, name, func, *args, **kwargs):
+        """
+        通过网关调用AI提供者
+
+        Args:
+            name: 提供商名称
+            func: 调用AI的协程函数
+            *args, **kwargs: 传给 func 的参数
+
+        Returns:
+            func 的返回值
+        """
+        state = self._state(name)
+        probe = self._admit(state)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = await self._call_once(state, func, *args, **kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if not _is_retryable(e):
+                        # 试探请求无论因何失败都重新开始冷却，否则熔断会一直停在可试探状态
+                        if probe:
+                            self._on_failure(state)
+                        raise
+                    attempt += 1
+                    delay = self._on_retryable_error(state, e, attempt)
+                    if attempt > self.max_retries:
+                        self._on_failure(state)
+                        raise AIUnavailableError(f'{name} 请求失败: {str(e)}') from e
+                    metrics.incr(f'ai_gateway.{name}.retries')
+                    logger.warning(f'{name} 请求失败: {str(e)}，{delay:.1f}s 后第 {attempt} 次重试')
+                    await asyncio.sleep(delay)
+                    continue
+                self._on_success(state)
+                return result
+        finally:
+            if probe:
+                state.probing = False
+
+    def _admit(self, state):
+        """检查熔断状态，返回本次请求是否为冷却后的试探请求"""
+        if state.opened_at is None:
+            return False
+        if time.monotonic() - state.opened_at < self.breaker_cooldown or state.probing:
+            metrics.incr(f'ai_gateway.{state.name}.rejected')
+            raise AIUnavailableError(f'{state.name} 暂时不可用（熔断中）')
+        state.probing = True
+        logger.info(f'{state.name} 熔断冷却结束，发送试探请求')
+        return True
+
+    async def _call_once(self, state, func, *args, **kwargs):
+        queued = time.perf_counter()
+        async with state.slots:
+            pause = state.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            delay = state.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            metrics.observe(f'ai_gateway.{state.name}.queue_time', time.perf_counter() - queued)
+            metrics.incr(f'ai_gateway.{state.name}.calls')
+            with metrics.timer(f'ai_gateway.{state.name}.latency'):
+                return await func(*args, **kwargs)
+
+    def _on_retryable_error(self, state, error, attempt):
+        retry_after = _retry_after(error)
+        if _status_code(error) == 429 or type(error).__name__ == 'ResourceExhausted':
+            metrics.incr(f'ai_gateway.{state.name}.rate_limited')
+            # 被限流时降低请求速率
+            if state.bucket.rate > 0:
+                state.bucket.rate = max(state.base_rate / 16, state.bucket.rate / 2)
+        if retry_after is not None:
+            delay = retry_after
+            # 其他请求也等到限制解除
+            state.paused_until = max(state.paused_until, time.monotonic() + retry_after)
+        else:
+            delay = min(self.max_backoff, 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        return min(delay, self.max_backoff)
+
+    def _on_success(self, state):
+        if state.opened_at is not None:
+            logger.info(f'{state.name} 已恢复')
+        state.failures = 0
+        state.opened_at = None
+        # 逐步恢复请求速率
+        if state.bucket.rate < state.base_rate:
+            state.bucket.rate = min(state.base_rate, state.bucket.rate + state.base_rate / 10)
+        metrics.set_gauge(f'ai_gateway.{state.name}.open', 0)
+
+    def _on_failure(self, state):
+        state.failures += 1
+        metrics.incr(f'ai_gateway.{state.name}.failures')
+        if state.opened_at is not None or state.failures >= self.breaker_threshold:
+            state.opened_at = time.monotonic()
+            metrics.incr(f'ai_gateway.{state.name}.breaker_opened')
+            metrics.set_gauge(f'ai_gateway.{state.name}.open', 1)
+            logger.error(
+                f'{state.name} 连续失败 {state.failures} 次，熔断 {self.breaker_cooldown:g}s，'
+                f'期间AI处理直接跳过'
+            )
+
+
+class GatewayProvider(BaseAIProvider):
+    """通过网关调用的AI提供者，接口与被包装的提供者一致"""
+
+    def __init__(self, name, provider):
+        self.name = name
+        self.provider = provider
+
+    async def initialize(self, **kwargs) -> None:
+        await self.provider.initialize(**kwargs)
+
+    async def process_message(self, message, prompt=None, images=None, **kwargs) -> str:
+        return await ai_gateway.call(
+            self.name, self.provider.process_message, message, prompt=prompt, images=images, **kwargs
+        )
+
+
+# 创建全局实例
+ai_gateway = AIGateway()
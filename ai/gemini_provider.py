@@ -24,6 +24,7 @@ class GeminiProvider(BaseAIProvider):
         self.model = None
         self.model_name = None  # 添加model_name属性
         self.provider = None
+        self.api_base = None
         
     async def initialize(self, **kwargs):
         """初始化Gemini客户端"""
@@ -34,6 +35,7 @@ class GeminiProvider(BaseAIProvider):
             logger.info(f"检测到GEMINI_API_BASE环境变量: {api_base}，使用兼容OpenAI的接口")
             self.provider = GeminiOpenAIProvider()
             await self.provider.initialize(**kwargs)
+            self.api_base = self.provider.api_base
             return
             
         # 原来的Gemini API初始化代码
@@ -91,7 +93,7 @@ class GeminiProvider(BaseAIProvider):
             if self.provider:
                 return await self.provider.process_message(message, prompt, images, **kwargs)
                 
-            # 使用Gemini API的流式处理
+            # 使用Gemini API的异步流式处理，等待响应期间不阻塞事件循环
             logger.info(f"实际使用的Gemini模型: {self.model_name}")
 
             # 组合提示词和消息
@@ -124,27 +126,27 @@ class GeminiProvider(BaseAIProvider):
                             logger.error(f"处理单张图片时出错: {str(img_error)}")
                     
                     # 使用流式输出 - 不设置额外参数，使用默认值
-                    response_stream = self.model.generate_content(
+                    response_stream = await self.model.generate_content_async(
                         contents,
                         stream=True
                     )
                 except Exception as e:
                     logger.error(f"Gemini处理带图片消息时出错: {str(e)}")
                     # 如果处理图片失败，尝试只用文本
-                    response_stream = self.model.generate_content(
+                    response_stream = await self.model.generate_content_async(
                         [{"role": "user", "parts": [{"text": user_message}]}],
                         stream=True
                     )
             else:
                 # 无图片，使用流式输出
-                response_stream = self.model.generate_content(
+                response_stream = await self.model.generate_content_async(
                     [{"role": "user", "parts": [{"text": user_message}]}],
                     stream=True
                 )
             
             # 收集完整响应
             full_response = ""
-            for chunk in response_stream:
+            async for chunk in response_stream:
                 if hasattr(chunk, 'text'):
                     full_response += chunk.text
             
@@ -152,4 +154,5 @@ class GeminiProvider(BaseAIProvider):
             
         except Exception as e:
             logger.error(f"Gemini处理消息时出错: {str(e)}")
-            return f"AI处理失败: {str(e)}" 
\ No newline at end of file
+            # 交给 AI 网关判断是否重试，调用方保留原文
+            raise 
\ No newline at end of file
@@ -23,6 +23,7 @@ class OpenAIBaseProvider(BaseAIProvider):
         self.default_api_base = default_api_base
         self.client = None
         self.model = None
+        self.api_base = None
 
     async def initialize(self, **kwargs) -> None:
         """初始化OpenAI客户端"""
@@ -33,10 +34,15 @@ class OpenAIBaseProvider(BaseAIProvider):
 
             api_base = os.getenv(f'{self.env_prefix}_API_BASE', '').strip() or self.default_api_base
 
+            # http_client 为注册表共用的连接池，未提供时由 AsyncOpenAI 自行创建；
+            # 重试统一由 AI 网关处理，关闭 SDK 内部的重试
             self.client = AsyncOpenAI(
                 api_key=api_key,
-                base_url=api_base
+                base_url=api_base,
+                http_client=kwargs.get('http_client'),
+                max_retries=0
             )
+            self.api_base = api_base
 
             self.model = kwargs.get('model', self.default_model)
             logger.info(f"初始化OpenAI模型: {self.model}")
@@ -121,5 +127,6 @@ class OpenAIBaseProvider(BaseAIProvider):
             return collected_content
 
         except Exception as e:
-            logger.error(f"{self.env_prefix} API 调用失败: {str(e)}", exc_info=True)
-            return f"AI处理失败: {str(e)}"
+            logger.error(f"{self.env_prefix} API 调用失败: {str(e)}")
+            # 交给 AI 网关判断是否重试，调用方保留原文
+            raise
@@ -62,5 +62,6 @@ class OpenAIProvider(OpenAIBaseProvider):
             return response.choices[0].message.content
             
         except Exception as e:
-            logger.error(f"OpenAI处理消息时出错: {str(e)}", exc_info=True)
-            return f"AI处理失败: {str(e)}"
\ No newline at end of file
+            logger.error(f"OpenAI处理消息时出错: {str(e)}")
+            # 交给 AI 网关判断是否重试，调用方保留原文
+            raise
\ No newline at end of file
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+from utils.settings import load_ai_models, AI_MODELS_PATH
+from utils.constants import (
+    AI_MODELS_RELOAD_INTERVAL, AI_HTTP_MAX_CONNECTIONS, AI_HTTP_KEEPALIVE_EXPIRY
+)
+from utils.metrics import metrics
+from .openai_provider import OpenAIProvider
+from .gemini_provider import GeminiProvider
+from .deepseek_provider import DeepSeekProvider
+from .qwen_provider import QwenProvider
+from .grok_provider import GrokProvider
+from .claude_provider import ClaudeProvider
+
+logger = logging.getLogger(__name__)
+
+# 配置文件中的提供商名称对应的实现，环境变量前缀为名称的大写形式
+PROVIDER_CLASSES = {
+    'openai': OpenAIProvider,
+    'gemini': GeminiProvider,
+    'deepseek': DeepSeekProvider,
+    'qwen': QwenProvider,
+    'grok': GrokProvider,
+    'claude': ClaudeProvider,
+}
+
+
+class ProviderRegistry:
+    """
+    AI提供者注册表
+
+    - 模型配置只在 config/ai_models.json 修改后重新读取，按模型名直接查找提供商
+    - 每个(提供商, 模型, API地址)只创建并初始化一个提供者，之后的消息复用同一个客户端
+    - OpenAI 兼容的提供者和 Claude 共用一个保持长连接的 HTTP 连接池，避免每条消息重新建立 TLS 连接
+    """
+
+    def __init__(self, path=AI_MODELS_PATH, reload_interval=AI_MODELS_RELOAD_INTERVAL):
+        self._path = path
+        self.reload_interval = reload_interval
+        self._models = {}
+        self._mtime = None
+        self._checked = 0
+        self._providers = {}
+        self._locks = {}
+        self._http = None
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self._path)
+        except OSError:
+            mtime = 0
+        if mtime == self._mtime:
+            return
+        models = {}
+        for provider_name, model_list in load_ai_models(type="dict").items():
+            for model in model_list:
+                # 同一模型出现在多个提供商下时使用第一个
+                models.setdefault(model, provider_name)
+        if self._mtime is not None:
+            logger.info(f'AI模型配置已修改，重新加载: 共 {len(models)} 个模型')
+        self._models = models
+        self._mtime = mtime
+
+    def provider_name(self, model):
+        """模型所属的提供商名称，不支持的模型返回None"""
+        self._maybe_reload()
+        return self._models.get(model)
+
+    def http_client(self):
+        """AI客户端共用的 HTTP 连接池"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+                ),
+                follow_redirects=True
+            )
+        return self._http
+
+    async def get(self, model):
+        """
+        获取已初始化的AI提供者
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            BaseAIProvider: 提供者实例
+        """
+        provider_name = self.provider_name(model)
+        provider_class = PROVIDER_CLASSES.get(provider_name)
+        if provider_class is None:
+            raise ValueError(f"不支持的模型: {model}")
+
+        api_base = os.getenv(f'{provider_name.upper()}_API_BASE', '').strip()
+        key = (provider_name, model, api_base)
+        provider = self._providers.get(key)
+        if provider is not None:
+            metrics.incr('ai_registry.hits')
+            return provider
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                metrics.incr('ai_registry.misses')
+                provider = provider_class()
+                await provider.initialize(model=model, http_client=self.http_client())
+                self._providers[key] = provider
+                logger.info(f'已创建AI提供者: {provider_name}/{model}')
+        return provider
+
+    async def warm_up(self, models):
+        """
+        启动时预先初始化提供者并建立连接
+
+        Args:
+            models: 需要预热的模型名称列表
+        """
+        for model in dict.fromkeys(model for model in models if model):
+            try:
+                provider = await self.get(model)
+            except Exception as e:
+                logger.warning(f'预热AI模型 {model} 失败: {str(e)}')
+                continue
+            # 只有使用共用连接池的提供者会设置 api_base
+            api_base = getattr(provider, 'api_base', None)
+            if not api_base:
+                continue
+            try:
+                # 任意请求即可建立 TLS 连接并放入连接池，不关心响应内容
+                await self.http_client().head(api_base, timeout=10)
+            except Exception as e:
+                logger.debug(f'预先连接 {api_base} 失败: {str(e)}')
+        logger.info(f'AI提供者预热完成，已初始化 {len(self._providers)} 个')
+
+    async def close(self):
+        """关闭共用的 HTTP 连接池"""
+        self._providers.clear()
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+
+# 创建全局实例
+provider_registry = ProviderRegistry()
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.constants import (
+    AI_CACHE_ENABLED, AI_CACHE_PATH, AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES, AI_CACHE_MEMORY_SIZE
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 模型没有给出有效回答时返回的文本，不缓存
+UNCACHEABLE_PREFIXES = ('模型未能生成有效回答',)
+
+
+def cache_key(model, prompt, message, images=None):
+    """
+    AI请求的缓存键
+
+    Args:
+        model: 模型名称
+        prompt: 替换完占位符后的提示词
+        message: 消息文本
+        images: 图片列表，每个图片是包含 data 和 mime_type 的字典
+
+    Returns:
+        str: 请求内容的 sha256
+    """
+    image_digests = [
+        hashlib.sha256(image['data'].encode('utf-8')).hexdigest()
+        for image in images or []
+    ]
+    payload = json.dumps([model, prompt or '', message or '', image_digests], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _SQLiteStore:
+    """AI结果的磁盘存储，所有操作都在线程中执行"""
+
+    def __init__(self, path, max_entries):
+        self._path = path
+        self._max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS ai_cache ('
+                'key TEXT PRIMARY KEY, model TEXT, result TEXT, latency REAL, '
+                'created REAL, expires REAL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_created ON ai_cache (created)')
+            self._conn.execute('DELETE FROM ai_cache WHERE expires <= ?', (time.time(),))
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT result, latency, expires FROM ai_cache WHERE key = ? AND expires > ?',
+                (key, time.time())
+            ).fetchone()
+        return row
+
+    def put(self, key, model, result, latency, ttl):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO ai_cache (key, model, result, latency, created, expires) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, result, latency, now, now + ttl)
+            )
+            self._writes += 1
+            # 每写入一定次数清理一次过期和超出上限的记录
+            if self._writes % 100 == 1:
+                conn.execute('DELETE FROM ai_cache WHERE expires <= ?', (now,))
+                conn.execute(
+                    'DELETE FROM ai_cache WHERE key IN ('
+                    'SELECT key FROM ai_cache ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                    (self._max_entries,)
+                )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AIResultCache:
+    """
+    AI处理结果缓存
+
+    - 按(模型, 提示词, 消息文本, 图片摘要)缓存AI返回的文本，同样的请求不再重复调用AI
+    - 内存中保留最近使用的结果，其余保存在 SQLite 中，重启后仍然有效，超过有效期或条数上限的记录会被清理
+    - 相同的请求同时到达时只调用一次AI，其他请求等待同一个结果
+    """
+
+    def __init__(self, enabled=AI_CACHE_ENABLED, path=AI_CACHE_PATH, ttl=AI_CACHE_TTL,
+                 max_entries=AI_CACHE_MAX_ENTRIES, memory_size=AI_CACHE_MEMORY_SIZE):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._memory_size = memory_size
+        self._memory = OrderedDict()
+        self._store = _SQLiteStore(path, max_entries)
+        self._inflight = {}
+
+    async def get_or_compute(self, model, prompt, message, images, compute):
+        """
+        获取缓存的AI结果，没有时调用 compute 并缓存结果
+
+        Args:
+            model: 模型名称
+            prompt: 替换完占位符后的提示词
+            message: 消息文本
+            images: 图片列表
+            compute: 实际调用AI的协程函数，无参数
+
+        Returns:
+            str: AI处理结果
+        """
+        if not self.enabled or self.ttl <= 0:
+            return await compute()
+
+        key = cache_key(model, prompt, message, images)
+        cached = await self._get(key)
+        if cached is not None:
+            result, latency = cached
+            self._record_hit(latency)
+            return result
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            metrics.incr('ai_cache.inflight_hits')
+            try:
+                result, latency = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 发起请求的一方被取消，自己重新请求
+                return await self.get_or_compute(model, prompt, message, images, compute)
+            self._record_hit(latency)
+            return result
+
+        metrics.incr('ai_cache.misses')
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            started = time.perf_counter()
+            result = await compute()
+            latency = time.perf_counter() - started
+            pending.set_result((result, latency))
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except BaseException as e:
+            pending.set_exception(e)
+            # 没有其他等待方时避免 "Future exception was never retrieved"
+            pending.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if result and not result.startswith(UNCACHEABLE_PREFIXES):
+            await self._put(key, model, result, latency)
+        return result
+
+    async def _get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            result, latency, expires = entry
+            if expires > time.time():
+                self._memory.move_to_end(key)
+                metrics.incr('ai_cache.memory_hits')
+                return result, latency
+            del self._memory[key]
+        try:
+            row = await asyncio.to_thread(self._store.get, key)
+        except sqlite3.Error as e:
+            logger.error(f'读取AI结果缓存失败: {str(e)}')
+            return None
+        if row is None:
+            return None
+        metrics.incr('ai_cache.disk_hits')
+        result, latency, expires = row
+        self._remember(key, result, latency, expires)
+        return result, latency
+
+    async def _put(self, key, model, result, latency):
+        self._remember(key, result, latency)
+        try:
+            await asyncio.to_thread(self._store.put, key, model, result, latency, self.ttl)
+        except sqlite3.Error as e:
+            logger.error(f'写入AI结果缓存失败: {str(e)}')
+
+    def _remember(self, key, result, latency, expires=None):
+        self._memory[key] = (result, latency, expires or time.time() + self.ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, latency):
+        metrics.incr('ai_cache.hits')
+        metrics.incr('ai_cache.saved_seconds', latency or 0)
+        hits = metrics.counter('ai_cache.hits')
+        total = hits + metrics.counter('ai_cache.misses')
+        logger.info(
+            f'AI结果缓存命中，节省约 {latency or 0:.1f}s '
+            f'(命中率 {hits / total:.0%}，累计节省 {metrics.counter("ai_cache.saved_seconds"):.0f}s)'
+        )
+
+    def close(self):
+        self._store.close()
+
+
+# 创建全局实例
+ai_result_cache = AIResultCache()
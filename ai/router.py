@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+
+from ai import get_ai_provider
+from utils.constants import (
+    AI_HEDGE_PERCENTILE, AI_HEDGE_DELAY, AI_HEDGE_MIN_SAMPLES, AI_DEADLINE
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def parse_models(primary, fallbacks=None):
+    """
+    主模型和备用模型列表
+
+    Args:
+        primary: 主模型
+        fallbacks: 备用模型，多个用逗号分隔
+
+    Returns:
+        list: 去重后的模型列表，主模型在前
+    """
+    models = [primary] + [model.strip() for model in (fallbacks or '').split(',')]
+    return list(dict.fromkeys(model for model in models if model))
+
+
+class AIRouter:
+    """
+    AI模型路由
+
+    - 主模型的响应时间超过其最近耗时的 AI_HEDGE_PERCENTILE 分位时，同时向备用模型发送请求，
+      先完成的结果生效，另一个请求取消
+    - 主模型出错时立即改用备用模型，此后不再对冲
+    - 超过 AI_DEADLINE 仍没有结果时抛出 asyncio.TimeoutError，调用方保留原文
+    """
+
+    def __init__(self, percentile=AI_HEDGE_PERCENTILE, default_delay=AI_HEDGE_DELAY,
+                 min_samples=AI_HEDGE_MIN_SAMPLES, deadline=AI_DEADLINE):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.deadline = deadline
+
+    def hedge_delay(self, model):
+        """主模型多久没有响应时向备用模型发送请求"""
+        name = f'ai_router.{model}.latency'
+        if metrics.timing_count(name) < self.min_samples:
+            return self.default_delay
+        return metrics.percentile(name, self.percentile)
+
+    async def process_message(self, models, message, prompt=None, images=None):
+        """
+        按路由规则处理消息
+
+        Args:
+            models: 模型列表，第一个为主模型，其余为备用模型
+            message: 消息文本
+            prompt: 提示词
+            images: 图片列表
+
+        Returns:
+            str: 最先完成的模型的结果
+        """
+        if len(models) == 1 or self.deadline <= 0:
+            call = self._call(models[0], message, prompt, images)
+            if self.deadline <= 0:
+                return await call
+            return await asyncio.wait_for(call, self.deadline)
+
+        started = time.monotonic()
+        remaining = list(models)
+        running = {}
+        hedged = False
+        last_error = None
+
+        def launch():
+            model = remaining.pop(0)
+            task = asyncio.create_task(self._call(model, message, prompt, images))
+            running[task] = model
+            return task
+
+        primary_task = launch()
+        primary = running[primary_task]
+        try:
+            while True:
+                if not running:
+                    # 已发出的请求都失败了，改用下一个备用模型
+                    if not remaining:
+                        raise last_error
+                    model = running[launch()]
+                    metrics.incr('ai_router.failovers')
+                    logger.info(f'改用备用AI模型 {model}')
+
+                elapsed = time.monotonic() - started
+                left = self.deadline - elapsed
+                if left <= 0:
+                    break
+                # 只在主模型仍是唯一进行中的请求时对冲，故障转移后的备用模型不按主模型的耗时对冲
+                hedging = not hedged and remaining and list(running) == [primary_task]
+                timeout = min(left, max(0, self.hedge_delay(primary) - elapsed)) if hedging else left
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if hedging and self.hedge_delay(primary) - (time.monotonic() - started) <= 0:
+                        hedged = True
+                        model = running[launch()]
+                        metrics.incr('ai_router.hedges')
+                        logger.info(f'AI模型 {primary} 响应较慢，同时请求备用模型 {model}')
+                    continue
+
+                for task in done:
+                    model = running.pop(task)
+                    if task.exception() is None:
+                        self._record_win(model, running.values(), primary)
+                        return task.result()
+                    last_error = task.exception()
+                    metrics.incr(f'ai_router.{model}.errors')
+                    logger.warning(f'AI模型 {model} 处理失败: {str(last_error)}')
+        finally:
+            for task in running:
+                task.cancel()
+
+        metrics.incr('ai_router.deadline_exceeded')
+        raise asyncio.TimeoutError(f'AI处理超过 {self.deadline:g}s 仍未完成')
+
+    async def _call(self, model, message, prompt, images):
+        provider = await get_ai_provider(model)
+        started = time.perf_counter()
+        result = await provider.process_message(
+            message=message,
+            prompt=prompt,
+            model=model,
+            images=images
+        )
+        metrics.observe(f'ai_router.{model}.latency', time.perf_counter() - started)
+        return result
+
+    def _record_win(self, winner, losers, primary):
+        metrics.incr(f'ai_router.{winner}.wins')
+        for model in losers:
+            metrics.incr(f'ai_router.{model}.losses')
+        if winner != primary:
+            logger.info(f'备用AI模型 {winner} 先完成处理')
+
+
+# 创建全局实例
+ai_router = AIRouter()
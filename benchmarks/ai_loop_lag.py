@@ -0,0 +1,131 @@
+"""
+AI 流式输出事件循环延迟基准测试
+
+用真实的 ClaudeProvider 和 GeminiProvider 处理一条消息，客户端换成模拟客户端：
+流式返回若干段文本，每段间隔固定时间（默认 20 段、每段 100ms）。
+同时在事件循环中运行每 10ms 唤醒一次的探测任务，统计探测任务的最大延迟和唤醒次数。
+
+对比两种方式：
+- 同步客户端：按修复前的写法在协程中用 for 循环读取同步流（每段阻塞等待）
+- 异步客户端：提供者当前的 async for 写法
+
+用法: python benchmarks/ai_loop_lag.py [段数] [每段间隔ms]
+"""
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.claude_provider import ClaudeProvider
+from ai.gemini_provider import GeminiProvider
+
+PROBE_INTERVAL = 0.01
+
+
+class SyncClaudeClient:
+    """同步的 Anthropic 客户端：每段文本阻塞等待"""
+
+    def __init__(self, chunks, delay):
+        self.messages = SimpleNamespace(stream=self._stream)
+        self.chunks = chunks
+        self.delay = delay
+
+    def _text_stream(self):
+        for i in range(self.chunks):
+            time.sleep(self.delay)
+            yield f'{i} '
+
+    @contextmanager
+    def _stream(self, **kwargs):
+        yield SimpleNamespace(text_stream=self._text_stream())
+
+
+class AsyncClaudeClient(SyncClaudeClient):
+    """异步的 Anthropic 客户端：每段文本异步等待"""
+
+    async def _text_stream(self):
+        for i in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield f'{i} '
+
+    @asynccontextmanager
+    async def _stream(self, **kwargs):
+        yield SimpleNamespace(text_stream=self._text_stream())
+
+
+class AsyncGeminiModel:
+    """异步的 Gemini 模型：generate_content_async 返回异步流"""
+
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def _stream(self):
+        for i in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(text=f'{i} ')
+
+    async def generate_content_async(self, contents, stream=False):
+        return self._stream()
+
+
+async def old_claude_process(client, message):
+    """修复前 ClaudeProvider.process_message 的流式读取部分"""
+    with client.messages.stream(model='stub', max_tokens=4096, messages=[{'role': 'user', 'content': message}]) as stream:
+        full_response = ''
+        for text in stream.text_stream:
+            full_response += text
+    return full_response
+
+
+async def measure(coro):
+    """运行 coro，同时用探测任务测量事件循环延迟，返回 (结果, 最大延迟, 唤醒次数)"""
+    stats = {'lag': 0.0, 'ticks': 0}
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            stats['lag'] = max(stats['lag'], time.perf_counter() - started - PROBE_INTERVAL)
+            stats['ticks'] += 1
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await probe_task
+    return result, stats['lag'], stats['ticks']
+
+
+async def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.1
+    expected = ''.join(f'{i} ' for i in range(chunks))
+    print(f'{chunks} 段文本，每段间隔 {delay * 1000:.0f}ms，探测间隔 {PROBE_INTERVAL * 1000:.0f}ms')
+
+    claude = ClaudeProvider()
+    claude.model = 'stub'
+    claude.client = AsyncClaudeClient(chunks, delay)
+    gemini = GeminiProvider()
+    gemini.model_name = 'stub'
+    gemini.model = AsyncGeminiModel(chunks, delay)
+
+    for name, coro in (
+        ('同步客户端（修复前）', old_claude_process(SyncClaudeClient(chunks, delay), '测试')),
+        ('ClaudeProvider', claude.process_message('测试', prompt='提示词')),
+        ('GeminiProvider', gemini.process_message('测试', prompt='提示词')),
+    ):
+        result, lag, ticks = await measure(coro)
+        assert result == expected, '输出不正确'
+        print(f'{name}: 最大延迟 {lag * 1000:.0f}ms，探测唤醒 {ticks} 次')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+数据库会话基准测试
+
+对比每次调用都新建引擎和会话工厂（旧的 get_session）与共享引擎的 get_session：
+打开会话、执行一次按主键查询、关闭会话。使用临时目录中的 SQLite 数据库。
+
+用法: python benchmarks/db_session.py [次数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmp}/bench.db'
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, Chat, DATABASE_URL, get_engine, get_session
+
+
+def old_get_session():
+    """旧实现：每次调用都创建新的引擎和会话工厂"""
+    engine = create_engine(DATABASE_URL)
+    return sessionmaker(bind=engine)()
+
+
+def run(factory, count):
+    started = time.perf_counter()
+    for i in range(count):
+        session = factory()
+        try:
+            session.get(Chat, i % 100 + 1)
+        finally:
+            session.close()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Base.metadata.create_all(get_engine())
+    session = get_session()
+    session.add_all(Chat(telegram_chat_id=str(i), name=f'chat{i}') for i in range(100))
+    session.commit()
+    session.close()
+
+    before = run(old_get_session, count)
+    after = run(get_session, count)
+    print(f'每次新建引擎: {before:.0f} 会话/秒')
+    print(f'共享引擎:     {after:.0f} 会话/秒 ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
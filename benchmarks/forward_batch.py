@@ -0,0 +1,95 @@
+"""
+用户模式合并转发基准测试
+
+用真实的 IngestionQueue、RuleDispatcher、ForwardBatcher 和发送调度器处理一批消息，
+客户端换成只记录请求的模拟客户端：一个源聊天每 100ms 收到一条消息，
+两条规则分别转发到两个目标聊天。统计实际发出的 forward_messages 请求数、
+每条消息从收到到转发完成的延迟，并检查每个目标收到的消息顺序。
+
+对比三种方式：
+- 不合并（FORWARD_BATCH_WINDOW=0）
+- 合并，但在规则任务中等待转发结果（修复前 user_handler 的写法）
+- 合并，规则任务只把消息加入批次（submit）
+
+用法: python benchmarks/forward_batch.py [消息数]
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.forward_batcher import ForwardBatcher
+from managers.ingestion_queue import IngestionQueue
+from managers.rule_dispatcher import RuleDispatcher
+from utils.constants import SEND_CHAT_RATE, SEND_CHAT_BURST
+
+SOURCE = -1001
+TARGETS = (-2001, -2002)
+INTERVAL = 0.1
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = 0
+        self.received = {target: [] for target in TARGETS}
+
+    async def forward_messages(self, target, ids, source):
+        self.requests += 1
+        self.received[target].extend(ids)
+        return [SimpleNamespace(id=message_id) for message_id in ids]
+
+
+async def run(count, window, wait_in_rule):
+    client = FakeClient()
+    batcher = ForwardBatcher(window=window)
+    queue = IngestionQueue()
+    dispatcher = RuleDispatcher()
+    queue.start()
+    rules = [SimpleNamespace(id=i, target_chat=SimpleNamespace(telegram_chat_id=str(target)))
+             for i, target in enumerate(TARGETS)]
+    latencies = []
+
+    async def handle_rule(rule, message_id, received_at):
+        target = int(rule.target_chat.telegram_chat_id)
+        future = batcher.submit(client, target, message_id, SOURCE)
+        future.add_done_callback(lambda _: latencies.append(time.perf_counter() - received_at))
+        if wait_in_rule:
+            await future
+
+    async def job(message_id, received_at):
+        return dispatcher.start(rules, lambda rule: handle_rule(rule, message_id, received_at))
+
+    started = time.perf_counter()
+    for message_id in range(1, count + 1):
+        received_at = time.perf_counter()
+        await queue.submit(SOURCE, lambda m=message_id, r=received_at: job(m, r))
+        await asyncio.sleep(INTERVAL)
+    await queue.drain()
+    await batcher.drain()
+    elapsed = time.perf_counter() - started
+
+    for target in TARGETS:
+        assert client.received[target] == list(range(1, count + 1)), '转发顺序不正确'
+    latencies.sort()
+    return client.requests, latencies[len(latencies) // 2], latencies[-1], elapsed
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f'{count} 条消息 x {len(TARGETS)} 个目标，每 {INTERVAL * 1000:.0f}ms 一条，'
+          f'每个目标聊天限速 {SEND_CHAT_RATE:g} 条/秒（突发 {SEND_CHAT_BURST}）')
+    for name, window, wait_in_rule in (
+        ('不合并', 0, False),
+        ('合并，规则中等待结果', 1.0, True),
+        ('合并，只加入批次', 1.0, False),
+    ):
+        requests, median, worst, elapsed = await run(count, window, wait_in_rule)
+        print(f'{name}: {requests} 次请求（节省 {count * len(TARGETS) - requests} 次），'
+              f'延迟中位数 {median:.2f}s，最大 {worst:.2f}s，总耗时 {elapsed:.1f}s，顺序正确')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+关键字匹配基准测试
+
+对比逐个检查关键字（旧的 check_keyword_match 循环，不含日志）与编译后的 KeywordMatcher：
+一条规则 10000 个关键字（9900 个普通关键字、100 个正则），消息不命中任何关键字，
+两种方式都需要检查全部关键字。
+
+用法: python benchmarks/keyword_matcher.py [次数]
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.keyword_matcher import KeywordMatcher
+
+MESSAGE = '今日频道更新：新品发布会将在下周举行，欢迎大家关注后续消息，更多详情请查看置顶公告。' * 6
+
+
+def make_keywords():
+    keywords = [
+        SimpleNamespace(keyword=f'关键字{i}', is_regex=False, is_blacklist=True)
+        for i in range(9900)
+    ]
+    keywords += [
+        SimpleNamespace(keyword=rf'编号{i}\d+号', is_regex=True, is_blacklist=True)
+        for i in range(100)
+    ]
+    return keywords
+
+
+def old_match(keywords, message_text):
+    """旧实现：每个关键字单独检查"""
+    for keyword in keywords:
+        if keyword.is_regex:
+            try:
+                if re.search(keyword.keyword, message_text):
+                    return True
+            except re.error:
+                pass
+        elif keyword.keyword.lower() in message_text.lower():
+            return True
+    return False
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    keywords = make_keywords()
+
+    started = time.perf_counter()
+    for _ in range(count):
+        assert not old_match(keywords, MESSAGE)
+    before = (time.perf_counter() - started) / count
+
+    started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    compile_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(count):
+        assert not await matcher.match(MESSAGE)
+    after = (time.perf_counter() - started) / count
+
+    print(f'关键字数 {len(keywords)}，消息长度 {len(MESSAGE)}')
+    print(f'逐个检查:       {before * 1000:.2f}ms/次')
+    print(f'KeywordMatcher: {after * 1000:.3f}ms/次 ({before / after:.0f}x)')
+    print(f'编译耗时:       {compile_time * 1000:.0f}ms（每个规则版本一次）')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+分片下载基准测试
+
+用模拟的客户端代替 Telegram：每次 GetFile 请求固定延迟（默认 50ms），
+比较不同并发连接数下载同一文件的速度，并验证下载中断后再次下载只请求缺少的分片。
+
+用法: python benchmarks/media_download.py [文件大小MB] [请求延迟ms]
+"""
+import asyncio
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.media_downloader import MediaDownloader
+
+
+class FakeClient:
+    """按偏移量返回确定内容的模拟客户端，可以在指定请求数之后失败"""
+
+    def __init__(self, latency, fail_after=None):
+        self.latency = latency
+        self.fail_after = fail_after
+        self.requests = 0
+
+    async def iter_download(self, document, offset, request_size, limit, file_size):
+        self.requests += 1
+        if self.fail_after is not None and self.requests > self.fail_after:
+            raise ConnectionError('模拟连接中断')
+        await asyncio.sleep(self.latency)
+        length = min(request_size, file_size - offset)
+        yield bytes([offset // request_size % 256]) * length
+
+
+def make_message(client, size):
+    return SimpleNamespace(
+        id=1,
+        chat_id=1,
+        client=client,
+        document=SimpleNamespace(id=42, size=size),
+        file=SimpleNamespace(name='bench.bin', ext='.bin'),
+        date=datetime.datetime.now()
+    )
+
+
+def verify(path, size, part_size):
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert len(data) == size
+    for offset in range(0, size, part_size):
+        assert data[offset] == offset // part_size % 256
+
+
+async def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 50 * 1024 * 1024
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05
+    directory = tempfile.mkdtemp()
+    try:
+        print(f'文件 {size / 1024 / 1024:.0f}MB，每次请求延迟 {latency * 1000:.0f}ms')
+        for connections in (1, 4, 8):
+            downloader = MediaDownloader(connections=connections)
+            client = FakeClient(latency)
+            path = os.path.join(directory, f'bench_{connections}.bin')
+            started = time.perf_counter()
+            await downloader._download_parts(make_message(client, size), path, size)
+            elapsed = time.perf_counter() - started
+            verify(path, size, downloader.part_size)
+            os.remove(path)
+            print(f'{connections} 个连接: {size / 1024 / 1024 / elapsed:.1f}MB/s ({client.requests} 次请求)')
+
+        # 第一次下载在完成一半分片后中断，第二次只请求剩下的分片
+        downloader = MediaDownloader(connections=4, retries=0)
+        part_count = (size + downloader.part_size - 1) // downloader.part_size
+        path = os.path.join(directory, 'resume.bin')
+        first = FakeClient(latency, fail_after=part_count // 2)
+        try:
+            await downloader._download_parts(make_message(first, size), path, size)
+        except ConnectionError:
+            pass
+        assert os.path.exists(path + '.part') and os.path.exists(path + '.part.done')
+        second = FakeClient(latency)
+        await downloader._download_parts(make_message(second, size), path, size)
+        verify(path, size, downloader.part_size)
+        assert not os.path.exists(path + '.part.done')
+        print(f'续传: 共 {part_count} 个分片，中断后再次下载请求 {second.requests} 个，文件内容正确')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
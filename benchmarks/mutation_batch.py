@@ -0,0 +1,110 @@
+"""
+删除和编辑合并基准测试
+
+用真实的 IngestionQueue、RuleDispatcher、MutationBatcher 和发送调度器处理一批消息，
+客户端换成只记录请求的模拟客户端：
+- 删除：一个源聊天每 100ms 收到一条消息，规则转发后删除原消息
+- 编辑：一个源聊天收到若干个 10 条消息的媒体组，规则编辑媒体组中的每条消息
+统计实际发出的请求数和每条消息从收到到操作完成的延迟。
+不同消息的编辑没有批量接口，每条仍是一次请求，受每个聊天的发送限速约束。
+
+对比两种方式：
+- 在规则任务中逐条等待操作结果（修复前过滤器的写法）
+- 规则任务只把操作加入批次（submit_delete / submit_edit）
+
+用法: python benchmarks/mutation_batch.py [消息数] [媒体组数]
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.ingestion_queue import IngestionQueue
+from managers.mutation_batcher import MutationBatcher
+from managers.rule_dispatcher import RuleDispatcher
+
+SOURCE = -1001
+INTERVAL = 0.1
+ALBUM_SIZE = 10
+WINDOW = 1.0
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = 0
+        self.deleted = []
+        self.edited = []
+
+    async def delete_messages(self, chat, ids):
+        self.requests += 1
+        self.deleted.extend(ids)
+
+    async def edit_message(self, chat, message, **kwargs):
+        self.requests += 1
+        self.edited.append(message)
+
+
+async def run(count, albums, wait_in_rule):
+    client = FakeClient()
+    batcher = MutationBatcher(window=WINDOW)
+    queue = IngestionQueue()
+    dispatcher = RuleDispatcher()
+    queue.start()
+    rules = [SimpleNamespace(id=1, target_chat=SimpleNamespace(telegram_chat_id=str(SOURCE)))]
+    latencies = []
+
+    async def handle_delete(message_id, received_at):
+        future = batcher.submit_delete(client, SOURCE, message_id)
+        future.add_done_callback(lambda _: latencies.append(time.perf_counter() - received_at))
+        if wait_in_rule:
+            await future
+
+    async def handle_album(message_ids, received_at):
+        for message_id in message_ids:
+            future = batcher.submit_edit(client, SOURCE, message_id, text='')
+            future.add_done_callback(lambda _: latencies.append(time.perf_counter() - received_at))
+            if wait_in_rule:
+                await future
+
+    async def job(handler, *args):
+        return dispatcher.start(rules, lambda rule: handler(*args))
+
+    started = time.perf_counter()
+    for message_id in range(1, count + 1):
+        received_at = time.perf_counter()
+        await queue.submit(SOURCE, lambda m=message_id, r=received_at: job(handle_delete, m, r))
+        await asyncio.sleep(INTERVAL)
+    for album in range(albums):
+        ids = list(range(10000 + album * ALBUM_SIZE, 10000 + (album + 1) * ALBUM_SIZE))
+        received_at = time.perf_counter()
+        await queue.submit(SOURCE, lambda m=ids, r=received_at: job(handle_album, m, r))
+    await queue.drain(timeout=600)
+    await batcher.drain()
+    elapsed = time.perf_counter() - started
+
+    assert client.deleted == list(range(1, count + 1)), '删除的消息不正确'
+    assert len(client.edited) == albums * ALBUM_SIZE, '编辑的消息不正确'
+    latencies.sort()
+    return client.requests, latencies[len(latencies) // 2], latencies[-1], elapsed
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    albums = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    operations = count + albums * ALBUM_SIZE
+    print(f'{count} 条消息每 {INTERVAL * 1000:.0f}ms 一条转发后删除，'
+          f'{albums} 个 {ALBUM_SIZE} 条的媒体组逐条编辑，合并窗口 {WINDOW:g}s')
+    for name, wait_in_rule in (
+        ('规则中逐条等待结果', True),
+        ('只加入批次', False),
+    ):
+        requests, median, worst, elapsed = await run(count, albums, wait_in_rule)
+        print(f'{name}: {requests} 次请求（{operations} 次操作），'
+              f'延迟中位数 {median:.2f}s，最大 {worst:.2f}s，总耗时 {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+替换规则基准测试
+
+对比旧的逐条 re.finditer + re.sub 循环（不含日志）与编译后的 ReplacePipeline：
+30 条替换 @频道名 的普通字符串规则加 3 条正则规则，消息约 940 个字符，
+并检查两种方式的输出一致。
+
+用法: python benchmarks/replace_pipeline.py [次数]
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.replace_pipeline import ReplacePipeline
+
+
+def make_rules():
+    rules = [SimpleNamespace(pattern=f'@channel{i:02d}', content='@mychannel') for i in range(30)]
+    rules += [
+        SimpleNamespace(pattern=r'https?://t\.me/\w+', content='https://t.me/mychannel'),
+        SimpleNamespace(pattern=r'#广告\S*', content=''),
+        SimpleNamespace(pattern=r'\s{2,}', content=' '),
+    ]
+    return rules
+
+
+def make_message():
+    parts = [
+        f'第{i}条快讯 来源 @channel{i % 30:02d}  详情见 https://t.me/source{i} #广告{i} '
+        for i in range(15)
+    ]
+    return ''.join(parts)
+
+
+def old_replace(rules, message_text):
+    """旧实现：每条规则先 finditer 再 sub"""
+    for replace_rule in rules:
+        if replace_rule.pattern == '.*':
+            return replace_rule.content or ''
+        try:
+            matches = re.finditer(replace_rule.pattern, message_text)
+            message_text = re.sub(replace_rule.pattern, replace_rule.content or '', message_text)
+            [m.group(0) for m in matches]
+        except re.error:
+            pass
+    return message_text
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rules = make_rules()
+    message = make_message()
+    pipeline = ReplacePipeline(rules)
+    expected = old_replace(rules, message)
+    assert await pipeline.apply(message) == expected
+
+    started = time.perf_counter()
+    for _ in range(count):
+        old_replace(rules, message)
+    before = (time.perf_counter() - started) / count
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await pipeline.apply(message)
+    after = (time.perf_counter() - started) / count
+
+    print(f'替换规则 {len(rules)} 条，消息长度 {len(message)}，输出一致')
+    print(f'逐条替换:        {before * 1e6:.0f}us/次 ({before * 1e6 / len(rules):.1f}us/条)')
+    print(f'ReplacePipeline: {after * 1e6:.0f}us/次 ({after * 1e6 / len(rules):.1f}us/条, {before / after:.1f}x)')
+    print(f'编译后共 {len(pipeline.describe())} 个步骤')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -3,14 +3,14 @@ from filters.base_filter import BaseFilter
 from filters.keyword_filter import KeywordFilter
 from utils.common import check_keywords
 from utils.common import get_main_module
-from ai import get_ai_provider
+from ai.router import ai_router, parse_models
+from ai.result_cache import ai_result_cache
 from utils.constants import DEFAULT_AI_MODEL,DEFAULT_SUMMARY_PROMPT,DEFAULT_AI_PROMPT
 from datetime import datetime, timedelta
 import asyncio
 import re
 import base64
 import os
-import io
 import mimetypes
 
 logger = logging.getLogger(__name__)
@@ -80,18 +80,17 @@ class AIFilter(BaseFilter):
                     
                 # 如果没有已下载的文件，但有媒体组消息，则直接下载到内存
                 elif context.is_media_group and context.media_group_messages:
-                    logger.info(f"检测到媒体组消息: {len(context.media_group_messages)}条，直接下载到内存")
+                    logger.info(f"检测到媒体组消息: {len(context.media_group_messages)}条，通过共享媒体缓存下载")
                     # 下载媒体组中的图片到内存
                     for msg in context.media_group_messages:
                         if msg.photo or (msg.document and hasattr(msg.document, 'mime_type') and msg.document.mime_type.startswith('image/')):
                             try:
-                                # 创建内存缓冲区
-                                buffer = io.BytesIO()
-                                # 直接下载到内存缓冲区
-                                await msg.download_media(file=buffer)
-                                # 获取图片内容
-                                buffer.seek(0)
-                                content = buffer.read()
+                                # 下载到共享媒体缓存，后续的发送、推送直接复用这份文件
+                                file_path = await context.download_media(msg)
+                                if not file_path:
+                                    continue
+                                with open(file_path, 'rb') as f:
+                                    content = f.read()
                                 
                                 # 获取MIME类型
                                 mime_type = "image/jpeg"  # 默认类型
@@ -114,15 +113,12 @@ class AIFilter(BaseFilter):
                     
                 # 检查单条消息是否有媒体并下载到内存
                 elif event.message and event.message.media:
-                    logger.info("检测到单条消息有媒体，下载到内存")
+                    logger.info("检测到单条消息有媒体，通过共享媒体缓存下载")
                     try:
-                        # 创建内存缓冲区
-                        buffer = io.BytesIO()
-                        # 直接下载到内存
-                        await event.message.download_media(file=buffer)
-                        # 获取图片内容
-                        buffer.seek(0)
-                        content = buffer.read()
+                        # 下载到共享媒体缓存，后续的发送、推送直接复用这份文件
+                        file_path = await context.download_media(event.message)
+                        with open(file_path, 'rb') as f:
+                            content = f.read()
                         
                         # 获取MIME类型
                         mime_type = "image/jpeg"  # 默认类型
@@ -186,22 +182,21 @@ async def _ai_handle(message: str, rule, image_files=None) -> str:
             logger.info("AI处理未开启，返回原始消息")
             return message
         # 先读取数据库，如果ai模型为空，则使用.env中的默认模型
-        if not rule.ai_model:
-            rule.ai_model = DEFAULT_AI_MODEL
-            logger.info(f"使用默认AI模型: {rule.ai_model}")
+        model = rule.ai_model
+        if not model:
+            model = DEFAULT_AI_MODEL
+            logger.info(f"使用默认AI模型: {model}")
         else:
-            logger.info(f"使用规则配置的AI模型: {rule.ai_model}")
+            logger.info(f"使用规则配置的AI模型: {model}")
             
-        provider = await get_ai_provider(rule.ai_model)
-        
-        if not rule.ai_prompt:
-            rule.ai_prompt = DEFAULT_AI_PROMPT
+        prompt = rule.ai_prompt
+        if not prompt:
+            prompt = DEFAULT_AI_PROMPT
             logger.info("使用默认AI提示词")
         else:
             logger.info("使用规则配置的AI提示词")
         
         # 处理特殊提示词格式
-        prompt = rule.ai_prompt
         if prompt:
             # 处理聊天记录提示词
             
@@ -286,11 +281,20 @@ async def _ai_handle(message: str, rule, image_files=None) -> str:
         
         logger.info(f"共有 {len(img_data)} 张图片将上传到AI")
         
-        processed_text = await provider.process_message(
-            message=message,
-            prompt=prompt,
-            model=rule.ai_model,
-            images=img_data if img_data else None
+        # 主模型较慢或出错时使用规则的备用模型
+        models = parse_models(model, rule.ai_fallback_model)
+        if len(models) > 1:
+            logger.info(f"备用AI模型: {', '.join(models[1:])}")
+
+        # 相同的模型、提示词、消息和图片直接使用缓存的结果
+        processed_text = await ai_result_cache.get_or_compute(
+            ','.join(models), prompt, message, img_data,
+            lambda: ai_router.process_message(
+                models,
+                message=message,
+                prompt=prompt,
+                images=img_data if img_data else None
+            )
         )
         logger.info(f"AI处理完成: {processed_text}")
         return processed_text
@@ -96,33 +96,10 @@ class CommentButtonFilter(BaseFilter):
                     # 检查消息是否属于媒体组
                     channel_msg_id = event.message.id
                     
-                    if hasattr(event.message, 'grouped_id') and event.message.grouped_id:
-                        logger.info(f"检测到媒体组消息，组ID: {event.message.grouped_id}")
-                        # 获取同一媒体组的所有消息
-                        media_group_messages = []
-                        
-                        try:
-                            # 获取频道历史消息
-                            async for message in client.iter_messages(
-                                channel_entity,
-                                limit=20,  # 限制查询消息数量
-                                offset_date=event.message.date,  # 从当前消息时间开始查询
-                                reverse=False  # 从新到旧
-                            ):
-                                # 检查是否属于同一媒体组
-                                if (hasattr(message, 'grouped_id') and 
-                                    message.grouped_id == event.message.grouped_id):
-                                    media_group_messages.append(message)
-                            
-                            if media_group_messages:
-                                # 找出ID最小的消息
-                                min_id_message = min(media_group_messages, key=lambda x: x.id)
-                                channel_msg_id = min_id_message.id
-                                logger.info(f"使用媒体组中ID最小的消息: {channel_msg_id}")
-                        except Exception as e:
-                            logger.error(f"获取媒体组消息失败: {e}")
-                            # 失败时使用原始消息ID
-                            logger.info(f"使用原始消息ID: {channel_msg_id}")
+                    if context.album:
+                        # 使用媒体组中ID最小的消息
+                        channel_msg_id = context.album.first.id
+                        logger.info(f"检测到媒体组消息，组ID: {context.album.grouped_id}，使用媒体组中ID最小的消息: {channel_msg_id}")
                     
                     # 添加短暂延迟，等待消息同步完成
                     logger.info("等待2秒，确保消息同步完成...")
@@ -1,11 +1,14 @@
 import copy
+from managers.album_aggregator import Album
+from managers.media_cache import media_cache, media_key
+from managers.media_downloader import media_downloader
 
 class MessageContext:
     """
     消息上下文类，包含处理消息所需的所有信息
     """
     
-    def __init__(self, client, event, chat_id, rule):
+    def __init__(self, client, event, chat_id, rule, album=None):
         """
         初始化消息上下文
         
@@ -14,9 +17,13 @@ class MessageContext:
             event: 消息事件
             chat_id: 聊天ID
             rule: 转发规则
+            album: 监听器收集好的完整媒体组（可选）
         """
         self.client = client
         self.event = event
+
+        # 实际发送到目标聊天的机器人，由 SenderFilter 从发送机器人池中选定
+        self.sender_client = client
         self.chat_id = chat_id
         self.rule = rule
         
@@ -31,6 +38,12 @@ class MessageContext:
         
         # 记录处理过程中的媒体文件
         self.media_files = []
+
+        # 待发送媒体的单条消息，发送时优先直接引用其媒体，需要时才下载
+        self.media_messages = []
+
+        # 每次媒体发送走的方式：'reference'（直接引用）或 'upload'（下载后上传）
+        self.media_send_modes = []
         
         # 记录发送者信息
         self.sender_info = ''
@@ -51,6 +64,11 @@ class MessageContext:
         self.is_media_group = event.message.grouped_id is not None
         self.media_group_id = event.message.grouped_id
         self.media_group_messages = []
+
+        # 完整的媒体组，过滤器统一从这里读取组内消息，不再重新查询Telegram
+        if album is None and self.is_media_group:
+            album = Album(event.chat_id, event.message.grouped_id, [event.message])
+        self.album = album
         
         # 用于跟踪被跳过的超大媒体
         self.skipped_media = []
@@ -63,6 +81,45 @@ class MessageContext:
         
         # 评论区链接
         self.comment_link = None
+
+        # 本次处理从共享媒体缓存中借用的文件，媒体标识 -> 文件路径
+        self._media_leases = {}
+
+    async def download_media(self, message):
+        """
+        获取消息媒体的本地文件
+
+        同一条规则处理过程中的各个过滤器共用一份文件，不同规则之间通过共享媒体缓存
+        共用一次下载，文件在过滤器链结束时由 release_media 统一释放，过滤器不要自行删除
+
+        Returns:
+            str: 本地文件路径，没有可下载的媒体时返回None
+        """
+        key = media_key(message)
+        if key is not None and key in self._media_leases:
+            return self._media_leases[key]
+        file_path = await media_cache.acquire(message)
+        if file_path:
+            self._media_leases[key or file_path] = file_path
+        return file_path
+
+    async def get_media_files(self):
+        """
+        获取待发送媒体的本地文件，尚未下载的媒体消息在这里下载
+
+        Returns:
+            list: 本地文件路径列表
+        """
+        if not self.media_files and self.media_messages:
+            paths = await media_downloader.download_album(self.media_messages, self.download_media)
+            self.media_files.extend(path for path in paths if path)
+        return self.media_files
+
+    def release_media(self):
+        """释放本次处理借用的所有媒体文件"""
+        leases, self._media_leases = self._media_leases, {}
+        for file_path in leases.values():
+            media_cache.release(file_path)
         
     def clone(self):
         """创建上下文的副本"""
@@ -1,7 +1,9 @@
 import asyncio
+import copy
 import logging
 from filters.base_filter import BaseFilter
 from utils.common import get_main_module
+from managers.album_aggregator import Album
 
 logger = logging.getLogger(__name__)
 
@@ -55,11 +57,21 @@ class DelayFilter(BaseFilter):
                 
                 # 获取更新后的消息
                 logger.info(f"[规则ID:{rule.id}] 正在获取聊天 {chat_id} 的消息 {original_id}...")
-                updated_message = await client.get_messages(chat_id, ids=original_id)
+                if context.album:
+                    # 媒体组按ID一次性重新获取所有组内消息
+                    updated_messages = [m for m in await client.get_messages(chat_id, ids=context.album.ids) if m]
+                    if updated_messages:
+                        context.album = Album(context.album.chat_id, context.album.grouped_id, updated_messages)
+                    updated_message = next((m for m in updated_messages if m.id == original_id), None)
+                else:
+                    updated_message = await client.get_messages(chat_id, ids=original_id)
 
                 
                 if updated_message:
                     updated_text = getattr(updated_message, "text", "")
+                    if context.album and context.album.caption_message:
+                        # 媒体组的文本可能在组内其他消息上
+                        updated_text = context.album.text
                     
                     # 不管消息内容是否有变化，都更新上下文中的所有相关字段
                     logger.info(f"[规则ID:{rule.id}] 正在更新上下文中的消息数据...")
@@ -68,7 +80,8 @@ class DelayFilter(BaseFilter):
                     context.message_text = updated_text
                     context.check_message_text = updated_text
                     
-                    # 更新事件中的消息对象
+                    # 更新事件中的消息对象（事件由多条规则并发共享，这里只替换当前上下文的副本）
+                    context.event = copy.copy(context.event)
                     context.event.message = updated_message
                     
                     # 更新其他相关字段
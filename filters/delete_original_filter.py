@@ -1,6 +1,7 @@
 import logging
 from filters.base_filter import BaseFilter
 from utils.common import get_main_module
+from managers.mutation_batcher import mutation_batcher
 
 logger = logging.getLogger(__name__)
 
@@ -31,26 +32,30 @@ class DeleteOriginalFilter(BaseFilter):
             main = await get_main_module()
             user_client = main.user_client  # 获取用户客户端
             
-            # 媒体组消息
-            if event.message.grouped_id:
-                # 使用用户客户端获取并删除媒体组消息
-                async for message in user_client.iter_messages(
-                        event.chat_id,
-                        min_id=event.message.id - 10,
-                        max_id=event.message.id + 10,
-                        reverse=True
-                ):
-                    if message.grouped_id == event.message.grouped_id:
-                        await message.delete()
-                        logger.info(f'已删除媒体组消息 ID: {message.id}')
+            # 只把删除加入批次，不等待合并窗口，同一聊天后续消息的删除才能合并为一次请求
+            if context.album:
+                # 一次请求删除监听器收集到的整个媒体组
+                future = mutation_batcher.submit_delete(user_client, event.chat_id, context.album.ids)
+                description = f'媒体组消息 ID: {context.album.ids}'
             else:
-                # 单条消息的删除逻辑
-                message = await user_client.get_messages(event.chat_id, ids=event.message.id)
-                await message.delete()
-                logger.info(f'已删除原始消息 ID: {event.message.id}')
+                # 单条消息按ID直接删除
+                future = mutation_batcher.submit_delete(user_client, event.chat_id, event.message.id)
+                description = f'原始消息 ID: {event.message.id}'
+            future.add_done_callback(lambda done: _log_delete_result(done, description))
                 
             return True
         except Exception as e:
             logger.error(f'删除原始消息时出错: {str(e)}')
             context.errors.append(f"删除原始消息错误: {str(e)}")
-            return True  # 即使删除失败，也继续处理 
\ No newline at end of file
+            return True  # 即使删除失败，也继续处理
+
+
+def _log_delete_result(future, description):
+    """记录合并删除的结果"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error(f'删除原始消息时出错 ({description}): {str(error)}')
+    else:
+        logger.info(f'已删除{description}')
@@ -3,6 +3,7 @@ import os
 from filters.base_filter import BaseFilter
 from enums.enums import HandleMode, PreviewMode
 from utils.common import get_main_module
+from managers.mutation_batcher import mutation_batcher
 from telethon.tl.types import Channel
 import traceback
 
@@ -84,27 +85,27 @@ class EditFilter(BaseFilter):
                     logger.warning("媒体组消息列表为空，无法编辑")
                     return False
                     
+                # 各条消息的编辑同时提交，在同一个合并窗口结束时一起发出，不逐条等待
                 for message in context.media_group_messages:
                     try:
                         # 只在第一条消息上添加文本
                         text_to_edit = message_text if message.id == event.message.id else ""
                         logger.debug(f"尝试编辑媒体组消息 {message.id}, 媒体类型: {type(message.media).__name__ if message.media else '无媒体'}")
                         
-                        await user_client.edit_message(
+                        future = mutation_batcher.submit_edit(
+                            user_client,
                             event.chat_id,
                             message.id,
                             text=text_to_edit,
                             parse_mode=rule.message_mode.value,
                             link_preview=link_preview
                         )
-                        logger.info(f"成功编辑媒体组消息 {message.id}")
+                        future.add_done_callback(
+                            lambda done, message_id=message.id: _log_edit_result(done, f"媒体组消息 {message_id}")
+                        )
                     except Exception as e:
-                        error_details = str(e)
-                        if "was not modified" not in error_details:
-                            logger.error(f"编辑媒体组消息 {message.id} 失败: {error_details}")
-                            logger.debug(f"异常详情: {traceback.format_exc()}")
-                        else:
-                            logger.debug(f"媒体组消息 {message.id} 内容未修改，无需编辑")
+                        logger.error(f"编辑媒体组消息 {message.id} 失败: {str(e)}")
+                        logger.debug(f"异常详情: {traceback.format_exc()}")
                 return False
             # 处理所有其他消息（包括单条媒体消息和纯文本消息）
             else:
@@ -112,28 +113,38 @@ class EditFilter(BaseFilter):
                     logger.debug(f"尝试编辑单条消息 {event.message.id}, 消息类型: {type(event.message).__name__}, 媒体类型: {type(event.message.media).__name__ if event.message.media else '无媒体'}")
                     logger.debug(f"使用解析模式: {rule.message_mode.value}")
                     
-                    await user_client.edit_message(
+                    # 只把编辑加入批次，不在按目标聊天顺序处理的任务中等待合并窗口
+                    future = mutation_batcher.submit_edit(
+                        user_client,
                         event.chat_id,
                         event.message.id,
                         text=message_text,
                         parse_mode=rule.message_mode.value,
                         link_preview=link_preview
                     )
-                    logger.info(f"成功编辑消息 {event.message.id}")
+                    future.add_done_callback(lambda done: _log_edit_result(done, f"消息 {event.message.id}"))
                     return False
                 except Exception as e:
-                    error_details = str(e)
-                    if "was not modified" not in error_details:
-                        logger.error(f"编辑消息 {event.message.id} 失败: {error_details}")
-                        logger.debug(f"尝试编辑的消息ID: {event.message.id}, 聊天ID: {event.chat_id}")
-                        logger.debug(f"消息文本长度: {len(message_text)}, 解析模式: {rule.message_mode.value}")
-                        logger.debug(f"异常详情: {traceback.format_exc()}")
-                    else:
-                        logger.debug(f"消息 {event.message.id} 内容未修改，无需编辑")
+                    logger.error(f"编辑消息 {event.message.id} 失败: {str(e)}")
+                    logger.debug(f"尝试编辑的消息ID: {event.message.id}, 聊天ID: {event.chat_id}")
+                    logger.debug(f"异常详情: {traceback.format_exc()}")
                     return False
                 
         except Exception as e:
             logger.error(f"编辑过滤器处理出错: {str(e)}")
             logger.debug(f"异常详情: {traceback.format_exc()}")
             logger.debug(f"上下文信息 - 消息ID: {event.message.id}, 聊天ID: {event.chat_id}, 规则ID: {rule.id if hasattr(rule, 'id') else '未知'}")
-            return False 
\ No newline at end of file
+            return False
+
+
+def _log_edit_result(future, description):
+    """记录合并编辑的结果"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        logger.info(f"成功编辑{description}")
+    elif "was not modified" in str(error):
+        logger.debug(f"{description} 内容未修改，无需编辑")
+    else:
+        logger.error(f"编辑{description}失败: {str(error)}")
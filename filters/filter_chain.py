@@ -24,8 +24,12 @@ class FilterChain:
             raise TypeError("过滤器必须是BaseFilter的子类")
         self.filters.append(filter_obj)
         return self
+
+    def describe(self):
+        """过滤器链的执行计划"""
+        return ' -> '.join(filter_obj.name for filter_obj in self.filters)
         
-    async def process(self, client, event, chat_id, rule):
+    async def process(self, client, event, chat_id, rule, album=None):
         """
         处理消息
         
@@ -34,26 +38,31 @@ class FilterChain:
             event: 消息事件
             chat_id: 聊天ID
             rule: 转发规则
+            album: 完整的媒体组（可选）
             
         Returns:
             bool: 表示处理是否成功
         """
         # 创建消息上下文
-        context = MessageContext(client, event, chat_id, rule)
+        context = MessageContext(client, event, chat_id, rule, album)
         
-        logger.info(f"开始过滤器链处理，共 {len(self.filters)} 个过滤器")
+        logger.info(f"开始过滤器链处理，共 {len(self.filters)} 个过滤器: {self.describe()}")
         
-        # 依次执行每个过滤器
-        for filter_obj in self.filters:
-            try:
-                should_continue = await filter_obj.process(context)
-                if not should_continue:
-                    logger.info(f"过滤器 {filter_obj.name} 中断了处理链")
+        try:
+            # 依次执行每个过滤器
+            for filter_obj in self.filters:
+                try:
+                    should_continue = await filter_obj.process(context)
+                    if not should_continue:
+                        logger.info(f"过滤器 {filter_obj.name} 中断了处理链")
+                        return False
+                except Exception as e:
+                    logger.error(f"过滤器 {filter_obj.name} 处理出错: {str(e)}")
+                    context.errors.append(f"过滤器 {filter_obj.name} 错误: {str(e)}")
                     return False
-            except Exception as e:
-                logger.error(f"过滤器 {filter_obj.name} 处理出错: {str(e)}")
-                context.errors.append(f"过滤器 {filter_obj.name} 错误: {str(e)}")
-                return False
+        finally:
+            # 归还从共享媒体缓存借用的文件，最后一个使用方归还后文件才会被删除
+            context.release_media()
         
         logger.info("过滤器链处理完成")
         return True 
\ No newline at end of file
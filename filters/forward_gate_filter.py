@@ -0,0 +1,23 @@
+import logging
+from filters.base_filter import BaseFilter
+
+logger = logging.getLogger(__name__)
+
+class ForwardGateFilter(BaseFilter):
+    """
+    转发条件检查，消息已被前面的过滤器标记为不转发时中断处理链
+
+    RSS过滤器开头带有同样的检查，规则未启用RSS时由它代替RSS过滤器的位置
+    """
+    
+    async def _process(self, context):
+        """
+        检查消息是否仍满足转发条件
+        
+        Args:
+            context: 消息上下文
+            
+        Returns:
+            bool: 是否继续处理
+        """
+        return context.should_forward
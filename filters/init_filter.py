@@ -1,9 +1,6 @@
 import logging
 import os
 import pytz
-import asyncio
-from utils.constants import TEMP_DIR
-from utils.media import get_max_media_size
 
 from filters.base_filter import BaseFilter
 
@@ -30,30 +27,15 @@ class InitFilter(BaseFilter):
         # logger.info(f"InitFilter处理消息前，context: {context.__dict__}")
         try:
             #处理媒体组消息
-            if event.message.grouped_id:
-                # 等待更长时间让所有媒体消息到达
-                # await asyncio.sleep(1)
-                
-                # 收集媒体组的所有消息
-                try:
-                    async for message in event.client.iter_messages(
-                        event.chat_id,
-                        limit=20,
-                        min_id=event.message.id - 10,
-                        max_id=event.message.id + 10
-                    ):
-                        if message.grouped_id == event.message.grouped_id:
-                            if message.text:    
-                                # 保存第一条消息的文本和按钮
-                                context.message_text = message.text or ''
-                                context.original_message_text = message.text or ''
-                                context.check_message_text = message.text or ''
-                                context.buttons = message.buttons if hasattr(message, 'buttons') else None
-                            logger.info(f'获取到媒体组文本并添加到context: {message.text}')
-                        
-                except Exception as e:
-                    logger.error(f'收集媒体组消息时出错: {str(e)}')
-                    context.errors.append(f"收集媒体组消息错误: {str(e)}")
+            if context.album:
+                # 保存媒体组中第一条带文本消息的文本和按钮
+                caption_message = context.album.caption_message
+                if caption_message:
+                    context.message_text = caption_message.text or ''
+                    context.original_message_text = caption_message.text or ''
+                    context.check_message_text = caption_message.text or ''
+                    context.buttons = caption_message.buttons if hasattr(caption_message, 'buttons') else None
+                    logger.info(f'获取到媒体组文本并添加到context: {caption_message.text}')
            
         finally:
             # logger.info(f"InitFilter处理消息后，context: {context.__dict__}")
@@ -1,4 +1,5 @@
 import logging
+from enums.enums import HandleMode
 from filters.filter_chain import FilterChain
 from filters.keyword_filter import KeywordFilter
 from filters.replace_filter import ReplaceFilter
@@ -14,9 +15,129 @@ from filters.init_filter import InitFilter
 from filters.reply_filter import ReplyFilter
 from filters.rss_filter import RSSFilter
 from filters.push_filter import PushFilter
+from filters.forward_gate_filter import ForwardGateFilter
+from managers.routing_index import routing_index
+from utils.constants import RSS_ENABLED
 logger = logging.getLogger(__name__)
 
-async def process_forward_rule(client, event, chat_id, rule):
+# 过滤器不保存消息相关的状态，所有规则共用同一组实例
+INIT_FILTER = InitFilter()
+DELAY_FILTER = DelayFilter()
+KEYWORD_FILTER = KeywordFilter()
+REPLACE_FILTER = ReplaceFilter()
+MEDIA_FILTER = MediaFilter()
+AI_FILTER = AIFilter()
+INFO_FILTER = InfoFilter()
+COMMENT_BUTTON_FILTER = CommentButtonFilter()
+RSS_FILTER = RSSFilter()
+FORWARD_GATE_FILTER = ForwardGateFilter()
+EDIT_FILTER = EditFilter()
+SENDER_FILTER = SenderFilter()
+REPLY_FILTER = ReplyFilter()
+PUSH_FILTER = PushFilter()
+DELETE_ORIGINAL_FILTER = DeleteOriginalFilter()
+
+# 按规则版本缓存的过滤器链：规则ID -> (版本, 过滤器链)
+_rule_chains = {}
+# 执行计划相同的规则共用同一条过滤器链
+_plan_chains = {}
+
+
+def _rss_stage(rule):
+    """RSS过滤器开头的检查：RSS未启用时直接通过，否则先检查转发条件"""
+    if not RSS_ENABLED:
+        return None
+    rss_config = rule.rss_config
+    if rss_config is None or not rss_config.enable_rss:
+        return FORWARD_GATE_FILTER
+    return RSS_FILTER
+
+
+def build_filter_plan(rule):
+    """
+    根据规则配置生成过滤器执行计划，跳过对该规则不起作用的过滤器
+
+    Args:
+        rule: 转发规则
+
+    Returns:
+        tuple: 按执行顺序排列的过滤器
+    """
+    stages = [
+        # 初始化过滤器
+        INIT_FILTER,
+        # 延迟处理过滤器（如果启用了延迟处理）
+        DELAY_FILTER if rule.enable_delay and rule.delay_seconds > 0 else None,
+        # 关键字过滤器（如果消息不匹配关键字，会中断处理链）
+        KEYWORD_FILTER,
+        # 替换过滤器
+        REPLACE_FILTER if rule.is_replace else None,
+        # 媒体过滤器（处理媒体内容）
+        MEDIA_FILTER,
+        # AI处理过滤器（如果启用了AI处理后的关键字检查，可能会中断处理链）
+        AI_FILTER if rule.is_ai else None,
+        # 信息过滤器（处理原始链接、发送者信息和时间）
+        INFO_FILTER if rule.is_original_link or rule.is_original_sender or rule.is_original_time else None,
+        # 评论区按钮过滤器
+        COMMENT_BUTTON_FILTER if rule.enable_comment_button and not rule.only_rss else None,
+        # RSS过滤器
+        _rss_stage(rule),
+        # 编辑过滤器（编辑原始消息）
+        EDIT_FILTER if rule.handle_mode == HandleMode.EDIT else None,
+        # 发送过滤器（发送消息）
+        SENDER_FILTER,
+        # 回复过滤器（处理媒体组消息的评论区按钮）
+        REPLY_FILTER if rule.enable_comment_button else None,
+        # 推送过滤器
+        PUSH_FILTER if rule.enable_push else None,
+        # 删除原始消息过滤器（最后执行）
+        DELETE_ORIGINAL_FILTER if rule.is_delete_original else None,
+    ]
+    return tuple(stage for stage in stages if stage is not None)
+
+
+def get_filter_chain(rule):
+    """
+    获取规则的过滤器链，按规则快照版本缓存
+
+    Args:
+        rule: 转发规则
+
+    Returns:
+        FilterChain: 过滤器链
+    """
+    version = getattr(rule, 'version', None)
+    cached = _rule_chains.get(rule.id)
+    if version is not None and cached and cached[0] == version:
+        return cached[1]
+
+    plan = build_filter_plan(rule)
+    chain = _plan_chains.get(plan)
+    if chain is None:
+        chain = FilterChain()
+        for filter_obj in plan:
+            chain.add_filter(filter_obj)
+        _plan_chains[plan] = chain
+    if version is not None:
+        if not cached or cached[1] is not chain:
+            logger.info(f'规则 ID: {rule.id} 的过滤器链: {chain.describe()}')
+        _rule_chains[rule.id] = (version, chain)
+    return chain
+
+
+def _prune_chains(rule_ids, source_keys):
+    """路由索引重建后删除已删除或停用的规则的过滤器链，以及不再被使用的执行计划"""
+    for rule_id in [rule_id for rule_id in _rule_chains if rule_id not in rule_ids]:
+        del _rule_chains[rule_id]
+    in_use = {id(chain) for _, chain in _rule_chains.values()}
+    for plan in [plan for plan, chain in _plan_chains.items() if id(chain) not in in_use]:
+        del _plan_chains[plan]
+
+
+routing_index.add_listener(_prune_chains)
+
+
+async def process_forward_rule(client, event, chat_id, rule, album=None):
     """
     处理转发规则
     
@@ -25,58 +146,17 @@ async def process_forward_rule(client, event, chat_id, rule):
         event: 消息事件
         chat_id: 聊天ID
         rule: 转发规则
+        album: 完整的媒体组（可选）
         
     Returns:
         bool: 处理是否成功
     """
     logger.info(f'使用过滤器链处理规则 ID: {rule.id}')
     
-    # 创建过滤器链
-    filter_chain = FilterChain()
-
-    # 添加初始化过滤器
-    filter_chain.add_filter(InitFilter())
-
-    # 延迟处理过滤器（如果启用了延迟处理）
-    filter_chain.add_filter(DelayFilter())
-    
-    # 添加关键字过滤器（如果消息不匹配关键字，会中断处理链）
-    filter_chain.add_filter(KeywordFilter())
-    
-    # 添加替换过滤器
-    filter_chain.add_filter(ReplaceFilter())
-
-    # 添加媒体过滤器（处理媒体内容）
-    filter_chain.add_filter(MediaFilter())
-    
-    # 添加AI处理过滤器（如果启用了AI处理后的关键字检查，可能会中断处理链）
-    filter_chain.add_filter(AIFilter())
-    
-    # 添加信息过滤器（处理原始链接和发送者信息）
-    filter_chain.add_filter(InfoFilter())
-    
-    # 添加评论区按钮过滤器
-    filter_chain.add_filter(CommentButtonFilter())
-
-    # 添加RSS过滤器
-    filter_chain.add_filter(RSSFilter())
-    
-    # 添加编辑过滤器（编辑原始消息）
-    filter_chain.add_filter(EditFilter())
-
-    # 添加发送过滤器（发送消息）
-    filter_chain.add_filter(SenderFilter())
-    
-    # 添加回复过滤器（处理媒体组消息的评论区按钮）
-    filter_chain.add_filter(ReplyFilter())
-
-    # 添加推送过滤器
-    filter_chain.add_filter(PushFilter())
-    
-    # 添加删除原始消息过滤器（最后执行）
-    filter_chain.add_filter(DeleteOriginalFilter())
+    # 获取按规则配置编译好的过滤器链
+    filter_chain = get_filter_chain(rule)
     
     # 执行过滤器链
-    result = await filter_chain.process(client, event, chat_id, rule)
+    result = await filter_chain.process(client, event, chat_id, rule, album)
     
     return result 
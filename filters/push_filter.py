@@ -7,7 +7,7 @@ from datetime import datetime
 import traceback
 
 from filters.base_filter import BaseFilter
-from models.models import get_session, PushConfig
+from managers.media_downloader import media_downloader
 from enums.enums import PreviewMode
 
 logger = logging.getLogger(__name__)
@@ -36,26 +36,18 @@ class PushFilter(BaseFilter):
             logger.info('推送未启用，跳过推送')
             return True
         
-        # 获取规则ID和所有启用的推送配置
+        # 获取规则ID
         rule_id = rule.id
-        session = get_session()
-        
- 
+
         logger.info(f"推送过滤器开始处理 - 规则ID: {rule_id}")
         logger.info(f"是否是媒体组: {context.is_media_group}")
         logger.info(f"媒体组消息数量: {len(context.media_group_messages) if context.media_group_messages else 0}")
         logger.info(f"已有媒体文件数量: {len(context.media_files) if context.media_files else 0}")
         logger.info(f"是否只推送不转发: {rule.enable_only_push}")
         
-        # 跟踪已处理的文件
-        processed_files = []
-        
         try:
             # 获取所有启用的推送配置
-            push_configs = session.query(PushConfig).filter(
-                PushConfig.rule_id == rule_id,
-                PushConfig.enable_push_channel == True
-            ).all()
+            push_configs = [config for config in rule.push_configs if config.enable_push_channel]
             
             if not push_configs:
                 logger.info(f'规则 {rule_id} 没有启用的推送配置，跳过推送')
@@ -63,13 +55,13 @@ class PushFilter(BaseFilter):
             
             # 对媒体组消息进行推送
             if context.is_media_group or (context.media_group_messages and context.skipped_media):
-                processed_files = await self._push_media_group(context, push_configs)
+                await self._push_media_group(context, push_configs)
             # 对单条媒体消息进行推送
-            elif context.media_files or context.skipped_media:
-                processed_files = await self._push_single_media(context, push_configs)
+            elif context.media_files or context.media_messages or context.skipped_media:
+                await self._push_single_media(context, push_configs)
             # 对纯文本消息进行推送
             else:
-                processed_files = await self._push_text_message(context, push_configs)
+                await self._push_text_message(context, push_configs)
             
             logger.info(f'推送已发送到 {len(push_configs)} 个配置')
             return True
@@ -79,19 +71,6 @@ class PushFilter(BaseFilter):
             logger.error(traceback.format_exc())
             context.errors.append(f"推送错误: {str(e)}")
             return False
-        finally:
-            session.close()
-            
-            # 只清理已处理的媒体文件
-            if processed_files:
-                logger.info(f'清理已处理的媒体文件，共 {len(processed_files)} 个')
-                for file_path in processed_files:
-                    try:
-                        if os.path.exists(str(file_path)):
-                            os.remove(file_path)
-                            logger.info(f'删除已处理的媒体文件: {file_path}')
-                    except Exception as e:
-                        logger.error(f'删除媒体文件失败: {str(e)}')
     
     async def _push_media_group(self, context, push_configs):
         """推送媒体组消息"""
@@ -101,7 +80,6 @@ class PushFilter(BaseFilter):
         
         # 初始化文件列表
         files = []
-        need_cleanup = False
         
         try:
             # 如果没有媒体组消息（都超限了），发送文本和提示
@@ -133,13 +111,7 @@ class PushFilter(BaseFilter):
             # 检查是否有媒体组消息但没有媒体文件（这是关键修复）
             if context.media_group_messages and not context.media_files:
                 logger.info(f'检测到媒体组消息但没有媒体文件，开始下载...')
-                need_cleanup = True
-                for message in context.media_group_messages:
-                    if message.media:
-                        file_path = await message.download_media(os.path.join(os.getcwd(), 'temp'))
-                        if file_path:
-                            files.append(file_path)
-                            logger.info(f'已下载媒体组文件: {file_path}')
+                files = await self._download_group(context)
             # 如果SenderFilter已经下载了文件，使用它们
             elif context.media_files:
                 logger.info(f'使用SenderFilter已下载的文件: {len(context.media_files)}个')
@@ -147,13 +119,7 @@ class PushFilter(BaseFilter):
             # 否则，需要自己下载文件
             elif rule.enable_only_push:
                 logger.info(f'需要自己下载文件，开始下载媒体组消息...')
-                need_cleanup = True
-                for message in context.media_group_messages:
-                    if message.media:
-                        file_path = await message.download_media(os.path.join(os.getcwd(), 'temp'))
-                        if file_path:
-                            files.append(file_path)
-                            logger.info(f'已下载媒体文件: {file_path}')
+                files = await self._download_group(context)
             
             # 如果有可用的媒体文件，构建推送内容
             if files:
@@ -227,22 +193,17 @@ class PushFilter(BaseFilter):
             logger.error(traceback.format_exc())
             raise
         finally:
-            # 如果是自己下载的文件，立即清理
-            if need_cleanup:
-                for file_path in files:
-                    try:
-                        if os.path.exists(str(file_path)):
-                            os.remove(file_path)
-                            logger.info(f'删除临时文件: {file_path}')
-                            # 移除已删除的文件，避免重复删除
-                            if file_path in processed_files:
-                                processed_files.remove(file_path)
-                    except Exception as e:
-                        logger.error(f'删除临时文件失败: {str(e)}')
-            
-            # 返回处理过但未删除的文件
+            # 文件由共享媒体缓存在过滤器链结束时统一释放
             return processed_files
     
+    async def _download_group(self, context):
+        """并发下载媒体组文件，顺序与原媒体组一致"""
+        messages = [message for message in context.media_group_messages if message.media]
+        paths = await media_downloader.download_album(messages, context.download_media)
+        files = [file_path for file_path in paths if file_path]
+        logger.info(f'已下载媒体组文件: {len(files)}/{len(messages)} 个')
+        return files
+    
     async def _push_single_media(self, context, push_configs):
         """推送单条媒体消息"""
         rule = context.rule
@@ -255,7 +216,7 @@ class PushFilter(BaseFilter):
         processed_files = []
         
         # 检查是否所有媒体都超限
-        if context.skipped_media and not context.media_files:
+        if context.skipped_media and not context.media_files and not context.media_messages:
             # 构建提示信息
             file_size = context.skipped_media[0][1]
             file_name = context.skipped_media[0][2]
@@ -282,18 +243,20 @@ class PushFilter(BaseFilter):
         
         # 处理媒体文件
         files = []
-        need_cleanup = False
         
         try:
             # 如果SenderFilter已经下载了文件，使用它们
             if context.media_files:
                 logger.info(f'使用SenderFilter已下载的文件: {len(context.media_files)}个')
                 files = context.media_files
+            # SenderFilter直接引用了源消息的媒体，通过共享媒体缓存下载
+            elif context.media_messages:
+                logger.info(f'下载待推送的媒体文件: {len(context.media_messages)}个')
+                files = await context.get_media_files()
             # 否则，需要自己下载文件
             elif rule.enable_only_push and event.message and event.message.media:
                 logger.info(f'需要自己下载文件，开始下载单个媒体消息...')
-                need_cleanup = True
-                file_path = await event.message.download_media(os.path.join(os.getcwd(), 'temp'))
+                file_path = await context.download_media(event.message)
                 if file_path:
                     files.append(file_path)
                     logger.info(f'已下载媒体文件: {file_path}')
@@ -344,20 +307,7 @@ class PushFilter(BaseFilter):
             logger.error(traceback.format_exc())
             raise
         finally:
-            # 如果是自己下载的文件，需要清理
-            if need_cleanup:
-                for file_path in files:
-                    try:
-                        if os.path.exists(str(file_path)):
-                            os.remove(file_path)
-                            logger.info(f'删除临时文件: {file_path}')
-                            # 从已处理列表中移除
-                            if file_path in processed_files:
-                                processed_files.remove(file_path)
-                    except Exception as e:
-                        logger.error(f'删除临时文件失败: {str(e)}')
-    
-            # 返回处理过但未删除的文件
+            # 文件由共享媒体缓存在过滤器链结束时统一释放
             return processed_files
     
     async def _push_text_message(self, context, push_configs):
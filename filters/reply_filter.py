@@ -2,6 +2,7 @@ import logging
 import asyncio
 from telethon import Button
 from filters.base_filter import BaseFilter
+from managers.send_scheduler import send_scheduler
 from utils.common import get_main_module
 import traceback
 logger = logging.getLogger(__name__)
@@ -36,8 +37,8 @@ class ReplyFilter(BaseFilter):
                 logger.info("没有评论区链接或已转发消息，无法添加评论区按钮回复")
                 return True
                 
-            # 使用bot客户端（context.client）
-            client = context.client
+            # 使用发送该消息的机器人（context.sender_client）
+            client = context.sender_client
             
             # 获取目标聊天信息
             rule = context.rule
@@ -55,8 +56,9 @@ class ReplyFilter(BaseFilter):
             logger.info(f"正在使用Bot给已转发的媒体组消息 {first_forwarded_msg.id} 发送评论区按钮回复")
             
             # 发送回复消息，附带评论区按钮
-            await client.send_message(
-                entity=target_chat_id,
+            await send_scheduler.send_message(
+                client,
+                target_chat_id,
                 message="💬 评论区",
                 buttons=buttons,
                 reply_to=first_forwarded_msg.id,
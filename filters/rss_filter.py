@@ -8,10 +8,9 @@ from pathlib import Path
 from datetime import datetime
 import shutil
 from filters.base_filter import BaseFilter
+from managers.media_downloader import media_downloader
 import uuid
 from utils.constants import TEMP_DIR, RSS_MEDIA_DIR, get_rule_media_dir,RSS_HOST,RSS_PORT,RSS_ENABLED
-from models.models import get_session
-from utils.common import get_db_ops
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +38,20 @@ class RSSFilter(BaseFilter):
     def _get_rule_media_path(self, rule_id):
         """获取规则特定的媒体目录"""
         return get_rule_media_dir(rule_id)
+
+    async def _download_media(self, context, message, local_path):
+        """
+        下载媒体到RSS媒体目录
+
+        有消息上下文时从共享媒体缓存复制，同一源消息的其他规则不再重复下载
+        """
+        if context is None or not hasattr(context, 'download_media'):
+            await media_downloader.download(message, local_path)
+            return
+        cached_path = await context.download_media(message)
+        if not cached_path:
+            raise ValueError(f"消息 {message.id} 没有可下载的媒体")
+        await asyncio.to_thread(shutil.copy2, cached_path, local_path)
     
     async def _process(self, context):
         """处理RSS过滤器逻辑"""
@@ -50,22 +63,18 @@ class RSSFilter(BaseFilter):
         if not context.should_forward:
             return False
         
-        db_ops = await get_db_ops()
-        session = get_session()
-        rss_config = await db_ops.get_rss_config(session, context.rule.id)
+        rss_config = context.rule.rss_config
         logger.info(f"规则ID: {context.rule.id}")
         logger.info(f"RSS配置: {rss_config}")
 
         # 检查RSS配置是否存在
         if rss_config is None:
             logger.error(f"找不到规则ID为 {context.rule.id} 的RSS配置，跳过RSS处理")
-            session.close()
             return True
         
         # 检查是否启用RSS
         if not rss_config.enable_rss:
             logger.info(f"规则ID为 {context.rule.id} 的RSS未启用，跳过RSS处理")
-            session.close()
             return True
 
         # 执行RSS规则前，先确保媒体文件已经下载
@@ -329,7 +338,7 @@ class RSSFilter(BaseFilter):
                 local_path = os.path.join(rule_media_path, file_name)
                 try:
                     if not os.path.exists(local_path):
-                        await message.download_media(local_path)
+                        await self._download_media(context, message, local_path)
                         logger.info(f"下载媒体文件到: {local_path}")
                     
                     # 获取文件大小和MIME类型
@@ -364,7 +373,7 @@ class RSSFilter(BaseFilter):
                 
                 try:
                     if not os.path.exists(local_path):
-                        await message.download_media(local_path)
+                        await self._download_media(context, message, local_path)
                         logger.info(f"下载图片到: {local_path}")
                     
                     # 获取文件大小
@@ -408,7 +417,7 @@ class RSSFilter(BaseFilter):
                 
                 try:
                     if not os.path.exists(local_path):
-                        await message.download_media(local_path)
+                        await self._download_media(context, message, local_path)
                         logger.info(f"下载视频到: {local_path}")
                     
                     # 获取文件大小和MIME类型
@@ -453,7 +462,7 @@ class RSSFilter(BaseFilter):
                 
                 try:
                     if not os.path.exists(local_path):
-                        await message.download_media(local_path)
+                        await self._download_media(context, message, local_path)
                         logger.info(f"下载音频到: {local_path}")
                     
                     # 获取文件大小和MIME类型
@@ -489,7 +498,7 @@ class RSSFilter(BaseFilter):
                 
                 try:
                     if not os.path.exists(local_path):
-                        await message.download_media(local_path)
+                        await self._download_media(context, message, local_path)
                         logger.info(f"下载语音到: {local_path}")
                     
                     # 获取文件大小
@@ -645,7 +654,7 @@ class RSSFilter(BaseFilter):
                                         logger.info(f"媒体文件已存在，跳过下载: {local_path}")
                                     else:
                                         try:
-                                            await msg.download_media(local_path)
+                                            await self._download_media(context, msg, local_path)
                                             logger.info(f"直接下载图片到: {local_path}")
                                         except Exception as e:
                                             if "file reference has expired" in str(e):
@@ -656,7 +665,7 @@ class RSSFilter(BaseFilter):
                                                         msg.chat_id, ids=msg.id
                                                     )
                                                     if refreshed_msg:
-                                                        await refreshed_msg.download_media(local_path)
+                                                        await media_downloader.download(refreshed_msg, local_path)
                                                         logger.info(f"成功重新下载图片到: {local_path}")
                                                     else:
                                                         logger.error("无法重新获取消息")
@@ -705,7 +714,7 @@ class RSSFilter(BaseFilter):
                                         logger.info(f"媒体文件已存在，跳过下载: {local_path}")
                                     else:
                                         try:
-                                            await msg.download_media(local_path)
+                                            await self._download_media(context, msg, local_path)
                                             logger.info(f"直接下载文档到: {local_path}")
                                         except Exception as e:
                                             if "file reference has expired" in str(e):
@@ -716,7 +725,7 @@ class RSSFilter(BaseFilter):
                                                         msg.chat_id, ids=msg.id
                                                     )
                                                     if refreshed_msg:
-                                                        await refreshed_msg.download_media(local_path)
+                                                        await media_downloader.download(refreshed_msg, local_path)
                                                         logger.info(f"成功重新下载文档到: {local_path}")
                                                     else:
                                                         logger.error("无法重新获取消息")
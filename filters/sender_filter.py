@@ -1,11 +1,35 @@
 import logging
 import os
+import time
 from filters.base_filter import BaseFilter
 from enums.enums import PreviewMode
-from telethon.errors import FloodWaitError
+from telethon import utils as telethon_utils
+from telethon.errors import (
+    FloodWaitError, FileReferenceExpiredError, FileReferenceInvalidError, FileReferenceEmptyError,
+    MediaInvalidError, MediaEmptyError, PhotoInvalidError, DocumentInvalidError, ChatForwardsRestrictedError
+)
+from utils.constants import MEDIA_SEND_BY_REFERENCE
+from managers.upload_cache import upload_cache
+from managers.media_downloader import media_downloader
+from managers.send_scheduler import send_scheduler
+from managers.bot_pool import bot_pool
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# 直接引用源消息媒体失败时，改为下载后重新上传的错误
+REFERENCE_FALLBACK_ERRORS = (
+    FileReferenceExpiredError, FileReferenceInvalidError, FileReferenceEmptyError,
+    MediaInvalidError, MediaEmptyError, PhotoInvalidError, DocumentInvalidError,
+    ChatForwardsRestrictedError
+)
+
+# 某个机器人引用某个源聊天的媒体失败后，这段时间内（秒）不再尝试引用，直接下载后上传
+REFERENCE_RETRY_INTERVAL = 3600
+
+# (发送客户端, 源聊天) -> 最近一次引用失败的时间
+_reference_failures = {}
+
 class SenderFilter(BaseFilter):
     """
     消息发送过滤器，用于发送处理后的消息
@@ -65,6 +89,9 @@ class SenderFilter(BaseFilter):
         except Exception as e:
             logger.warning(f'获取目标聊天实体时出错: {str(e)}')
         
+        # 从发送机器人池中选出负责该目标的机器人
+        context.sender_client = await bot_pool.client_for(target_chat_id)
+        
         # 设置消息格式
         parse_mode = rule.message_mode.value  # 使用枚举的值（字符串）
         logger.info(f'使用消息格式: {parse_mode}')
@@ -75,7 +102,7 @@ class SenderFilter(BaseFilter):
                 logger.info(f'准备发送媒体组消息')
                 await self._send_media_group(context, target_chat_id, parse_mode)
             # 处理单条媒体消息
-            elif context.media_files or context.skipped_media:
+            elif context.media_files or context.media_messages or context.skipped_media:
                 logger.info(f'准备发送单条媒体消息')
                 await self._send_single_media(context, target_chat_id, parse_mode)
             # 处理纯文本消息
@@ -87,7 +114,7 @@ class SenderFilter(BaseFilter):
             return True
         except FloodWaitError as e:
             wait_time = e.seconds
-            logger.error(f'发送消息频率限制，需要等待 {wait_time} 秒')
+            logger.error(f'发送消息频率限制，需要等待 {wait_time} 秒，超过重试上限，放弃发送')
             context.errors.append(f"发送消息频率限制，需要等待 {wait_time} 秒")
             return False
         except Exception as e:
@@ -98,7 +125,7 @@ class SenderFilter(BaseFilter):
     async def _send_media_group(self, context, target_chat_id, parse_mode):
         """发送媒体组消息"""
         rule = context.rule
-        client = context.client
+        client = context.sender_client
         event = context.event
         # 初始化转发消息列表
         context.forwarded_messages = []
@@ -129,23 +156,9 @@ class SenderFilter(BaseFilter):
         #     return
             
         # 如果有可以发送的媒体，作为一个组发送
-        files = []
         try:
-            for message in context.media_group_messages:
-                if message.media:
-                    file_path = await message.download_media(os.path.join(os.getcwd(), 'temp'))
-                    if file_path:
-                        files.append(file_path)
-            
-            # 修改：保存下载的文件路径到context.media_files
-            if files:
-                # 初始化 media_files 如果它不存在
-                if not hasattr(context, 'media_files') or context.media_files is None:
-                    context.media_files = []
-                # 将当前下载的文件添加到列表中
-                context.media_files.extend(files)
-                logger.info(f'已将 {len(files)} 个下载的媒体文件路径保存到context.media_files')
-                
+            messages = [message for message in context.media_group_messages if message.media]
+            if messages:
                 # 添加发送者信息和消息文本
                 caption_text = context.sender_info + context.message_text
                 
@@ -158,10 +171,12 @@ class SenderFilter(BaseFilter):
                 # 添加时间信息和原始链接
                 caption_text += context.time_info + context.original_link
                 
-                # 作为一个组发送所有文件
-                sent_messages = await client.send_file(
+                # 作为一个组发送所有媒体
+                sent_messages = await self._send_media(
+                    context,
                     target_chat_id,
-                    files,
+                    messages,
+                    album=True,
                     caption=caption_text,
                     parse_mode=parse_mode,
                     buttons=context.buttons,
@@ -181,28 +196,17 @@ class SenderFilter(BaseFilter):
         except Exception as e:
             logger.error(f'发送媒体组消息时出错: {str(e)}')
             raise
-        finally:
-            # 删除临时文件，但如果启用了推送则保留
-            if not rule.enable_push:
-                for file_path in files:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f'删除临时文件: {file_path}')
-                    except Exception as e:
-                        logger.error(f'删除临时文件失败: {str(e)}')
-            else:
-                logger.info(f'推送功能已启用，保留临时文件')
     
     async def _send_single_media(self, context, target_chat_id, parse_mode):
         """发送单条媒体消息"""
         rule = context.rule
-        client = context.client
+        client = context.sender_client
         event = context.event
         
         logger.info(f'发送单条媒体消息')
         
         # 检查是否所有媒体都超限
-        if context.skipped_media and not context.media_files:
+        if context.skipped_media and not context.media_files and not context.media_messages:
             # 构建提示信息
             file_size = context.skipped_media[0][1]
             file_name = context.skipped_media[0][2]
@@ -214,7 +218,8 @@ class SenderFilter(BaseFilter):
             
             text_to_send += original_link
                 
-            await client.send_message(
+            await send_scheduler.send_message(
+                client,
                 target_chat_id,
                 text_to_send,
                 parse_mode=parse_mode,
@@ -228,47 +233,138 @@ class SenderFilter(BaseFilter):
         if not hasattr(context, 'media_files') or context.media_files is None:
             context.media_files = []
         
-        # 发送媒体文件
-        for file_path in context.media_files:
+        caption = (
+            context.sender_info + 
+            context.message_text + 
+            context.time_info + 
+            context.original_link
+        )
+        link_preview = {
+            PreviewMode.ON: True,
+            PreviewMode.OFF: False,
+            PreviewMode.FOLLOW: context.event.message.media is not None
+        }[rule.is_preview]
+        
+        try:
+            if context.media_files:
+                # 发送已下载的媒体文件
+                for file_path in context.media_files:
+                    await send_scheduler.submit(
+                        client,
+                        target_chat_id,
+                        upload_cache.send_file,
+                        client,
+                        target_chat_id,
+                        file_path,
+                        caption=caption,
+                        parse_mode=parse_mode,
+                        buttons=context.buttons,
+                        link_preview=link_preview
+                    )
+            else:
+                # 优先直接引用源消息的媒体
+                for message in context.media_messages:
+                    await self._send_media(
+                        context,
+                        target_chat_id,
+                        [message],
+                        caption=caption,
+                        parse_mode=parse_mode,
+                        buttons=context.buttons,
+                        link_preview=link_preview
+                    )
+            logger.info(f'媒体消息已发送')
+        except Exception as e:
+            logger.error(f'发送媒体消息时出错: {str(e)}')
+            raise
+    
+    async def _send_media(self, context, target_chat_id, messages, album=False, **kwargs):
+        """
+        发送消息中的媒体
+
+        优先把源消息的媒体对象直接交给 send_file，不下载也不重新上传；
+        文件引用过期、无权访问等情况下改为通过共享媒体缓存下载后上传，
+        上传结果由 upload_cache 复用
+
+        Args:
+            context: 消息上下文
+            target_chat_id: 目标聊天ID
+            messages: 带媒体的消息列表
+            album: 是否作为媒体组发送
+            **kwargs: 传给 send_file 的其他参数
+
+        Returns:
+            发送的消息（媒体组为消息列表）
+        """
+        client = context.sender_client
+        if MEDIA_SEND_BY_REFERENCE and self._should_reference(context) and self._can_reference(messages):
+            media = [message.media for message in messages]
             try:
-                caption = (
-                    context.sender_info + 
-                    context.message_text + 
-                    context.time_info + 
-                    context.original_link
-                )
-                
-                await client.send_file(
-                    target_chat_id,
-                    file_path,
-                    caption=caption,
-                    parse_mode=parse_mode,
-                    buttons=context.buttons,
-                    link_preview={
-                        PreviewMode.ON: True,
-                        PreviewMode.OFF: False,
-                        PreviewMode.FOLLOW: context.event.message.media is not None
-                    }[rule.is_preview]
-                )
-                logger.info(f'媒体消息已发送')
-            except Exception as e:
-                logger.error(f'发送媒体消息时出错: {str(e)}')
-                raise
-            finally:
-                # 删除临时文件，但如果启用了推送则保留
-                if not rule.enable_push:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f'删除临时文件: {file_path}')
-                    except Exception as e:
-                        logger.error(f'删除临时文件失败: {str(e)}')
-                else:
-                    logger.info(f'推送功能已启用，保留临时文件: {file_path}')
+                sent = await send_scheduler.send_file(client, target_chat_id, media if album else media[0], **kwargs)
+                self._record_send_mode(context, 'reference', len(messages))
+                return sent
+            except REFERENCE_FALLBACK_ERRORS as e:
+                logger.info(f'直接引用源消息媒体失败 ({type(e).__name__}: {str(e)})，改为下载后上传')
+                metrics.incr('sender.media_reference_fallbacks')
+                if client is not context.event.client:
+                    _reference_failures[(id(client), context.event.chat_id)] = time.monotonic()
+
+        # 并发下载，失败的文件不影响其他文件，顺序与原媒体组一致
+        paths = await media_downloader.download_album(messages, context.download_media)
+        files = [file_path for file_path in paths if file_path]
+        if not files:
+            raise ValueError('没有可发送的媒体文件')
+        # 保存下载的文件路径，推送等后续过滤器直接使用
+        context.media_files.extend(f for f in files if f not in context.media_files)
+        # 同一文件发往多个目标时只上传一次
+        sent = await send_scheduler.submit(
+            client, target_chat_id, upload_cache.send_file, client, target_chat_id, files if album else files[0], **kwargs
+        )
+        self._record_send_mode(context, 'upload', len(files))
+        return sent
+
+    def _should_reference(self, context):
+        """
+        发送客户端是否值得尝试引用源消息的媒体
+
+        文件引用属于收到消息的账号；机器人模式下由机器人发送，机器人通常不在源聊天中，
+        引用会失败并浪费一次请求和一个发送令牌，因此失败过的(机器人, 源聊天)一段时间内不再尝试
+        """
+        client = context.sender_client
+        if client is context.event.client:
+            return True
+        key = (id(client), context.event.chat_id)
+        failed_at = _reference_failures.get(key)
+        if failed_at is None:
+            return True
+        if time.monotonic() - failed_at < REFERENCE_RETRY_INTERVAL:
+            metrics.incr('sender.media_reference_skipped')
+            return False
+        del _reference_failures[key]
+        return True
+
+    def _can_reference(self, messages):
+        """源消息的媒体能否直接作为 send_file 的参数"""
+        try:
+            for message in messages:
+                telethon_utils.get_input_media(message.media)
+        except TypeError as e:
+            # send_file 用同一个函数转换媒体，网页预览、投票等类型无法转换为 InputMedia，只能下载后上传
+            logger.info(f'源消息媒体不能直接引用 ({str(e)})，改为下载后上传')
+            metrics.incr('sender.media_reference_fallbacks')
+            return False
+        return True
+
+    def _record_send_mode(self, context, mode, count):
+        """记录媒体发送走的方式"""
+        context.media_send_modes.append(mode)
+        metrics.incr(f'sender.media_{mode}', count)
+        logger.info(f'{count} 个媒体通过{"直接引用" if mode == "reference" else "下载后上传"}方式发送')
     
     async def _send_text_message(self, context, target_chat_id, parse_mode):
         """发送纯文本消息"""
         rule = context.rule
-        client = context.client
+        client = context.sender_client
         
         if not context.message_text:
             logger.info('没有文本内容，不发送消息')
@@ -284,7 +380,8 @@ class SenderFilter(BaseFilter):
         # 组合消息文本
         message_text = context.sender_info + context.message_text + context.time_info + context.original_link
         
-        await client.send_message(
+        await send_scheduler.send_message(
+            client,
             target_chat_id,
             str(message_text),
             parse_mode=parse_mode,
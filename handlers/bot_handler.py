@@ -125,6 +125,8 @@ async def handle_command(client, event):
         'dr': lambda: handle_delete_rule_command(event, command, parts),
         'delete_rss_user': lambda: handle_delete_rss_user_command(event, command, parts),
         'dru': lambda: handle_delete_rss_user_command(event, command, parts),
+        'regex_release': lambda: handle_regex_release_command(event, parts),
+        'rrl': lambda: handle_regex_release_command(event, parts),
     }
 
     # 执行对应的命令处理器
@@ -35,6 +35,9 @@ async def create_ai_settings_buttons(rule=None,rule_id=None):
         elif field == 'ai_model':
             current_value = getattr(rule, field)
             display_value = current_value or os.getenv('DEFAULT_AI_MODEL')
+        elif field == 'ai_fallback_model':
+            current_value = getattr(rule, field)
+            display_value = current_value or '不使用'
         else:
             current_value = getattr(rule, field)
             display_value = config['values'].get(current_value, str(current_value))
@@ -166,14 +169,19 @@ async def create_list_buttons(total_pages, current_page, command):
 
 
 # 添加模型选择按钮创建函数
-async def create_model_buttons(rule_id, page=0):
+async def create_model_buttons(rule_id, page=0, fallback=False):
     """创建模型选择按钮，支持分页
 
     Args:
         rule_id: 规则ID
         page: 当前页码（从0开始）
+        fallback: 是否为选择备用模型
     """
+    select_action = 'select_fallback_model' if fallback else 'select_model'
+    page_action = 'fallback_model_page' if fallback else 'model_page'
     buttons = []
+    if fallback:
+        buttons.append([Button.inline("不使用备用模型", f"{select_action}:{rule_id}:")])
     total_models = len(AI_MODELS)
     total_pages = (total_models + MODELS_PER_PAGE - 1) // MODELS_PER_PAGE
 
@@ -183,16 +191,16 @@ async def create_model_buttons(rule_id, page=0):
 
     # 添加模型按钮
     for model in AI_MODELS[start_idx:end_idx]:
-        buttons.append([Button.inline(f"{model}", f"select_model:{rule_id}:{model}")])
+        buttons.append([Button.inline(f"{model}", f"{select_action}:{rule_id}:{model}")])
 
     # 添加导航按钮
     nav_buttons = []
     if page > 0:  # 不是第一页，显示"上一页"
-        nav_buttons.append(Button.inline("⬅️ 上一页", f"model_page:{rule_id}:{page - 1}"))
+        nav_buttons.append(Button.inline("⬅️ 上一页", f"{page_action}:{rule_id}:{page - 1}"))
     # 添加页码显示在中间
     nav_buttons.append(Button.inline(f"{page + 1}/{total_pages}", f"noop:{rule_id}"))
     if page < total_pages - 1:  # 不是最后一页，显示"下一页"
-        nav_buttons.append(Button.inline("下一页 ➡️", f"model_page:{rule_id}:{page + 1}"))
+        nav_buttons.append(Button.inline("下一页 ➡️", f"{page_action}:{rule_id}:{page + 1}"))
     if nav_buttons:
         buttons.append(nav_buttons)
 
@@ -299,6 +299,50 @@ async def callback_change_model(event, rule_id, session, message, data):
     return
 
 
+async def callback_change_fallback_model(event, rule_id, session, message, data):
+    await event.edit("请选择备用AI模型（主模型较慢或出错时使用）：", buttons=await create_model_buttons(rule_id, page=0, fallback=True))
+    return
+
+
+async def callback_fallback_model_page(event, rule_id, session, message, data):
+    # 处理翻页
+    _, rule_id, page = data.split(':')
+    page = int(page)
+    await event.edit("请选择备用AI模型（主模型较慢或出错时使用）：", buttons=await create_model_buttons(rule_id, page=page, fallback=True))
+    return
+
+
+async def callback_select_fallback_model(event, rule_id, session, message, data):
+    # 第三部分为完整的模型名称，为空表示不使用备用模型
+    _, rule_id_part, model = data.split(':', 2)
+    model = model or None
+
+    try:
+        rule = session.query(ForwardRule).get(int(rule_id_part))
+        if rule:
+            rule.ai_fallback_model = model
+            logger.info(f"已更新规则 {rule_id_part} 的备用AI模型为: {model}")
+
+            # 同步到关联规则
+            if rule.enable_sync:
+                sync_rules = session.query(RuleSync).filter(RuleSync.rule_id == rule.id).all()
+                for sync_rule in sync_rules:
+                    target_rule = session.query(ForwardRule).get(sync_rule.sync_rule_id)
+                    if not target_rule:
+                        logger.warning(f"同步目标规则 {sync_rule.sync_rule_id} 不存在，跳过")
+                        continue
+                    target_rule.ai_fallback_model = model
+                    logger.info(f"同步规则 {sync_rule.sync_rule_id} 的备用AI模型为 {model}")
+
+            session.commit()
+
+            # 返回到 AI 设置页面
+            await event.edit(await get_ai_settings_text(rule), buttons=await create_ai_settings_buttons(rule))
+    finally:
+        session.close()
+    return
+
+
 
 async def callback_cancel_set_prompt(event, rule_id, session, message, data):
     # 处理取消设置提示词
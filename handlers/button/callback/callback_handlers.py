@@ -651,6 +651,9 @@ CALLBACK_HANDLERS = {
     'select_model': callback_select_model,
     'model_page': callback_model_page,
     'change_model': callback_change_model,
+    'select_fallback_model': callback_select_fallback_model,
+    'fallback_model_page': callback_fallback_model_page,
+    'change_fallback_model': callback_change_fallback_model,
     'cancel_set_prompt': callback_cancel_set_prompt,
     'cancel_set_summary': callback_cancel_set_summary,
     'summary_now':callback_summary_now,
@@ -221,6 +221,11 @@ AI_SETTINGS = {
         'toggle_action': 'change_model',
         'toggle_func': None
     },
+    'ai_fallback_model': {
+        'display_name': '备用模型',
+        'toggle_action': 'change_fallback_model',
+        'toggle_func': None
+    },
     'ai_prompt': {
         'display_name': '设置AI处理提示词',
         'toggle_action': 'set_ai_prompt',
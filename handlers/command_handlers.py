@@ -13,11 +13,13 @@ from version import VERSION, UPDATE_INFO
 import shlex
 import logging
 import os
+import time
 import aiohttp
 from utils.constants import RSS_HOST, RSS_PORT
 import models.models as models
 from utils.auto_delete import respond_and_delete,reply_and_delete,async_delete_user_message
 from utils.common import get_bot_client
+from utils.regex_service import regex_service
 from handlers.button.settings_manager import create_settings_text, create_buttons
 
 logger = logging.getLogger(__name__)
@@ -824,7 +826,10 @@ async def handle_help_command(event, command):
         "/import_replace(/ir) <同时发送文件> - 导入替换规则\n\n"
 
         "**RSS相关**\n"
-        "/delete_rss_user(/dru) [用户名] - 删除RSS用户\n"
+        "/delete_rss_user(/dru) [用户名] - 删除RSS用户\n\n"
+
+        "**正则表达式**\n"
+        "/regex_release(/rrl) [序号|all] - 查看或解除因执行超时被隔离的正则表达式\n\n"
 
         "**UFB相关**\n"
         "/ufb_bind(/ub) <域名> - 绑定UFB域名\n"
@@ -2251,3 +2256,42 @@ async def handle_delete_rss_user_command(event, command, parts):
         await reply_and_delete(event,error_message)
     finally:
         session.close()
+
+
+async def handle_regex_release_command(event, parts):
+    """处理 regex_release 命令，列出或解除因执行超时被隔离的正则表达式"""
+    await async_delete_user_message(event.client, event.message.chat_id, event.message.id, 0)
+    quarantined = list(regex_service.quarantined().items())
+    if not quarantined:
+        await reply_and_delete(event, "没有被隔离的正则表达式")
+        return
+
+    if len(parts) == 1:
+        lines = []
+        for i, (pattern, info) in enumerate(quarantined, 1):
+            remaining = max(0, regex_service.quarantine_ttl - (time.time() - info['time']))
+            lines.append(f"{i}. `{pattern}`\n   耗时超过 {info['elapsed']:.1f}s，文本长度 {info['text_length']}，{remaining:.0f} 秒后自动解除")
+        await reply_and_delete(
+            event,
+            "被隔离的正则表达式：\n\n" + "\n".join(lines) +
+            "\n\n使用 `/regex_release <序号> [序号] ...` 或 `/regex_release all` 解除隔离"
+        )
+        return
+
+    if parts[1].lower() == 'all':
+        patterns = [pattern for pattern, _ in quarantined]
+    else:
+        try:
+            indexes = [int(part) for part in parts[1:]]
+        except ValueError:
+            await reply_and_delete(event, "序号必须是数字")
+            return
+        invalid = [index for index in indexes if not 1 <= index <= len(quarantined)]
+        if invalid:
+            await reply_and_delete(event, f"无效的序号: {', '.join(map(str, invalid))}")
+            return
+        patterns = [quarantined[index - 1][0] for index in indexes]
+
+    released = [pattern for pattern in patterns if regex_service.release(pattern)]
+    logger.info(f'管理员解除了 {len(released)} 个正则表达式的隔离')
+    await reply_and_delete(event, f"已解除 {len(released)} 个正则表达式的隔离：\n" + "\n".join(f"`{pattern}`" for pattern in released))
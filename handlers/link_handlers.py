@@ -3,6 +3,8 @@ import os
 import logging
 from utils.common import get_main_module, get_user_id
 from utils.constants import TEMP_DIR
+from managers.media_downloader import media_downloader
+from managers.send_scheduler import send_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -77,20 +79,18 @@ async def handle_media_group(client, user_client, chat_id, message, event):
                     buttons = grouped_message.buttons if hasattr(grouped_message, 'buttons') else None
 
         if media_group_messages:
-            # 下载所有媒体文件
-            for msg in media_group_messages:
-                if msg.media:
-                    try:
-                        file_path = await msg.download_media(TEMP_DIR)
-                        if file_path:
-                            files.append(file_path)
-                            logger.info(f'已下载媒体文件: {file_path}')
-                    except Exception as e:
-                        logger.error(f'下载媒体文件失败: {str(e)}')
+            # 并发下载所有媒体文件，顺序与原媒体组一致
+            paths = await media_downloader.download_album(
+                [msg for msg in media_group_messages if msg.media],
+                lambda msg: media_downloader.download(msg, TEMP_DIR)
+            )
+            files.extend(file_path for file_path in paths if file_path)
+            logger.info(f'已下载媒体文件: {len(files)} 个')
 
             if files:
                 # 发送媒体组
-                await client.send_file(
+                await send_scheduler.send_file(
+                    client,
                     event.chat_id,
                     files,
                     caption=caption,
@@ -121,11 +121,12 @@ async def handle_single_message(client, message, event):
     try:
         if message.media:
             # 处理媒体消息
-            file_path = await message.download_media(TEMP_DIR)
+            file_path = await media_downloader.download(message, TEMP_DIR)
             if file_path:
                 logger.info(f'已下载媒体文件: {file_path}')
                 caption = message.text if message.text else ''
-                await client.send_file(
+                await send_scheduler.send_file(
+                    client,
                     event.chat_id,
                     file_path,
                     caption=caption,
@@ -135,7 +136,8 @@ async def handle_single_message(client, message, event):
                 logger.info('已转发单条媒体消息')
         else:
             # 处理纯文本消息
-            await client.send_message(
+            await send_scheduler.send_message(
+                client,
                 event.chat_id,
                 message.text,
                 parse_mode=parse_mode,
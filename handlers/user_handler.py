@@ -3,11 +3,12 @@ import re
 import logging
 import asyncio
 from utils.common import check_keywords, get_sender_info
+from managers.forward_batcher import forward_batcher
 
 
 logger = logging.getLogger(__name__)
 
-async def process_forward_rule(client, event, chat_id, rule):
+async def process_forward_rule(client, event, chat_id, rule, album=None):
     """处理转发规则（用户模式）"""
 
     
@@ -15,7 +16,7 @@ async def process_forward_rule(client, event, chat_id, rule):
         logger.info(f'规则 ID: {rule.id} 已禁用，跳过处理')
         return
     
-    message_text = event.message.text or ''
+    message_text = (album.text if album else event.message.text) or ''
     check_message_text = message_text
     # 添加日志
     logger.info(f'处理规则 ID: {rule.id}')
@@ -42,43 +43,44 @@ async def process_forward_rule(client, event, chat_id, rule):
         try:
             
             
-            if event.message.grouped_id:
-                # 等待一段时间以确保收到所有媒体组消息
-                await asyncio.sleep(1)
+            # 只把消息加入合并批次，不在按目标聊天顺序处理的任务中等待合并窗口，
+            # 下一条发往同一目标的消息才能合并到同一次请求中，转发结果在完成后记录
+            if album:
+                # 监听器已收集好完整的媒体组，按照ID顺序转发
+                messages = album.ids
                 
-                # 收集媒体组的所有消息
-                messages = []
-                async for message in client.iter_messages(
-                    event.chat_id,
-                    limit=20,  # 限制搜索范围
-                    min_id=event.message.id - 10,
-                    max_id=event.message.id + 10
-                ):
-                    if message.grouped_id == event.message.grouped_id:
-                        messages.append(message.id)
-                        logger.info(f'找到媒体组消息: ID={message.id}')
-                
-                # 按照ID排序，确保转发顺序正确
-                messages.sort()
-                
-                # 一次性转发所有消息
-                await client.forward_messages(
+                # 媒体组的消息放在同一次请求中转发
+                future = forward_batcher.submit(
+                    client,
                     target_chat_id,
                     messages,
                     event.chat_id
                 )
-                logger.info(f'[用户] 已转发 {len(messages)} 条媒体组消息到: {target_chat.name} ({target_chat_id})')
+                success_message = f'[用户] 已转发 {len(messages)} 条媒体组消息到: {target_chat.name} ({target_chat_id})'
                 
             else:
-                # 处理单条消息
-                await client.forward_messages(
+                # 处理单条消息，合并窗口内发往同一目标的消息一起转发
+                future = forward_batcher.submit(
+                    client,
                     target_chat_id,
                     event.message.id,
                     event.chat_id
                 )
-                logger.info(f'[用户] 消息已转发到: {target_chat.name} ({target_chat_id})')
+                success_message = f'[用户] 消息已转发到: {target_chat.name} ({target_chat_id})'
                 
+            future.add_done_callback(lambda done: _log_forward_result(done, success_message))
                 
         except Exception as e:
             logger.error(f'转发消息时出错: {str(e)}')
-            logger.exception(e) 
\ No newline at end of file
+            logger.exception(e) 
+
+
+def _log_forward_result(future, success_message):
+    """记录合并转发的结果"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error(f'转发消息时出错: {str(error)}', exc_info=error)
+    else:
+        logger.info(success_message)
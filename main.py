@@ -1,7 +1,7 @@
 from telethon import TelegramClient, types
 from telethon.tl.types import BotCommand
 from telethon.tl.functions.bots import SetBotCommandsRequest
-from models.models import init_db
+from models.models import init_db, get_session, ForwardRule
 from dotenv import load_dotenv
 from message_listener import setup_listeners
 import os
@@ -9,12 +9,25 @@ import asyncio
 import logging
 import uvicorn
 import multiprocessing
+import queue
+import signal
 from models.db_operations import DBOperations
 from scheduler.summary_scheduler import SummaryScheduler
 from scheduler.chat_updater import ChatUpdater
 from handlers.bot_handler import send_welcome_message
 from rss.main import app as rss_app
 from utils.log_config import setup_logging
+from managers.ingestion_queue import ingestion_queue
+from managers.forward_batcher import forward_batcher
+from managers.mutation_batcher import mutation_batcher
+from managers.media_cache import media_cache
+from managers.bot_pool import bot_pool
+from utils.regex_service import regex_service
+from utils.constants import AI_WARMUP, DEFAULT_AI_MODEL
+from ai import provider_registry
+from ai.result_cache import ai_result_cache
+from ai.router import parse_models
+from utils.common import get_admin_list
 
 # 设置Docker日志的默认配置，如果docker-compose.yml中没有配置日志选项将使用这些值
 os.environ.setdefault('DOCKER_LOG_MAX_SIZE', '10m')
@@ -80,12 +93,6 @@ os.makedirs('./sessions', exist_ok=True)
 os.makedirs('./temp', exist_ok=True)
 
 
-# 清空./temp文件夹
-def clear_temp_dir():
-    for file in os.listdir('./temp'):
-        os.remove(os.path.join('./temp', file))
-
-
 # 创建客户端
 user_client = TelegramClient('./sessions/user', api_id, api_hash)
 bot_client = TelegramClient('./sessions/bot', api_id, api_hash)
@@ -94,8 +101,15 @@ bot_client = TelegramClient('./sessions/bot', api_id, api_hash)
 engine = init_db()
 
 
-def run_rss_server(host: str, port: int):
+def run_rss_server(host: str, port: int, regex_reports=None):
     """在新进程中运行 RSS 服务器"""
+    # 子进程不能使用主进程的正则子进程，在启动服务之前创建自己的
+    regex_service.start()
+    if regex_reports is not None:
+        # RSS 进程没有机器人客户端，隔离通知交给主进程发送给管理员
+        async def report(text):
+            regex_reports.put_nowait(f'[RSS] {text}')
+        regex_service.set_reporter(report)
     uvicorn.run(
         rss_app,
         host=host,
@@ -103,6 +117,21 @@ def run_rss_server(host: str, port: int):
     )
 
 
+def get_ai_models_in_use():
+    """启用了AI处理或AI总结的规则使用的模型"""
+    session = get_session()
+    try:
+        rules = session.query(ForwardRule.ai_model, ForwardRule.ai_fallback_model).filter(
+            (ForwardRule.is_ai == True) | (ForwardRule.is_summary == True)
+        ).distinct().all()
+        models = [DEFAULT_AI_MODEL]
+        for rule in rules:
+            models.extend(parse_models(rule.ai_model, rule.ai_fallback_model))
+        return models
+    finally:
+        session.close()
+
+
 async def start_clients():
     # 初始化 DBOperations
     global db_ops, scheduler, chat_updater
@@ -119,6 +148,16 @@ async def start_clients():
         me_bot = await bot_client.get_me()
         print(f'机器人客户端已启动: {me_bot.first_name} (@{me_bot.username})')
 
+        # 启动额外的发送机器人
+        await bot_pool.start(bot_client, api_id, api_hash)
+
+        # 启动临时文件存储的后台清理
+        media_cache.start()
+
+        # 后台预热规则中使用的AI模型，第一条AI消息不再等待建立连接
+        if AI_WARMUP:
+            asyncio.create_task(provider_registry.warm_up(get_ai_models_in_use()))
+
         # 设置消息监听器
         await setup_listeners(user_client, bot_client)
 
@@ -141,11 +180,13 @@ async def start_clients():
                 logger.info(f"正在启动 RSS 服务 (host={rss_host}, port={rss_port})")
                 
                 # 在新进程中启动 RSS 服务
+                regex_reports = multiprocessing.Queue()
                 rss_process = multiprocessing.Process(
                     target=run_rss_server,
-                    args=(rss_host, rss_port)
+                    args=(rss_host, rss_port, regex_reports)
                 )
                 rss_process.start()
+                asyncio.create_task(forward_rss_reports(regex_reports, rss_process))
                 logger.info("RSS 服务启动成功")
             except Exception as e:
                 logger.error(f"启动 RSS 服务失败: {str(e)}")
@@ -156,12 +197,27 @@ async def start_clients():
         # 发送欢迎消息
         await send_welcome_message(bot_client)
 
+        # 收到停止信号时先处理完队列中的消息再断开客户端
+        register_shutdown_handler()
+
+        # 正则表达式执行超时被隔离时通知管理员
+        regex_service.set_reporter(report_to_admins)
+
         # 等待两个客户端都断开连接
         await asyncio.gather(
             user_client.run_until_disconnected(),
             bot_client.run_until_disconnected()
         )
     finally:
+        # 处理完队列中剩余的消息
+        await ingestion_queue.drain()
+        # 发送还在合并窗口中的转发、删除和编辑
+        await forward_batcher.drain()
+        await mutation_batcher.drain()
+        await media_cache.stop()
+        await bot_pool.stop()
+        await provider_registry.close()
+        ai_result_cache.close()
         # 关闭 DBOperations
         if db_ops and hasattr(db_ops, 'close'):
             await db_ops.close()
@@ -177,6 +233,47 @@ async def start_clients():
             rss_process.join()
 
 
+async def shutdown():
+    """停止接收新消息，处理完队列后断开客户端"""
+    logger.info("收到停止信号，正在关闭...")
+    await ingestion_queue.drain()
+    await forward_batcher.drain()
+    await mutation_batcher.drain()
+    await user_client.disconnect()
+    await bot_client.disconnect()
+
+
+async def report_to_admins(text):
+    """通过机器人向管理员发送通知"""
+    for admin_id in get_admin_list():
+        await bot_client.send_message(admin_id, text)
+
+
+async def forward_rss_reports(reports, process):
+    """把 RSS 进程中的正则隔离通知转发给管理员"""
+    loop = asyncio.get_running_loop()
+    while process.is_alive():
+        try:
+            text = await loop.run_in_executor(None, reports.get, True, 1)
+        except queue.Empty:
+            continue
+        try:
+            await report_to_admins(text)
+        except Exception as e:
+            logger.error(f'发送RSS正则隔离通知失败: {str(e)}')
+
+
+def register_shutdown_handler():
+    """注册 SIGTERM/SIGINT 处理"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(shutdown()))
+        except (NotImplementedError, RuntimeError):
+            # Windows 不支持 add_signal_handler
+            pass
+
+
 async def register_bot_commands(bot):
     """注册机器人命令"""
     # # 先清空现有命令
@@ -341,6 +438,10 @@ async def register_bot_commands(bot):
             command='delete_rss_user',
             description='删除RSS用户'
         ),
+        BotCommand(
+            command='regex_release',
+            description='查看或解除被隔离的正则表达式'
+        ),
 
 
         # BotCommand(
@@ -364,6 +465,9 @@ async def register_bot_commands(bot):
 
 
 if __name__ == '__main__':
+    # 在事件循环和线程池启动之前创建正则表达式子进程
+    regex_service.start()
+
     # 运行事件循环
     loop = asyncio.get_event_loop()
     try:
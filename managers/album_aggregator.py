@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+
+from utils.constants import ALBUM_QUIET_WINDOW, ALBUM_MAX_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class Album:
+    """
+    媒体组，包含同一 grouped_id 下的全部消息，按消息ID升序排列
+    """
+
+    def __init__(self, chat_id, grouped_id, messages):
+        self.chat_id = chat_id
+        self.grouped_id = grouped_id
+        self.messages = sorted(messages, key=lambda message: message.id)
+
+    @property
+    def ids(self):
+        """媒体组内所有消息ID"""
+        return [message.id for message in self.messages]
+
+    @property
+    def first(self):
+        """媒体组内ID最小的消息"""
+        return self.messages[0]
+
+    @property
+    def caption_message(self):
+        """携带文本的第一条消息，没有则返回None"""
+        for message in self.messages:
+            if message.text:
+                return message
+        return None
+
+    @property
+    def text(self):
+        """媒体组的文本"""
+        message = self.caption_message
+        return message.text if message else ''
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+
+class AlbumAggregator:
+    """
+    媒体组聚合器
+
+    收集同一媒体组的 NewMessage 更新，在静默窗口内没有新的组内消息
+    （或达到最长等待时间）后，一次性回调完整的 Album。
+    """
+
+    def __init__(self, quiet_window=ALBUM_QUIET_WINDOW, max_wait=ALBUM_MAX_WAIT):
+        self.quiet_window = quiet_window
+        self.max_wait = max_wait
+        self._pending = {}
+
+    def add(self, key, event, callback):
+        """
+        添加一条媒体组消息
+
+        Args:
+            key: 媒体组唯一键（源聊天ID + grouped_id）
+            event: 消息事件
+            callback: 媒体组收集完成后的回调，签名为 async callback(first_event, album)
+
+        Returns:
+            bool: 是否为该媒体组收集到的第一条消息
+        """
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(key)
+        is_first = pending is None
+        if is_first:
+            pending = {
+                'events': [],
+                'started': time.monotonic(),
+                'callback': callback,
+                'timer': None,
+            }
+            self._pending[key] = pending
+        else:
+            pending['timer'].cancel()
+
+        pending['events'].append(event)
+
+        # 超过最长等待时间则立即分发，否则重新开始静默计时
+        elapsed = time.monotonic() - pending['started']
+        delay = max(0.0, min(self.quiet_window, self.max_wait - elapsed))
+        pending['timer'] = loop.call_later(delay, self._flush, key)
+        return is_first
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        events = pending['events']
+        first_event = events[0]
+        album = Album(
+            first_event.chat_id,
+            first_event.message.grouped_id,
+            [event.message for event in events]
+        )
+        logger.info(f'媒体组 {key} 收集完成，共 {len(album)} 条消息，耗时 {time.monotonic() - pending["started"]:.2f}s')
+        asyncio.create_task(self._dispatch(key, pending['callback'], first_event, album))
+
+    async def _dispatch(self, key, callback, first_event, album):
+        try:
+            await callback(first_event, album)
+        except Exception as e:
+            logger.error(f'处理媒体组 {key} 时出错: {str(e)}')
+            logger.exception(e)
+
+    def pending_count(self):
+        """正在收集中的媒体组数量"""
+        return len(self._pending)
+
+
+# 创建全局实例
+album_aggregator = AlbumAggregator()
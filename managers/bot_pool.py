@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+
+from telethon import TelegramClient
+
+from managers.send_scheduler import send_scheduler
+from utils.constants import EXTRA_BOT_TOKENS, BOT_POOL_PERMISSION_TTL
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BotPool:
+    """
+    多个机器人账号共同承担发送
+
+    - 每个目标聊天固定分配给一个机器人，保证同一目标的发送顺序
+    - 只分配给在目标聊天中是管理员的机器人，主机器人始终可用
+    - 机器人触发 FloodWait 后，在限制期间把它负责的目标切换到其他可用的机器人；
+      切换前等待原机器人队列中该目标已提交的请求发完，新的发送不会抢在它们前面
+    - 没有配置额外机器人时所有发送仍由主机器人完成
+    """
+
+    def __init__(self, tokens=EXTRA_BOT_TOKENS, permission_ttl=BOT_POOL_PERMISSION_TTL):
+        self._tokens = tokens
+        self._permission_ttl = permission_ttl
+        self._primary = None
+        self.clients = []
+        self._assignments = {}
+        self._permissions = {}
+        self._flooded_until = {}
+        self._locks = {}
+
+    async def start(self, primary, api_id, api_hash):
+        """
+        启动额外的机器人客户端
+
+        Args:
+            primary: 已启动的主机器人客户端
+        """
+        self._primary = primary
+        self.clients = [primary]
+        for index, token in enumerate(self._tokens, 1):
+            client = TelegramClient(f'./sessions/bot_{index}', api_id, api_hash)
+            try:
+                await client.start(bot_token=token)
+                me = await client.get_me()
+                self.clients.append(client)
+                logger.info(f'额外机器人已启动: {me.first_name} (@{me.username})')
+            except Exception as e:
+                logger.error(f'启动第 {index} 个额外机器人失败: {str(e)}')
+        send_scheduler.add_flood_listener(self._on_flood)
+        if len(self.clients) > 1:
+            # Telethon 默认在客户端内部等待 60 秒以内的 FloodWait，发送调度器和切换逻辑都看不到；
+            # 改为立即抛出，由发送调度器暂停队列并通知机器人池
+            for client in self.clients:
+                client.flood_sleep_threshold = 0
+            logger.info(f'发送机器人池: 共 {len(self.clients)} 个机器人')
+
+    async def stop(self):
+        for client in self.clients[1:]:
+            await client.disconnect()
+        self.clients = self.clients[:1]
+
+    def _is_flooded(self, client):
+        return self._flooded_until.get(id(client), 0) > time.monotonic()
+
+    def _on_flood(self, client, chat, seconds):
+        if client not in self.clients or len(self.clients) <= 1:
+            return
+        self._flooded_until[id(client)] = time.monotonic() + seconds
+        logger.warning(f'机器人 {self.clients.index(client)} 触发频率限制 {seconds} 秒，期间由其他机器人发送')
+
+    async def _can_post(self, client, target):
+        """机器人是否是目标聊天的管理员"""
+        if client is self._primary:
+            return True
+        key = (id(client), target)
+        cached = self._permissions.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        try:
+            permissions = await client.get_permissions(target, 'me')
+            allowed = bool(permissions.is_admin)
+        except Exception as e:
+            logger.debug(f'检查机器人在 {target} 中的权限失败: {str(e)}')
+            allowed = False
+        self._permissions[key] = (allowed, time.monotonic() + self._permission_ttl)
+        return allowed
+
+    async def client_for(self, target):
+        """
+        获取负责某个目标聊天的机器人
+
+        Args:
+            target: 目标聊天ID
+
+        Returns:
+            TelegramClient: 发送用的机器人客户端
+        """
+        if len(self.clients) <= 1:
+            return self._primary
+        current = self._assignments.get(target)
+        if current is not None and not self._is_flooded(current):
+            return current
+
+        lock = self._locks.setdefault(target, asyncio.Lock())
+        async with lock:
+            current = self._assignments.get(target)
+            if current is not None and not self._is_flooded(current):
+                return current
+            candidates = [
+                client for client in self.clients
+                if not self._is_flooded(client) and await self._can_post(client, target)
+            ]
+            if not candidates:
+                # 所有可用的机器人都在频率限制中，继续由原来的机器人排队发送
+                return current or self._primary
+            load = {}
+            for client in self._assignments.values():
+                load[id(client)] = load.get(id(client), 0) + 1
+            chosen = min(candidates, key=lambda client: load.get(id(client), 0))
+            if current is not None and current is not chosen:
+                # 触发限制的请求还在原机器人的队列中等待重试，等它和之后排队的请求发完再切换，
+                # 持有锁期间同一目标的其他发送也在这里等待
+                logger.info(f'目标 {target} 等待机器人 {self.clients.index(current)} 的队列发送完后切换')
+                await send_scheduler.wait_idle(current, target)
+            self._assignments[target] = chosen
+            if current is not None:
+                metrics.incr('bot_pool.failovers')
+                logger.info(f'目标 {target} 已切换到机器人 {self.clients.index(chosen)}')
+            else:
+                metrics.incr('bot_pool.assignments')
+                logger.info(f'目标 {target} 分配给机器人 {self.clients.index(chosen)}')
+            return chosen
+
+
+# 创建全局实例
+bot_pool = BotPool()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+
+from managers.send_scheduler import send_scheduler
+from utils.constants import FORWARD_BATCH_WINDOW, FORWARD_BATCH_SIZE
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram 单次 forward_messages 最多转发的消息数
+MAX_FORWARD_IDS = 100
+
+
+class _Batch:
+    def __init__(self, client, target, source):
+        self.client = client
+        self.target = target
+        self.source = source
+        self.ids = []
+        self.ids_set = set()
+        self.waiters = []
+        self.timer = None
+
+
+class ForwardBatcher:
+    """
+    用户模式转发的合并器
+
+    同一(客户端, 源聊天, 目标聊天)在合并窗口内提交的消息合并为一次 forward_messages 请求，
+    按消息ID升序转发；待转发的消息数达到上限时立即发送，不等窗口结束。
+    媒体组的消息总是放在同一个请求中，保持分组。
+
+    按目标聊天顺序处理的调用方应使用 submit：消息加入批次后立即返回，
+    不在顺序处理的任务中等待合并窗口，下一条消息才能进入同一批次。
+    """
+
+    def __init__(self, window=FORWARD_BATCH_WINDOW, max_size=FORWARD_BATCH_SIZE):
+        self.window = window
+        self.max_size = max(1, min(MAX_FORWARD_IDS, max_size))
+        self._pending = {}
+        self._sending = set()
+
+    async def forward(self, client, target, ids, source):
+        """
+        转发消息并等待结果，与 client.forward_messages(target, ids, source) 的参数和返回值一致
+
+        Args:
+            client: 用户客户端
+            target: 目标聊天ID
+            ids: 消息ID或消息ID列表
+            source: 源聊天ID
+
+        Returns:
+            转发后的消息，ids 为列表时返回列表
+        """
+        return await self.submit(client, target, ids, source)
+
+    def submit(self, client, target, ids, source):
+        """
+        把消息加入合并批次后立即返回，不等待合并窗口结束
+
+        同一(源聊天, 目标聊天)按调用 submit 的顺序转发
+
+        Args:
+            client: 用户客户端
+            target: 目标聊天ID
+            ids: 消息ID或消息ID列表
+            source: 源聊天ID
+
+        Returns:
+            asyncio.Future: 结果与 forward 的返回值相同
+        """
+        single = not isinstance(ids, (list, tuple))
+        ids = [ids] if single else list(ids)
+        if self.window <= 0:
+            return self._track(asyncio.ensure_future(self._forward_now(client, target, ids, source, single)))
+
+        key = (id(client), source, target)
+        batch = self._pending.get(key)
+        # 放不下或者重复的消息放到下一批
+        if batch is not None and (
+            len(batch.ids) + len(ids) > self.max_size or not batch.ids_set.isdisjoint(ids)
+        ):
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = _Batch(client, target, source)
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+            self._pending[key] = batch
+
+        future = asyncio.get_running_loop().create_future()
+        batch.ids.extend(ids)
+        batch.ids_set.update(ids)
+        batch.waiters.append((ids, single, future))
+        metrics.incr('forward_batch.submitted')
+        if len(batch.ids) >= self.max_size:
+            self._flush(key)
+        return future
+
+    async def _forward_now(self, client, target, ids, source, single):
+        result = await send_scheduler.forward_messages(client, target, ids, source)
+        return result[0] if single else result
+
+    def _track(self, task):
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+        return task
+
+    def _flush(self, key):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self._track(asyncio.create_task(self._send(batch)))
+
+    async def _send(self, batch):
+        ordered = sorted(batch.ids)
+        try:
+            sent = await send_scheduler.forward_messages(batch.client, batch.target, ordered, batch.source)
+        except BaseException as e:
+            for _, _, future in batch.waiters:
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        if not isinstance(sent, list):
+            sent = [sent]
+        by_id = dict(zip(ordered, sent))
+        for ids, single, future in batch.waiters:
+            if not future.done():
+                result = [by_id.get(message_id) for message_id in ids]
+                future.set_result(result[0] if single else result)
+
+        saved = len(batch.waiters) - 1
+        metrics.incr('forward_batch.requests')
+        metrics.incr('forward_batch.messages', len(ordered))
+        metrics.incr('forward_batch.saved_requests', saved)
+        if saved:
+            logger.info(f'[用户] 合并转发 {len(ordered)} 条消息到 {batch.target}，{len(batch.waiters)} 次请求合并为 1 次')
+
+    async def drain(self):
+        """立即发送所有等待合并的消息，并等待发送完成"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def pending_count(self):
+        """等待合并发送的消息数"""
+        return sum(len(batch.ids) for batch in self._pending.values())
+
+
+# 创建全局实例
+forward_batcher = ForwardBatcher()
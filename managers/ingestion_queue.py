@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from utils.constants import (
+    INGESTION_WORKERS, INGESTION_HIGH_WATERMARK, INGESTION_LOW_WATERMARK, INGESTION_DRAIN_TIMEOUT
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueue:
+    """
+    按源聊天划分的有序工作队列
+
+    - 每个源聊天一个先进先出队列，同一源聊天的任务严格按提交顺序开始执行
+    - 任务可以返回 asyncio.Future，表示顺序已经确定（例如规则已在各目标聊天排队），
+      剩余的处理在后台完成，源聊天的下一条任务不必等待延迟、AI处理或下载等耗时步骤
+    - 由固定数量的工作协程消费
+    - 积压任务数（含后台未完成的任务）超过高水位时，submit 会阻塞到积压降到低水位以下（背压）
+    """
+
+    def __init__(self, workers=INGESTION_WORKERS, high_watermark=INGESTION_HIGH_WATERMARK,
+                 low_watermark=INGESTION_LOW_WATERMARK):
+        self._worker_count = workers
+        self._high_watermark = high_watermark
+        self._low_watermark = min(low_watermark, high_watermark)
+        self._queues = {}
+        self._ready = None
+        self._workers = []
+        self._inflight = set()
+        self._pending = 0
+        self._accepting = None
+        self._idle = None
+        self._closed = False
+
+    def start(self):
+        """启动工作协程，需要在事件循环中调用"""
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._accepting = asyncio.Event()
+        self._accepting.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self._worker_count)]
+        logger.info(
+            f'消息处理队列已启动: {self._worker_count} 个工作协程, '
+            f'高水位 {self._high_watermark}, 低水位 {self._low_watermark}'
+        )
+
+    @property
+    def depth(self):
+        """当前积压（含执行中）的任务数"""
+        return self._pending
+
+    def source_depth(self, source_key):
+        """某个源聊天当前排队的任务数"""
+        queue = self._queues.get(source_key)
+        return len(queue) if queue else 0
+
+    async def submit(self, source_key, job):
+        """
+        提交任务
+
+        Args:
+            source_key: 源聊天标识，同一标识的任务按顺序执行
+            job: 无参数的协程函数，可以返回需要在后台等待完成的 asyncio.Future
+        """
+        if self._closed:
+            logger.warning(f'消息处理队列正在关闭，丢弃来自 {source_key} 的任务')
+            metrics.incr('ingestion.dropped')
+            return
+        if not self._workers:
+            # 队列未启动时直接执行
+            inflight = await job()
+            if inflight is not None:
+                await inflight
+            return
+
+        if not self._accepting.is_set():
+            metrics.incr('ingestion.backpressure_waits')
+            logger.warning(f'消息积压 {self._pending} 条，超过高水位，等待处理...')
+            await self._accepting.wait()
+            if self._closed:
+                logger.warning(f'消息处理队列正在关闭，丢弃来自 {source_key} 的任务')
+                metrics.incr('ingestion.dropped')
+                return
+
+        queue = self._queues.get(source_key)
+        if queue is None:
+            # 新的源聊天（或已空闲的源聊天）需要重新进入就绪队列
+            queue = deque()
+            self._queues[source_key] = queue
+            self._ready.put_nowait(source_key)
+        queue.append((job, time.perf_counter()))
+
+        self._pending += 1
+        self._idle.clear()
+        metrics.incr('ingestion.enqueued')
+        self._update_depth()
+        if self._pending >= self._high_watermark and self._accepting.is_set():
+            logger.warning(f'消息积压达到高水位 {self._high_watermark}，暂停接收新消息')
+            self._accepting.clear()
+
+    async def _worker(self, index):
+        while True:
+            source_key = await self._ready.get()
+            queue = self._queues.get(source_key)
+            job, enqueued_at = queue.popleft()
+            metrics.observe('ingestion.queue_time', time.perf_counter() - enqueued_at)
+            inflight = None
+            try:
+                inflight = await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'处理来自 {source_key} 的消息时出错: {str(e)}')
+                logger.exception(e)
+            finally:
+                if queue:
+                    # 同一源聊天还有任务，重新排到就绪队列末尾
+                    self._ready.put_nowait(source_key)
+                else:
+                    del self._queues[source_key]
+                if not asyncio.isfuture(inflight):
+                    self._finish()
+
+            if asyncio.isfuture(inflight):
+                # 顺序已经确定，剩余的处理在后台完成后才算任务结束
+                self._inflight.add(inflight)
+                inflight.add_done_callback(lambda future, key=source_key: self._on_inflight_done(key, future))
+                self._update_depth()
+
+    def _on_inflight_done(self, source_key, future):
+        self._inflight.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'处理来自 {source_key} 的消息时出错: {str(future.exception())}')
+        self._finish()
+
+    def _finish(self):
+        self._pending -= 1
+        metrics.incr('ingestion.processed')
+        self._update_depth()
+        if not self._accepting.is_set() and self._pending <= self._low_watermark:
+            logger.info(f'消息积压降到低水位 {self._low_watermark}，恢复接收新消息')
+            self._accepting.set()
+        if self._pending == 0:
+            self._idle.set()
+
+    def _update_depth(self):
+        metrics.set_gauge('ingestion.depth', self._pending)
+        metrics.set_gauge('ingestion.sources', len(self._queues))
+        metrics.set_gauge('ingestion.inflight', len(self._inflight))
+
+    async def drain(self, timeout=INGESTION_DRAIN_TIMEOUT):
+        """
+        停止接收新任务，等待已提交的任务处理完成后停止工作协程
+
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        self._closed = True
+        if not self._workers:
+            return
+        # 唤醒被背压阻塞的提交方，它们会因为队列关闭而丢弃任务
+        self._accepting.set()
+        if self._pending:
+            logger.info(f'正在处理剩余的 {self._pending} 条消息...')
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+                logger.info('剩余消息已全部处理')
+            except asyncio.TimeoutError:
+                logger.warning(f'等待超时，仍有 {self._pending} 条消息未处理')
+        for future in list(self._inflight):
+            future.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# 创建全局实例
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+
+from managers.media_downloader import media_downloader
+from utils.constants import (
+    TEMP_DIR, TEMP_QUOTA_MB, TEMP_IDLE_MAX_AGE, TEMP_ORPHAN_MAX_AGE, TEMP_SWEEP_INTERVAL
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 共享媒体缓存目录
+MEDIA_CACHE_DIR = os.path.join(TEMP_DIR, 'media_cache')
+
+
+def media_key(message):
+    """
+    媒体在Telegram中的唯一标识
+
+    Returns:
+        str: 'photo_<id>' 或 'document_<id>'，没有可识别的媒体时返回None
+    """
+    photo = getattr(message, 'photo', None)
+    if photo is not None and getattr(photo, 'id', None) is not None:
+        return f'photo_{photo.id}'
+    document = getattr(message, 'document', None)
+    if document is not None and getattr(document, 'id', None) is not None:
+        return f'document_{document.id}'
+    return None
+
+
+def _remove_orphans(directory, skip, max_age):
+    """删除目录下超过 max_age 秒未修改、且不在 skip 目录中的文件"""
+    removed = 0
+    now = time.time()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) not in skip]
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+class _CacheEntry:
+    def __init__(self, key, directory):
+        self.key = key
+        self.directory = directory
+        self.refs = 0
+        self.path = None
+        self.size = 0
+        self.download = None
+        self.last_used = time.monotonic()
+
+
+class MediaCache:
+    """
+    临时媒体文件的统一存储
+
+    - 按 Telegram 照片/文档ID 共享下载，同一媒体同时只下载一次，并发的使用方等待同一个下载
+    - 每次 acquire 增加一次引用，release 减少一次引用；消息上下文登记借用的文件，
+      过滤器链结束（包括出错和取消）时统一释放
+    - 没有引用的文件暂时保留供后续消息复用，总大小超过配额时按最近最少使用淘汰，
+      闲置超过 TEMP_IDLE_MAX_AGE 的文件由后台清理任务删除
+    - 后台清理任务同时删除临时目录中其他超过 TEMP_ORPHAN_MAX_AGE 的遗留文件
+    - 下载失败的媒体保留已下载的部分，下次获取同一媒体时在原目录中继续下载
+    """
+
+    def __init__(self, directory=MEDIA_CACHE_DIR, quota=TEMP_QUOTA_MB * 1024 * 1024,
+                 idle_max_age=TEMP_IDLE_MAX_AGE, orphan_max_age=TEMP_ORPHAN_MAX_AGE,
+                 sweep_interval=TEMP_SWEEP_INTERVAL):
+        self._directory = directory
+        self.quota = quota
+        self.idle_max_age = idle_max_age
+        self.orphan_max_age = orphan_max_age
+        self.sweep_interval = sweep_interval
+        self._entries = {}
+        self._paths = {}
+        self._idle = OrderedDict()
+        # 下载未完成的媒体所在目录，按媒体键记录
+        self._partial = {}
+        self._bytes = 0
+        self._sweeper = None
+
+    def start(self):
+        """清空上次运行遗留的缓存并启动后台清理任务，需要在事件循环中调用"""
+        if self._sweeper is not None:
+            return
+        if not self._entries:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        os.makedirs(self._directory, exist_ok=True)
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        logger.info(
+            f'临时文件存储已启动: 配额 {self.quota / 1024 / 1024:.0f}MB, '
+            f'闲置文件保留 {self.idle_max_age:g}s, 清理间隔 {self.sweep_interval:g}s'
+        )
+
+    async def stop(self):
+        """停止后台清理任务"""
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        await asyncio.gather(self._sweeper, return_exceptions=True)
+        self._sweeper = None
+
+    async def acquire(self, message):
+        """
+        获取消息媒体的本地文件，必要时下载
+
+        Args:
+            message: 带媒体的消息
+
+        Returns:
+            str: 本地文件路径，没有可下载的媒体时返回None
+        """
+        key = media_key(message) or f'uncached_{uuid.uuid4().hex}'
+        entry = self._entries.get(key)
+        if entry is None:
+            # 每个条目使用独立目录，已取消的下载清理目录时不会影响同一媒体的新下载；
+            # 上次下载未完成时沿用原目录，从已下载的分片继续
+            directory = self._partial.pop(key, None) or os.path.join(self._directory, f'{key}_{uuid.uuid4().hex[:8]}')
+            entry = _CacheEntry(key, directory)
+            self._entries[key] = entry
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+
+        if entry.path is not None:
+            self._idle.pop(key, None)
+            metrics.incr('media_cache.hits')
+            self._update_usage()
+            return entry.path
+
+        if entry.download is None:
+            metrics.incr('media_cache.misses')
+            entry.download = asyncio.ensure_future(self._download(entry, message))
+        else:
+            metrics.incr('media_cache.inflight_hits')
+
+        try:
+            path = await asyncio.shield(entry.download)
+        except BaseException:
+            self._release_entry(entry)
+            raise
+        if path is None:
+            self._release_entry(entry)
+        return path
+
+    async def _download(self, entry, message):
+        os.makedirs(entry.directory, exist_ok=True)
+        try:
+            with metrics.timer('media_cache.download_time'):
+                path = await media_downloader.download(message, entry.directory)
+        except BaseException:
+            # 下载失败，让下一次 acquire 重新下载
+            entry.download = None
+            raise
+        if path:
+            entry.path = path
+            entry.size = os.path.getsize(path)
+            self._paths[path] = entry
+            self._bytes += entry.size
+            logger.info(f'媒体文件已下载到共享缓存: {path}')
+            self._enforce_quota()
+        else:
+            entry.download = None
+        return path
+
+    def release(self, path):
+        """
+        释放一次文件引用
+
+        Args:
+            path: acquire 返回的文件路径
+        """
+        entry = self._paths.get(path)
+        if entry is None:
+            return
+        self._release_entry(entry)
+
+    def _release_entry(self, entry):
+        entry.refs -= 1
+        if entry.refs > 0:
+            return
+        entry.last_used = time.monotonic()
+        if entry.path is not None:
+            # 没有引用的文件暂时保留，超过配额或闲置过久时删除
+            self._idle[entry.key] = entry
+            self._enforce_quota()
+            return
+        if entry.download is not None and not entry.download.done():
+            # 所有使用方都已取消，停止下载，下载任务结束后再删除目录
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            entry.download.cancel()
+            entry.download.add_done_callback(lambda _: self._discard_unfinished(entry))
+            return
+        self._discard_unfinished(entry)
+
+    def _discard_unfinished(self, entry):
+        """删除没有下载成功的条目，目录中有未完成的下载时保留目录供下次继续"""
+        if entry.path is None and not entry.key.startswith('uncached_') and self._has_resumable(entry.directory):
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            stale = self._partial.get(entry.key)
+            if stale is not None and stale != entry.directory:
+                shutil.rmtree(stale, ignore_errors=True)
+            self._partial[entry.key] = entry.directory
+            self._update_usage()
+            return
+        self._discard(entry)
+
+    @staticmethod
+    def _has_resumable(directory):
+        """目录中是否有可以继续的分片下载"""
+        try:
+            return any(name.endswith('.part.done') for name in os.listdir(directory))
+        except OSError:
+            return False
+
+    def _discard(self, entry):
+        """删除条目及其文件"""
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        self._idle.pop(entry.key, None)
+        if entry.path is not None and self._paths.pop(entry.path, None) is not None:
+            self._bytes -= entry.size
+            logger.info(f'已删除临时媒体文件: {entry.path}')
+        shutil.rmtree(entry.directory, ignore_errors=True)
+        self._update_usage()
+
+    def _enforce_quota(self):
+        """总大小超过配额时删除最久未使用的闲置文件"""
+        while self._bytes > self.quota and self._idle:
+            _, entry = self._idle.popitem(last=False)
+            metrics.incr('media_cache.evictions')
+            self._discard(entry)
+        if self._bytes > self.quota:
+            logger.warning(
+                f'临时文件占用 {self._bytes / 1024 / 1024:.1f}MB，超过配额 '
+                f'{self.quota / 1024 / 1024:.0f}MB，但剩余文件都在使用中'
+            )
+        self._update_usage()
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f'清理临时文件时出错: {str(e)}')
+
+    async def sweep(self):
+        """删除闲置过久的缓存文件和临时目录中的遗留文件"""
+        now = time.monotonic()
+        expired = [entry for entry in self._idle.values() if now - entry.last_used > self.idle_max_age]
+        for entry in expired:
+            self._discard(entry)
+        if expired:
+            metrics.incr('media_cache.swept', len(expired))
+            logger.info(f'已清理 {len(expired)} 个闲置的临时媒体文件')
+
+        # 缓存中的文件由引用计数管理，不参与遗留文件清理
+        skip = {entry.directory for entry in self._entries.values()}
+        removed = await asyncio.to_thread(_remove_orphans, TEMP_DIR, skip, self.orphan_max_age)
+        if removed:
+            metrics.incr('media_cache.orphans_removed', removed)
+            logger.info(f'已清理临时目录中 {removed} 个遗留文件')
+        # 未完成的下载文件超过保留时间被清理后，不再记录其目录
+        for key, directory in list(self._partial.items()):
+            if not self._has_resumable(directory):
+                del self._partial[key]
+                shutil.rmtree(directory, ignore_errors=True)
+        self._update_usage()
+
+    def _update_usage(self):
+        metrics.set_gauge('media_cache.files', len(self._paths))
+        metrics.set_gauge('media_cache.idle_files', len(self._idle))
+        metrics.set_gauge('media_cache.partial_downloads', len(self._partial))
+        metrics.set_gauge('media_cache.bytes', self._bytes)
+        try:
+            metrics.set_gauge('media_cache.disk_free_bytes', shutil.disk_usage(TEMP_DIR).free)
+        except OSError:
+            pass
+
+    def refs(self, path):
+        """文件当前的引用数"""
+        entry = self._paths.get(path)
+        return entry.refs if entry else 0
+
+
+# 创建全局实例
+media_cache = MediaCache()
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+import time
+
+from telethon.errors import FileReferenceExpiredError, FloodWaitError
+
+from utils.constants import (
+    DOWNLOAD_CONNECTIONS, DOWNLOAD_PART_SIZE_KB, DOWNLOAD_PARALLEL_MIN_SIZE_MB, DOWNLOAD_PART_RETRIES,
+    ALBUM_DOWNLOAD_CONCURRENCY
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram 单次 GetFile 请求允许的分片大小范围
+MIN_PART_SIZE = 4 * 1024
+MAX_PART_SIZE = 512 * 1024
+
+
+def _normalize_part_size(size):
+    """分片大小需要是 4KB 到 512KB 之间的 2 的幂，保证分片不跨越 1MB 边界"""
+    size = max(MIN_PART_SIZE, min(MAX_PART_SIZE, size))
+    return 1 << (size.bit_length() - 1)
+
+
+def _unique_path(path):
+    """文件已存在时在文件名后加序号"""
+    if not os.path.exists(path):
+        return path
+    base, ext = os.path.splitext(path)
+    index = 1
+    while os.path.exists(f'{base} ({index}){ext}'):
+        index += 1
+    return f'{base} ({index}){ext}'
+
+
+class MediaDownloader:
+    """
+    大文件并行分片下载
+
+    - 文件按固定大小分片，多个协程同时请求不同分片，分片直接写入磁盘对应位置，不在内存中保留整个文件
+    - 单个分片失败只重试该分片，已完成的分片不会重新下载；文件引用过期时重新获取消息后继续
+    - 下载失败时保留 .part 文件和已完成分片的记录（.part.done），再次下载到同一路径时只下载缺少的分片
+    - 小于阈值的文件和照片仍使用 message.download_media
+    """
+
+    def __init__(self, connections=DOWNLOAD_CONNECTIONS, part_size=DOWNLOAD_PART_SIZE_KB * 1024,
+                 min_size=DOWNLOAD_PARALLEL_MIN_SIZE_MB * 1024 * 1024, retries=DOWNLOAD_PART_RETRIES,
+                 album_concurrency=ALBUM_DOWNLOAD_CONCURRENCY):
+        self.connections = max(1, connections)
+        self.part_size = _normalize_part_size(part_size)
+        self.min_size = min_size
+        self.retries = retries
+        self._album_concurrency = max(1, album_concurrency)
+        self._album_slots = None
+
+    def _is_parallel(self, message):
+        document = getattr(message, 'document', None)
+        return (
+            self.connections > 1
+            and document is not None
+            and (document.size or 0) >= self.min_size
+            and getattr(message, 'client', None) is not None
+        )
+
+    def _target_path(self, message, file):
+        if file is not None and not os.path.isdir(file):
+            return file
+        directory = file or '.'
+        name = message.file.name if message.file else None
+        if not name:
+            ext = message.file.ext if message.file else ''
+            name = f"document_{message.date.strftime('%Y-%m-%d_%H-%M-%S')}{ext or ''}"
+        return _unique_path(os.path.join(directory, os.path.basename(name)))
+
+    async def download(self, message, file=None):
+        """
+        下载消息中的媒体
+
+        Args:
+            message: 带媒体的消息
+            file: 保存的目录或文件路径，与 message.download_media 的参数一致
+
+        Returns:
+            str: 保存的文件路径，没有媒体时返回None
+        """
+        started = time.perf_counter()
+        if not self._is_parallel(message):
+            path = await message.download_media(file)
+            if path:
+                self._record('serial', os.path.getsize(path), time.perf_counter() - started)
+            return path
+
+        path = self._target_path(message, file)
+        size = message.document.size
+        await self._download_parts(message, path, size)
+        self._record('parallel', size, time.perf_counter() - started)
+        return path
+
+    async def _download_parts(self, message, path, size):
+        part_count = (size + self.part_size - 1) // self.part_size
+        temp_path = path + '.part'
+        progress_path = temp_path + '.done'
+        # 记录文件的第一行标识下载的内容，不一致时不能续传
+        header = f'{message.document.id} {size} {self.part_size}'
+        done = self._load_progress(temp_path, progress_path, header)
+
+        parts = asyncio.Queue()
+        for index in range(part_count):
+            if index not in done:
+                parts.put_nowait(index)
+        if done:
+            logger.info(f'继续下载 {os.path.basename(path)}: 已完成 {len(done)}/{part_count} 个分片')
+            metrics.incr('media_download.resumed_parts', len(done))
+        else:
+            # 预先分配文件大小，各分片写入各自的位置
+            with open(temp_path, 'wb') as f:
+                f.truncate(size)
+            with open(progress_path, 'w') as progress:
+                progress.write(header + '\n')
+
+        state = {'message': message}
+        with open(temp_path, 'r+b') as f, open(progress_path, 'a') as progress:
+            workers = [
+                asyncio.create_task(self._worker(state, parts, f, progress, size))
+                for _ in range(min(self.connections, parts.qsize()))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                logger.warning(f'下载 {os.path.basename(path)} 未完成，已保留已下载的分片，下次下载时继续')
+                raise
+        os.replace(temp_path, path)
+        os.remove(progress_path)
+
+    def _load_progress(self, temp_path, progress_path, header):
+        """读取上次未完成下载的分片记录，无法续传时返回空集合"""
+        try:
+            if os.path.getsize(temp_path) <= 0:
+                return set()
+            with open(progress_path) as progress:
+                lines = progress.read().splitlines()
+        except OSError:
+            return set()
+        if not lines or lines[0] != header:
+            return set()
+        # 最后一行可能只写了一半
+        return {int(line) for line in lines[1:] if line.isdigit()}
+
+    async def _worker(self, state, parts, f, progress, size):
+        while not parts.empty():
+            index = parts.get_nowait()
+            offset = index * self.part_size
+            expected = min(self.part_size, size - offset)
+            failures = 0
+            while True:
+                message = state['message']
+                try:
+                    data = b''
+                    async for chunk in message.client.iter_download(
+                        message.document,
+                        offset=offset,
+                        request_size=self.part_size,
+                        limit=1,
+                        file_size=size
+                    ):
+                        data = chunk
+                    if len(data) != expected:
+                        raise ConnectionError(f'分片 {index} 大小不正确: {len(data)}/{expected}')
+                    # 写入期间没有 await，各协程的 seek/write 不会交错
+                    f.seek(offset)
+                    f.write(data)
+                    f.flush()
+                    # 分片数据写入后才记录完成，中断时最多重新下载这一个分片
+                    progress.write(f'{index}\n')
+                    progress.flush()
+                    metrics.incr('media_download.parts')
+                    break
+                except FileReferenceExpiredError:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    await self._refresh(state, message)
+                except FloodWaitError as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    await asyncio.sleep(e.seconds)
+                except (ConnectionError, asyncio.TimeoutError, OSError) as e:
+                    failures += 1
+                    metrics.incr('media_download.part_retries')
+                    if failures > self.retries:
+                        raise
+                    logger.warning(f'下载分片 {index} 失败: {str(e)}，第 {failures} 次重试')
+                    await asyncio.sleep(min(2 ** failures, 10))
+
+    async def _refresh(self, state, message):
+        """文件引用过期时重新获取消息，多个分片同时过期只获取一次"""
+        if state['message'] is not message:
+            return
+        refreshed = await message.client.get_messages(message.chat_id, ids=message.id)
+        if not refreshed or not refreshed.document:
+            raise FileReferenceExpiredError(request=None)
+        state['message'] = refreshed
+        logger.info(f'文件引用已过期，已重新获取消息 {message.id}')
+
+    async def download_album(self, messages, download=None):
+        """
+        并发下载媒体组中各条消息的媒体
+
+        所有媒体组共用同一个并发上限，单条消息下载失败只记录日志，不影响其他消息
+
+        Args:
+            messages: 带媒体的消息列表
+            download: 下载单条消息的协程函数，默认保存到当前目录
+
+        Returns:
+            list: 与 messages 顺序一致的文件路径，下载失败的位置为None
+        """
+        if self._album_slots is None:
+            self._album_slots = asyncio.Semaphore(self._album_concurrency)
+        download = download or self.download
+
+        async def fetch(message):
+            async with self._album_slots:
+                try:
+                    return await download(message)
+                except Exception as e:
+                    logger.error(f'下载媒体组文件失败 (消息ID={message.id}): {str(e)}')
+                    metrics.incr('media_download.album_failures')
+                    return None
+
+        started = time.perf_counter()
+        paths = await asyncio.gather(*(fetch(message) for message in messages))
+        metrics.observe('media_download.album_time', time.perf_counter() - started)
+        return list(paths)
+
+    def _record(self, mode, size, elapsed):
+        metrics.incr(f'media_download.{mode}_bytes', size)
+        metrics.observe(f'media_download.{mode}_time', elapsed)
+        if size >= self.min_size:
+            speed = size / 1024 / 1024 / max(elapsed, 1e-6)
+            logger.info(f'媒体下载完成（{"并行" if mode == "parallel" else "串行"}）: '
+                        f'{size / 1024 / 1024:.1f}MB，耗时 {elapsed:.1f}s，{speed:.2f}MB/s')
+
+
+# 创建全局实例
+media_downloader = MediaDownloader()
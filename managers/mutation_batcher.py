@@ -0,0 +1,177 @@
+import asyncio
+import logging
+
+from managers.send_scheduler import send_scheduler
+from utils.constants import MUTATION_BATCH_WINDOW
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram 单次 delete_messages 最多删除的消息数
+MAX_DELETE_IDS = 100
+
+_KIND_NAMES = {'delete': '删除', 'pin': '置顶', 'edit': '编辑'}
+
+
+class _Pending:
+    def __init__(self, send, args):
+        self.send = send
+        self.args = args
+        self.ids = []
+        self.call = None
+        self.waiters = []
+        self.timer = None
+
+
+class MutationBatcher:
+    """
+    对已有消息的修改操作的合并器
+
+    - 删除：同一聊天在窗口内要删除的消息ID合并为一次 delete_messages 请求，达到上限时立即发送
+    - 置顶：同一条消息在窗口内只执行最后一次置顶，不同消息各自置顶（聊天可以有多条置顶消息）
+    - 编辑：同一条消息在窗口内只执行最后一次编辑
+    被合并的调用方等待同一个请求完成，得到相同的结果或异常
+
+    按目标聊天顺序处理的过滤器应使用 submit_delete / submit_edit：操作加入批次后立即返回 Future，
+    不在顺序处理的任务中等待合并窗口，后续消息的操作才能合并到同一次请求中
+    """
+
+    def __init__(self, window=MUTATION_BATCH_WINDOW):
+        self.window = window
+        self._pending = {}
+        self._sending = set()
+
+    async def delete(self, client, chat, ids):
+        """
+        删除消息
+
+        Args:
+            client: 有删除权限的客户端
+            chat: 消息所在的聊天
+            ids: 消息ID或消息ID列表
+        """
+        return await self.submit_delete(client, chat, ids)
+
+    async def pin(self, client, chat, message, **kwargs):
+        """置顶消息，窗口内同一条消息的多次置顶只执行最后一次"""
+        return await self.submit_pin(client, chat, message, **kwargs)
+
+    async def edit(self, client, chat, message, **kwargs):
+        """编辑消息，窗口内同一条消息的多次编辑只执行最后一次"""
+        return await self.submit_edit(client, chat, message, **kwargs)
+
+    def submit_delete(self, client, chat, ids):
+        """把删除加入批次后立即返回，参数与 delete 相同，返回请求完成的 Future"""
+        ids = list(ids) if isinstance(ids, (list, tuple)) else [ids]
+        if self.window <= 0:
+            return self._track(asyncio.ensure_future(
+                send_scheduler.submit(client, chat, client.delete_messages, chat, ids)
+            ))
+
+        key = ('delete', id(client), chat)
+        pending = self._pending.get(key)
+        if pending is not None and len(pending.ids) + len(ids) > MAX_DELETE_IDS:
+            self._flush(key)
+            pending = None
+        if pending is None:
+            pending = self._open(key, self._send_delete, client, chat)
+        pending.ids.extend(message_id for message_id in ids if message_id not in pending.ids)
+        future = self._wait(pending, 'delete')
+        if len(pending.ids) >= MAX_DELETE_IDS:
+            self._flush(key)
+        return future
+
+    def submit_pin(self, client, chat, message, **kwargs):
+        """把置顶加入批次后立即返回，参数与 pin 相同，返回请求完成的 Future"""
+        if self.window <= 0:
+            return self._track(asyncio.ensure_future(send_scheduler.pin_message(client, chat, message, **kwargs)))
+        message_id = getattr(message, 'id', message)
+        return self._debounce(
+            ('pin', id(client), chat, message_id), 'pin',
+            send_scheduler.pin_message, client, chat, message, **kwargs
+        )
+
+    def submit_edit(self, client, chat, message, **kwargs):
+        """
+        把编辑加入批次后立即返回，参数与 edit 相同，返回请求完成的 Future
+
+        不同消息的编辑各自独立，同时提交的多条编辑（如媒体组）在窗口结束时一起发出
+        """
+        if self.window <= 0:
+            return self._track(asyncio.ensure_future(send_scheduler.edit_message(client, chat, message, **kwargs)))
+        message_id = getattr(message, 'id', message)
+        return self._debounce(
+            ('edit', id(client), chat, message_id), 'edit',
+            send_scheduler.edit_message, client, chat, message, **kwargs
+        )
+
+    def _debounce(self, key, kind, func, *args, **kwargs):
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._open(key, self._send_call)
+        elif pending.call is not None:
+            metrics.incr(f'mutation_batch.{kind}_superseded')
+        pending.call = (func, args, kwargs)
+        return self._wait(pending, kind)
+
+    def _track(self, task):
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+        return task
+
+    def _open(self, key, send, *args):
+        pending = _Pending(send, args)
+        pending.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        self._pending[key] = pending
+        return pending
+
+    def _wait(self, pending, kind):
+        future = asyncio.get_running_loop().create_future()
+        pending.waiters.append(future)
+        metrics.incr(f'mutation_batch.{kind}_submitted')
+        return future
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        pending.timer.cancel()
+        metrics.incr(f'mutation_batch.{key[0]}_requests')
+        self._track(asyncio.create_task(self._run(key, pending)))
+
+    async def _run(self, key, pending):
+        try:
+            result = await pending.send(pending, *pending.args)
+        except asyncio.CancelledError:
+            for future in pending.waiters:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in pending.waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in pending.waiters:
+            if not future.done():
+                future.set_result(result)
+        if len(pending.waiters) > 1:
+            logger.info(f'{len(pending.waiters)} 次{_KIND_NAMES[key[0]]}操作合并为 1 次请求 ({key[2]})')
+
+    async def drain(self):
+        """立即执行所有等待合并的操作，并等待执行完成"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _send_delete(self, pending, client, chat):
+        await send_scheduler.submit(client, chat, client.delete_messages, chat, pending.ids)
+        metrics.incr('mutation_batch.deleted', len(pending.ids))
+
+    async def _send_call(self, pending):
+        func, args, kwargs = pending.call
+        return await func(*args, **kwargs)
+
+
+# 创建全局实例
+mutation_batcher = MutationBatcher()
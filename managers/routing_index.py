@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload
+from telethon import utils as telethon_utils
+
+from models.models import (
+    get_session, Chat, ForwardRule, Keyword, ReplaceRule, MediaTypes, MediaExtensions,
+    RuleSync, PushConfig, RSSConfig, RSSPattern
+)
+
+logger = logging.getLogger(__name__)
+
+# 路由索引的最长有效期（秒），用于兜底其他进程（如RSS服务）对数据库的修改
+ROUTING_INDEX_TTL = int(os.getenv('ROUTING_INDEX_TTL', 300))
+
+# 修改后需要重建路由索引的表
+_TRACKED_TABLES = frozenset(
+    model.__tablename__ for model in (
+        Chat, ForwardRule, Keyword, ReplaceRule, MediaTypes, MediaExtensions,
+        RuleSync, PushConfig, RSSConfig, RSSPattern
+    )
+)
+
+
+class RowSnapshot:
+    """
+    数据库行的只读快照，属性与对应的ORM对象保持一致
+    """
+    __slots__ = ('_fields',)
+
+    def __init__(self, fields):
+        object.__setattr__(self, '_fields', fields)
+
+    def __getattr__(self, name):
+        if name == '_fields':
+            raise AttributeError(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(f"{type(self).__name__} 没有属性 {name}") from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"快照是只读的，不能修改属性 {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"快照是只读的，不能删除属性 {name}")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"<{type(self).__name__} id={self._fields.get('id')}>"
+
+
+class RuleSnapshot(RowSnapshot):
+    """转发规则快照，包含关键字、替换规则、媒体设置、推送/RSS配置以及源/目标聊天"""
+
+    @property
+    def version(self):
+        """规则快照的版本号，索引每次重建都会递增"""
+        return self._fields['_version']
+
+
+def _columns(obj, **extra):
+    """提取ORM对象的列值"""
+    fields = {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+    fields.update(extra)
+    return fields
+
+
+def _snapshot(obj, **extra):
+    if obj is None:
+        return None
+    return RowSnapshot(_columns(obj, **extra))
+
+
+def _snapshot_list(objs):
+    return tuple(_snapshot(obj) for obj in sorted(objs, key=lambda o: o.id))
+
+
+def canonical_chat_id(chat_id):
+    """
+    将Telethon的聊天ID（可能带-100前缀）转换为数据库中保存的形式
+
+    Args:
+        chat_id: event.chat_id 或实体ID
+
+    Returns:
+        str: 与 Chat.telegram_chat_id 对应的字符串
+    """
+    real_id, _ = telethon_utils.resolve_id(int(chat_id))
+    return str(abs(real_id))
+
+
+class RoutingIndex:
+    """
+    源聊天ID -> 规则快照 的内存路由索引
+
+    启动时加载一次，规则相关表在本进程内提交修改后自动失效，
+    并在 ROUTING_INDEX_TTL 秒后强制重建。
+    失效后在线程中后台重建，重建完成前继续使用上一份快照，不在事件循环中读取数据库。
+    """
+
+    def __init__(self, ttl=ROUTING_INDEX_TTL):
+        self._routes = None
+        self._ttl = ttl
+        self._loaded_at = None
+        self._version = 0
+        # 每次失效递增，重建期间又有修改时，重建完成后仍保持失效状态
+        self._generation = 0
+        self._rebuild = None
+        self._listeners = []
+
+    @property
+    def version(self):
+        return self._version
+
+    def add_listener(self, listener):
+        """
+        注册索引重建的通知，用于清理按规则缓存的数据
+
+        Args:
+            listener: 签名为 listener(rule_ids, source_keys) 的函数，
+                参数为新索引中启用的规则ID集合和源聊天集合
+        """
+        self._listeners.append(listener)
+
+    def load(self):
+        """从数据库重建索引（同步，用于启动时首次加载）"""
+        generation = self._generation
+        self._install(self._build(self._version + 1), generation)
+
+    def _build(self, version):
+        """读取数据库并生成路由表，可以在线程中执行"""
+        started = time.perf_counter()
+        session = get_session()
+        try:
+            rules = session.query(ForwardRule).options(
+                joinedload(ForwardRule.source_chat),
+                joinedload(ForwardRule.target_chat),
+                selectinload(ForwardRule.keywords),
+                selectinload(ForwardRule.replace_rules),
+                selectinload(ForwardRule.media_types),
+                selectinload(ForwardRule.media_extensions),
+                selectinload(ForwardRule.rule_syncs),
+                selectinload(ForwardRule.rss_config).selectinload(RSSConfig.patterns),
+            ).all()
+
+            # 一个规则可能有多个推送配置，单独查询
+            push_configs = defaultdict(list)
+            for config in session.query(PushConfig).all():
+                push_configs[config.rule_id].append(config)
+
+            routes = defaultdict(list)
+            for rule in rules:
+                if not rule.enable_rule:
+                    continue
+                rss_config = None
+                if rule.rss_config is not None:
+                    rss_config = _snapshot(rule.rss_config, patterns=_snapshot_list(rule.rss_config.patterns))
+                snapshot = RuleSnapshot(_columns(
+                    rule,
+                    _version=version,
+                    source_chat=_snapshot(rule.source_chat),
+                    target_chat=_snapshot(rule.target_chat),
+                    keywords=_snapshot_list(rule.keywords),
+                    replace_rules=_snapshot_list(rule.replace_rules),
+                    media_types=_snapshot(rule.media_types),
+                    media_extensions=_snapshot_list(rule.media_extensions),
+                    rule_syncs=_snapshot_list(rule.rule_syncs),
+                    push_configs=_snapshot_list(push_configs.get(rule.id, [])),
+                    rss_config=rss_config,
+                ))
+                routes[rule.source_chat.telegram_chat_id].append(snapshot)
+        finally:
+            session.close()
+
+        routes = {chat_id: tuple(snapshots) for chat_id, snapshots in routes.items()}
+        logger.info(
+            f"路由索引已加载: {len(routes)} 个源聊天, {sum(len(r) for r in routes.values())} 条启用的规则, "
+            f"版本 {version}, 耗时 {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return routes, version
+
+    def _install(self, built, generation):
+        self._routes, self._version = built
+        # 重建期间规则又被修改时保持失效，下次查询再重建
+        self._loaded_at = time.monotonic() if generation == self._generation else None
+        rule_ids = {rule.id for rules in self._routes.values() for rule in rules}
+        source_keys = set(self._routes)
+        for listener in self._listeners:
+            try:
+                listener(rule_ids, source_keys)
+            except Exception as e:
+                logger.error(f"处理路由索引更新通知时出错: {str(e)}")
+
+    async def _rebuild_in_background(self):
+        generation = self._generation
+        try:
+            built = await asyncio.to_thread(self._build, self._version + 1)
+            self._install(built, generation)
+        except Exception as e:
+            logger.error(f"重建路由索引失败，继续使用版本 {self._version}: {str(e)}")
+            # 失败后等到下一个有效期结束再重试，避免每条消息都触发重建
+            self._loaded_at = time.monotonic()
+        finally:
+            self._rebuild = None
+
+    def invalidate(self):
+        """标记索引失效，下次查询时重建"""
+        self._generation += 1
+        if self._loaded_at is not None:
+            logger.info("规则数据已修改，路由索引失效")
+        self._loaded_at = None
+
+    def get_rules(self, chat_id):
+        """
+        获取源聊天的规则快照
+
+        Args:
+            chat_id: 源聊天ID（数据库中保存的形式）
+
+        Returns:
+            tuple: 规则快照，没有规则时为空元组
+        """
+        if self._routes is None:
+            self.load()
+        elif self._loaded_at is None or time.monotonic() - self._loaded_at > self._ttl:
+            if self._rebuild is None:
+                self._rebuild = asyncio.get_running_loop().create_task(self._rebuild_in_background())
+        return self._routes.get(str(chat_id), ())
+
+
+# 创建全局实例
+routing_index = RoutingIndex()
+
+
+def _has_tracked_rows(objs):
+    return any(getattr(obj, '__tablename__', None) in _TRACKED_TABLES for obj in objs)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_rules_dirty(session, flush_context):
+    if _has_tracked_rows(session.new) or _has_tracked_rows(session.dirty) or _has_tracked_rows(session.deleted):
+        session.info['routing_dirty'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_rules_dirty(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if any(mapper.local_table.name in _TRACKED_TABLES for mapper in orm_execute_state.all_mappers):
+            orm_execute_state.session.info['routing_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('routing_dirty', False):
+        routing_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_on_rollback(session):
+    session.info.pop('routing_dirty', None)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+
+from utils.constants import FORWARD_MAX_CONCURRENCY, FORWARD_PER_TARGET_CONCURRENCY
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _TargetSlot:
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        # 正在执行和排队等待的规则数，为0时从字典中移除
+        self.users = 0
+
+
+class RuleDispatcher:
+    """
+    并发执行同一条消息匹配到的多条规则
+
+    - 全局并发上限：FORWARD_MAX_CONCURRENCY
+    - 每个目标聊天的并发上限：FORWARD_PER_TARGET_CONCURRENCY，默认为1，
+      保证同一目标按消息到达顺序处理（asyncio 信号量按先来先得唤醒）
+    - 每条规则的异常相互隔离，并记录每条规则的耗时
+    - 目标聊天没有执行中或排队的规则时释放其信号量，不随出现过的目标数增长
+    """
+
+    def __init__(self, max_concurrency=FORWARD_MAX_CONCURRENCY, per_target_concurrency=FORWARD_PER_TARGET_CONCURRENCY):
+        self._max_concurrency = max_concurrency
+        self._per_target_concurrency = per_target_concurrency
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._targets = {}
+
+    def _acquire_slot(self, target_id):
+        slot = self._targets.get(target_id)
+        if slot is None:
+            slot = _TargetSlot(self._per_target_concurrency)
+            self._targets[target_id] = slot
+        slot.users += 1
+        return slot
+
+    def _release_slot(self, target_id, slot):
+        slot.users -= 1
+        if slot.users == 0 and self._targets.get(target_id) is slot:
+            del self._targets[target_id]
+
+    async def dispatch(self, rules, handler):
+        """
+        并发处理规则
+
+        Args:
+            rules: 规则列表
+            handler: 处理单条规则的协程函数，签名为 async handler(rule)
+
+        Returns:
+            list: 与规则顺序对应的处理结果，出错的规则结果为False
+        """
+        return await self.start(rules, handler)
+
+    def start(self, rules, handler):
+        """
+        为每条规则创建任务后立即返回，不等待规则处理完成
+
+        任务同步创建，按调用顺序排队获取目标聊天的信号量，
+        因此依次调用 start 的消息在同一目标聊天中仍按调用顺序处理
+
+        Returns:
+            asyncio.Future: 完成时结果与 dispatch 相同
+        """
+        tasks = [asyncio.create_task(self._run(rule, handler)) for rule in rules]
+        return asyncio.gather(*tasks)
+
+    async def _run(self, rule, handler):
+        target_id = rule.target_chat.telegram_chat_id
+        queued_at = time.perf_counter()
+        slot = self._acquire_slot(target_id)
+        try:
+            async with slot.semaphore:
+                async with self._global:
+                    return await self._execute(rule, handler, queued_at)
+        finally:
+            self._release_slot(target_id, slot)
+
+    async def _execute(self, rule, handler, queued_at):
+        started_at = time.perf_counter()
+        result = False
+        try:
+            result = await handler(rule)
+        except Exception as e:
+            logger.error(f'处理规则 {rule.id} 时出错: {str(e)}')
+            logger.exception(e)
+            metrics.incr('rule.errors')
+        finally:
+            finished_at = time.perf_counter()
+            metrics.observe(f'rule.{rule.id}.latency', finished_at - started_at)
+            metrics.observe('rule.latency', finished_at - started_at)
+            metrics.observe('rule.wait', started_at - queued_at)
+            logger.info(
+                f'规则 {rule.id} 处理完成，耗时 {(finished_at - started_at) * 1000:.0f}ms，'
+                f'排队 {(started_at - queued_at) * 1000:.0f}ms'
+            )
+        return result
+
+
+# 创建全局实例
+rule_dispatcher = RuleDispatcher()
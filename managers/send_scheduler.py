@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telethon.errors import FloodWaitError
+
+from utils.constants import (
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_FLOOD_WAIT, SEND_MAX_RETRIES
+)
+from utils.metrics import metrics
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 优先级，数值越小越先发送
+PRIORITY_HIGH = 0    # 编辑、置顶等对已发送消息的操作
+PRIORITY_NORMAL = 1  # 转发消息
+PRIORITY_LOW = 2     # 总结等批量消息
+
+
+class _Job:
+    def __init__(self, priority, seq, func, args, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _ChatQueue:
+    def __init__(self, client, rate, burst):
+        self.client = client
+        self.jobs = []
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0
+        self.worker = None
+        self.idle_timer = None
+        # 等待队列清空的调用方
+        self.drain_waiters = []
+
+
+def _chat_key(entity):
+    if isinstance(entity, int):
+        return entity
+    for attr in ('id', 'channel_id', 'chat_id', 'user_id'):
+        value = getattr(entity, attr, None)
+        if isinstance(value, int):
+            return value
+    return str(entity)
+
+
+class SendScheduler:
+    """
+    统一的消息发送调度
+
+    - 每个(客户端, 目标聊天)一个优先级队列，按优先级、提交顺序依次发送
+    - 每个目标聊天一个令牌桶，另有一个所有聊天共用的全局令牌桶
+    - 遇到 FloodWait 时暂停该聊天的队列，等待结束后重试同一个请求，不丢弃消息；
+      等待时间超过 SEND_MAX_FLOOD_WAIT 或重试次数用完时把错误交给调用方
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 max_flood_wait=SEND_MAX_FLOOD_WAIT, max_retries=SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_flood_wait = max_flood_wait
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._seq = itertools.count()
+        self._pending = 0
+        self._flood_listeners = []
+
+    def add_flood_listener(self, listener):
+        """
+        注册 FloodWait 通知
+
+        Args:
+            listener: 签名为 listener(client, chat, seconds) 的函数
+        """
+        self._flood_listeners.append(listener)
+
+    def depth(self, chat):
+        """某个目标聊天排队中的请求数（所有客户端合计）"""
+        key = _chat_key(chat)
+        return sum(len(queue.jobs) for (_, chat_key), queue in self._chats.items() if chat_key == key)
+
+    def depths(self):
+        """各目标聊天排队中的请求数"""
+        result = {}
+        for (_, chat_key), queue in self._chats.items():
+            result[chat_key] = result.get(chat_key, 0) + len(queue.jobs)
+        return result
+
+    async def wait_idle(self, client, chat):
+        """
+        等待某个(客户端, 目标聊天)队列中已提交的请求全部完成
+
+        用于把目标聊天切换到其他客户端前，保证先提交的请求先发出
+        """
+        queue = self._chats.get((id(client), _chat_key(chat)))
+        if queue is None or (not queue.jobs and queue.worker is None):
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue.drain_waiters.append(future)
+        await future
+
+    async def submit(self, client, chat, func, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """
+        按目标聊天排队执行一个发送请求
+
+        Args:
+            client: 发送用的客户端，不同客户端的队列互不影响
+            chat: 目标聊天
+            func: 执行请求的协程函数
+            priority: 优先级
+            *args, **kwargs: 传给 func 的参数
+
+        Returns:
+            func 的返回值
+        """
+        key = (id(client), _chat_key(chat))
+        queue = self._chats.get(key)
+        if queue is None:
+            queue = _ChatQueue(client, self.chat_rate, self.chat_burst)
+            self._chats[key] = queue
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.jobs, _Job(priority, next(self._seq), func, args, kwargs, future))
+        self._pending += 1
+        self._update_depth()
+        if queue.worker is None:
+            queue.worker = asyncio.create_task(self._run(key, queue))
+        return await future
+
+    async def send_message(self, client, entity, *args, priority=PRIORITY_NORMAL, **kwargs):
+        return await self.submit(client, entity, client.send_message, entity, *args, priority=priority, **kwargs)
+
+    async def send_file(self, client, entity, *args, priority=PRIORITY_NORMAL, **kwargs):
+        return await self.submit(client, entity, client.send_file, entity, *args, priority=priority, **kwargs)
+
+    async def forward_messages(self, client, entity, *args, priority=PRIORITY_NORMAL, **kwargs):
+        return await self.submit(client, entity, client.forward_messages, entity, *args, priority=priority, **kwargs)
+
+    async def edit_message(self, client, entity, *args, priority=PRIORITY_HIGH, **kwargs):
+        return await self.submit(client, entity, client.edit_message, entity, *args, priority=priority, **kwargs)
+
+    async def pin_message(self, client, entity, *args, priority=PRIORITY_HIGH, **kwargs):
+        return await self.submit(client, entity, client.pin_message, entity, *args, priority=priority, **kwargs)
+
+    async def _run(self, key, queue):
+        try:
+            while queue.jobs:
+                if queue.jobs[0].future.done():
+                    # 调用方已取消
+                    self._finish(heapq.heappop(queue.jobs))
+                    continue
+                pause = queue.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                delay = max(queue.bucket.reserve(), self._global.reserve())
+                if delay > 0:
+                    metrics.observe('send_queue.throttle_time', delay)
+                    await asyncio.sleep(delay)
+                    if not queue.jobs:
+                        break
+                # 等待期间可能有更高优先级的请求加入，取当前队首
+                job = heapq.heappop(queue.jobs)
+                if job.future.done():
+                    self._finish(job)
+                    continue
+                await self._execute(key, queue, job)
+        except asyncio.CancelledError:
+            # 调度器停止，取消还在排队的请求
+            while queue.jobs:
+                self._finish(heapq.heappop(queue.jobs), cancelled=True)
+            raise
+        finally:
+            queue.worker = None
+            if not queue.jobs:
+                for waiter in queue.drain_waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+                queue.drain_waiters = []
+                self._drop_idle(key, queue)
+            self._update_depth()
+
+    def _drop_idle(self, key, queue):
+        """删除空闲的聊天队列；令牌桶还没补满时保留到补满，否则间隔发送的消息总能得到满桶的突发额度"""
+        if queue.idle_timer is not None:
+            queue.idle_timer.cancel()
+            queue.idle_timer = None
+        if self._chats.get(key) is not queue or queue.jobs or queue.worker is not None:
+            return
+        wait = max(queue.bucket.refill_time(), queue.paused_until - time.monotonic())
+        if wait > 0:
+            queue.idle_timer = asyncio.get_running_loop().call_later(wait, self._drop_idle, key, queue)
+            return
+        del self._chats[key]
+        self._update_depth()
+
+    async def _execute(self, key, queue, job):
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except asyncio.CancelledError:
+            self._finish(job, cancelled=True)
+            raise
+        except FloodWaitError as e:
+            job.attempts += 1
+            metrics.incr('send_queue.flood_waits')
+            for listener in self._flood_listeners:
+                try:
+                    listener(queue.client, key[1], e.seconds)
+                except Exception as listener_error:
+                    logger.error(f'处理频率限制通知时出错: {str(listener_error)}')
+            if e.seconds > self.max_flood_wait or job.attempts > self.max_retries:
+                logger.error(f'发送到 {key[1]} 触发频率限制，需要等待 {e.seconds} 秒，放弃重试')
+                self._finish(job, exception=e)
+                return
+            logger.warning(
+                f'发送到 {key[1]} 触发频率限制，{e.seconds} 秒后重试 '
+                f'(第 {job.attempts} 次，队列中还有 {len(queue.jobs)} 条)'
+            )
+            queue.paused_until = time.monotonic() + e.seconds
+            # 放回队首，保持同一聊天的发送顺序
+            heapq.heappush(queue.jobs, job)
+        except Exception as e:
+            self._finish(job, exception=e)
+        else:
+            metrics.incr('send_queue.sent')
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, exception=None, cancelled=False):
+        self._pending -= 1
+        if not job.future.done():
+            if cancelled:
+                job.future.cancel()
+            elif exception is not None:
+                job.future.set_exception(exception)
+            else:
+                job.future.set_result(result)
+
+    def _update_depth(self):
+        metrics.set_gauge('send_queue.depth', self._pending)
+        metrics.set_gauge('send_queue.chats', len(self._chats))
+
+
+# 创建全局实例
+send_scheduler = SendScheduler()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from telethon.errors import (
+    FileReferenceExpiredError, FileReferenceInvalidError, FileReferenceEmptyError, FilePartMissingError,
+    MediaInvalidError, MediaEmptyError, PhotoInvalidError, DocumentInvalidError
+)
+
+from utils.constants import UPLOAD_CACHE_TTL, UPLOAD_CACHE_SIZE
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 缓存的媒体已失效，需要重新上传的错误
+STALE_MEDIA_ERRORS = (
+    FileReferenceExpiredError, FileReferenceInvalidError, FileReferenceEmptyError, FilePartMissingError,
+    MediaInvalidError, MediaEmptyError, PhotoInvalidError, DocumentInvalidError
+)
+
+
+class UploadCache:
+    """
+    已上传媒体的缓存，同一个本地文件只上传一次
+
+    第一次发送时上传文件，之后记录发出的消息中的媒体对象，在有效期内发往其他目标
+    （以及媒体组重发）时直接引用该媒体，不再重新上传。同一文件正在首次上传时，
+    其他发送方等待上传完成后复用结果。
+    """
+
+    def __init__(self, ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_SIZE):
+        self.ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def _key(self, client, file_path):
+        # 媒体对象只对上传它的账号有效
+        return id(client), file_path
+
+    def get(self, client, file_path):
+        """
+        获取文件已上传的媒体对象
+
+        Returns:
+            有效期内的媒体对象，没有则返回None
+        """
+        key = self._key(client, file_path)
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        media, expires_at = cached
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._update_size()
+            return None
+        self._entries.move_to_end(key)
+        return media
+
+    def put(self, client, file_path, media):
+        key = self._key(client, file_path)
+        self._entries[key] = (media, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self._update_size()
+
+    def invalidate(self, client, file_path):
+        if self._entries.pop(self._key(client, file_path), None) is not None:
+            metrics.incr('upload_cache.invalidations')
+            self._update_size()
+
+    def _update_size(self):
+        metrics.set_gauge('upload_cache.entries', len(self._entries))
+
+    async def send_file(self, client, entity, file, **kwargs):
+        """
+        发送本地文件，已上传过的文件直接引用上次上传的媒体
+
+        Args:
+            client: 发送用的客户端
+            entity: 目标聊天
+            file: 本地文件路径，或作为媒体组发送的路径列表
+            **kwargs: 传给 send_file 的其他参数
+
+        Returns:
+            发送的消息（媒体组为消息列表）
+        """
+        album = isinstance(file, (list, tuple))
+        paths = list(file) if album else [file]
+
+        # 等待同一文件正在进行的首次上传
+        for file_path in paths:
+            pending = self._inflight.get(self._key(client, file_path))
+            if pending is not None:
+                await pending.wait()
+
+        handles = [self.get(client, file_path) for file_path in paths]
+        if any(handle is not None for handle in handles):
+            try:
+                sent = await self._send(client, entity, paths, handles, album, **kwargs)
+                return sent
+            except STALE_MEDIA_ERRORS as e:
+                logger.info(f'缓存的已上传媒体已失效 ({type(e).__name__})，重新上传')
+                for file_path, handle in zip(paths, handles):
+                    if handle is not None:
+                        self.invalidate(client, file_path)
+        return await self._send(client, entity, paths, [None] * len(paths), album, **kwargs)
+
+    async def _send(self, client, entity, paths, handles, album, **kwargs):
+        uploading = []
+        for file_path, handle in zip(paths, handles):
+            if handle is None:
+                key = self._key(client, file_path)
+                if key not in self._inflight:
+                    self._inflight[key] = asyncio.Event()
+                    uploading.append(key)
+        hits = sum(1 for handle in handles if handle is not None)
+        files = [handle if handle is not None else file_path for file_path, handle in zip(paths, handles)]
+        try:
+            sent = await client.send_file(entity, files if album else files[0], **kwargs)
+            messages = sent if isinstance(sent, list) else [sent]
+            # 记录发出的消息中的媒体，供其他目标复用
+            for file_path, handle, message in zip(paths, handles, messages):
+                if handle is None and getattr(message, 'media', None) is not None:
+                    self.put(client, file_path, message.media)
+            metrics.incr('upload_cache.hits', hits)
+            metrics.incr('upload_cache.misses', len(paths) - hits)
+            if hits:
+                logger.info(f'{hits} 个媒体文件复用了已上传的媒体，{len(paths) - hits} 个重新上传')
+            return sent
+        finally:
+            for key in uploading:
+                self._inflight.pop(key).set()
+
+    def clear(self):
+        self._entries.clear()
+        self._update_size()
+
+
+# 创建全局实例
+upload_cache = UploadCache()
@@ -1,5 +1,4 @@
 from telethon import events
-from models.models import get_session, Chat, ForwardRule
 import logging
 from handlers import user_handler, bot_handler
 from handlers.prompt_handlers import handle_prompt_setting
@@ -8,6 +7,11 @@ import os
 from dotenv import load_dotenv
 from telethon.tl.types import ChannelParticipantsAdmins
 from managers.state_manager import state_manager
+from managers.routing_index import routing_index, canonical_chat_id
+from managers.album_aggregator import album_aggregator
+from managers.rule_dispatcher import rule_dispatcher
+from managers.ingestion_queue import ingestion_queue
+from utils.keyword_matcher import keyword_matchers
 from telethon.tl import types
 from filters.process import process_forward_rule
 # 加载环境变量
@@ -68,100 +72,124 @@ async def setup_listeners(user_client, bot_client):
     # 注册机器人回调处理器
     bot_client.add_event_handler(bot_handler.callback_handler)
 
+    # 加载规则路由索引
+    routing_index.load()
+
+    # 启动消息处理队列
+    ingestion_queue.start()
+
 async def handle_user_message(event, user_client, bot_client):
     """处理用户客户端收到的消息"""
     # logger.info("handle_user_message:开始处理用户消息")
-    
-    chat = await event.get_chat()
-    chat_id = abs(chat.id)
-    # logger.info(f"handle_user_message:获取到聊天ID: {chat_id}")
-
-    # 检查是否频道消息
-    if isinstance(event.chat, types.Channel) and state_manager.check_state():
-        # logger.info("handle_user_message:检测到频道消息且存在状态")
-        sender_id = os.getenv('USER_ID')
-        # 频道ID需要加上100前缀
-        chat_id = int(f"100{chat_id}")
-        # logger.info(f"handle_user_message:频道消息处理: sender_id={sender_id}, chat_id={chat_id}")
-    else:
-        sender_id = event.sender_id
-        # logger.info(f"handle_user_message:非频道消息处理: sender_id={sender_id}")
-
-    # 检查用户状态
-    current_state, message, state_type = state_manager.get_state(sender_id, chat_id)
-    # logger.info(f'handle_user_message：当前是否有状态: {state_manager.check_state()}')
-    # logger.info(f"handle_user_message：当前用户ID和聊天ID: {sender_id}, {chat_id}")
-    # logger.info(f"handle_user_message：获取当前聊天窗口的用户状态: {current_state}")
-    
-    if current_state:
-        # logger.info(f"检测到用户状态: {current_state}")
-        # 处理提示词设置
-        # logger.info("准备处理提示词设置")
-        if await handle_prompt_setting(event, bot_client, sender_id, chat_id, current_state, message):
-            # logger.info("提示词设置处理完成，返回")
-            return
-        # logger.info("提示词设置处理未完成，继续执行")
 
-    # 检查是否是媒体组消息
+    # 只有存在用户状态时才需要获取聊天实体
+    if state_manager.check_state():
+        chat = await event.get_chat()
+        chat_id = abs(chat.id)
+        # logger.info(f"handle_user_message:获取到聊天ID: {chat_id}")
+
+        # 检查是否频道消息
+        if isinstance(event.chat, types.Channel):
+            # logger.info("handle_user_message:检测到频道消息且存在状态")
+            sender_id = os.getenv('USER_ID')
+            # 频道ID需要加上100前缀
+            chat_id = int(f"100{chat_id}")
+            # logger.info(f"handle_user_message:频道消息处理: sender_id={sender_id}, chat_id={chat_id}")
+        else:
+            sender_id = event.sender_id
+            # logger.info(f"handle_user_message:非频道消息处理: sender_id={sender_id}")
+
+        # 检查用户状态
+        current_state, message, state_type = state_manager.get_state(sender_id, chat_id)
+        # logger.info(f"handle_user_message：获取当前聊天窗口的用户状态: {current_state}")
+
+        if current_state:
+            # logger.info(f"检测到用户状态: {current_state}")
+            # 处理提示词设置
+            if await handle_prompt_setting(event, bot_client, sender_id, chat_id, current_state, message):
+                # logger.info("提示词设置处理完成，返回")
+                return
+            # logger.info("提示词设置处理未完成，继续执行")
+
+    # 通过路由索引查找规则，没有规则的聊天直接丢弃
+    source_chat_id = canonical_chat_id(event.chat_id)
+    rules = routing_index.get_rules(source_chat_id)
+    if not rules:
+        return
+
+    # 媒体组消息先交给聚合器收集完整后再统一处理
     if event.message.grouped_id:
+        group_key = f"{source_chat_id}:{event.message.grouped_id}"
         # 如果这个媒体组已经处理过，就跳过
-        group_key = f"{chat_id}:{event.message.grouped_id}"
         if group_key in PROCESSED_GROUPS:
             return
-        # 标记这个媒体组为已处理
-        PROCESSED_GROUPS.add(group_key)
-        asyncio.create_task(clear_group_cache(group_key))
-    
-    # 首先检查数据库中是否有该聊天的转发规则
-    session = get_session()
+
+        async def on_album(first_event, album):
+            # 标记这个媒体组为已处理
+            PROCESSED_GROUPS.add(group_key)
+            asyncio.create_task(clear_group_cache(group_key))
+            if not collected.done():
+                collected.set_result((first_event, album))
+
+        async def dispatch_album():
+            first_event, album = await collected
+            return await dispatch_rules(
+                first_event, user_client, bot_client, source_chat_id,
+                routing_index.get_rules(source_chat_id), album
+            )
+
+        collected = asyncio.get_running_loop().create_future()
+        if album_aggregator.add(group_key, event, on_album):
+            # 收到媒体组的第一条消息时就在源聊天队列中占位，
+            # 收集期间到达的同一源聊天的其他消息排在媒体组之后处理
+            await ingestion_queue.submit(source_chat_id, dispatch_album)
+        return
+
+    # 交给按源聊天划分的有序队列处理，不在Telethon事件回调中执行转发
+    await ingestion_queue.submit(source_chat_id, lambda: dispatch_rules(
+        event, user_client, bot_client, source_chat_id, rules
+    ))
+
+async def dispatch_rules(event, user_client, bot_client, source_chat_id, rules, album=None):
+    """
+    将消息（或完整的媒体组）交给每条转发规则处理
+
+    规则在各自的目标聊天排好队后立即返回，返回值为所有规则处理完成的 Future，
+    源聊天的下一条消息不必等待本条消息的延迟、AI处理等步骤
+    """
+    if not rules:
+        return
+
     try:
-        # 查询源聊天
-        source_chat = session.query(Chat).filter(
-            Chat.telegram_chat_id == str(chat_id)
-        ).first()
-        
-        if not source_chat:
-            return
-            
-        # 添加日志：查询转发规则
-        logger.info(f'找到源聊天: {source_chat.name} (ID: {source_chat.id})')
-        
-        # 查找以当前聊天为源的规则
-        rules = session.query(ForwardRule).filter(
-            ForwardRule.source_chat_id == source_chat.id
-        ).all()
-        
-        if not rules:
-            logger.info(f'聊天 {source_chat.name} 没有转发规则')
-            return
-        
+        source_chat = rules[0].source_chat
+
         # 有转发规则时，才记录消息信息
-        if event.message.grouped_id:
-            logger.info(f'[用户] 收到媒体组消息 来自聊天: {source_chat.name} ({chat_id}) 组ID: {event.message.grouped_id}')
+        if album:
+            logger.info(f'[用户] 收到媒体组消息 来自聊天: {source_chat.name} ({source_chat_id}) 组ID: {album.grouped_id} 共 {len(album)} 条')
         else:
-            logger.info(f'[用户] 收到新消息 来自聊天: {source_chat.name} ({chat_id}) 内容: {event.message.text}')
-            
+            logger.info(f'[用户] 收到新消息 来自聊天: {source_chat.name} ({source_chat_id}) 内容: {event.message.text}')
+
         # 添加日志：处理规则
         logger.info(f'找到 {len(rules)} 条转发规则')
-        
-        # 处理每条转发规则
-        for rule in rules:
+
+        # 同一源聊天的规则共用一个关键字匹配器，消息文本只扫描一次
+        keyword_matchers.prepare(source_chat_id, rules)
+
+        # 并发处理每条转发规则
+        async def handle_rule(rule):
             target_chat = rule.target_chat
-            if not rule.enable_rule:
-                logger.info(f'规则 {rule.id} 未启用')
-                continue
             logger.info(f'处理转发规则 ID: {rule.id} (从 {source_chat.name} 转发到: {target_chat.name})')
             if rule.use_bot:
                 # 直接使用过滤器模块中的process_forward_rule函数
-                await process_forward_rule(bot_client, event, str(chat_id), rule)
+                return await process_forward_rule(bot_client, event, source_chat_id, rule, album)
             else:
-                await user_handler.process_forward_rule(user_client, event, str(chat_id), rule)
-        
+                return await user_handler.process_forward_rule(user_client, event, source_chat_id, rule, album)
+
+        return rule_dispatcher.start(rules, handle_rule)
+
     except Exception as e:
         logger.error(f'处理用户消息时发生错误: {str(e)}')
         logger.exception(e)  # 添加详细的错误堆栈
-    finally:
-        session.close()
 
 async def handle_bot_message(event, bot_client):
     """处理机器人客户端收到的消息（命令）"""
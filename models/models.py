@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Enum, UniqueConstraint, inspect, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, ForeignKey, Enum, UniqueConstraint, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from enums.enums import ForwardMode, PreviewMode, MessageMode, AddMode, HandleMode
@@ -63,6 +63,7 @@ class ForwardRule(Base):
     # AI相关字段
     is_ai = Column(Boolean, default=False)  # 是否启用AI处理
     ai_model = Column(String, nullable=True)  # 使用的AI模型
+    ai_fallback_model = Column(String, nullable=True)  # AI备用模型，多个用逗号分隔
     ai_prompt = Column(String, nullable=True)  # AI处理的prompt
     enable_ai_upload_image = Column(Boolean, default=False)  # 是否启用AI图片上传功能
     is_summary = Column(Boolean, default=False)  # 是否启用AI总结
@@ -332,6 +333,7 @@ def migrate_db(engine):
     forward_rules_new_columns = {
         'is_ai': 'ALTER TABLE forward_rules ADD COLUMN is_ai BOOLEAN DEFAULT FALSE',
         'ai_model': 'ALTER TABLE forward_rules ADD COLUMN ai_model VARCHAR DEFAULT NULL',
+        'ai_fallback_model': 'ALTER TABLE forward_rules ADD COLUMN ai_fallback_model VARCHAR DEFAULT NULL',
         'ai_prompt': 'ALTER TABLE forward_rules ADD COLUMN ai_prompt VARCHAR DEFAULT NULL',
         'is_summary': 'ALTER TABLE forward_rules ADD COLUMN is_summary BOOLEAN DEFAULT FALSE',
         'summary_time': 'ALTER TABLE forward_rules ADD COLUMN summary_time VARCHAR DEFAULT "07:00"',
@@ -457,11 +459,64 @@ def migrate_db(engine):
             logging.error(f'更新唯一约束时出错: {str(e)}')
 
 
+# 数据库连接配置
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./db/forward.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+# SQLite 内存映射大小（字节），0 表示关闭
+DB_SQLITE_MMAP_SIZE = int(os.getenv('DB_SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+
+# 进程内共享的引擎和会话工厂
+_engine = None
+_session_factory = None
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的 SQLite 连接设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        if DB_SQLITE_MMAP_SIZE > 0:
+            cursor.execute(f'PRAGMA mmap_size={DB_SQLITE_MMAP_SIZE}')
+    finally:
+        cursor.close()
+
+
+def get_engine():
+    """获取进程内共享的数据库引擎，首次调用时创建"""
+    global _engine
+    if _engine is None:
+        if DATABASE_URL.startswith('sqlite'):
+            os.makedirs('./db', exist_ok=True)
+        _engine = create_engine(
+            DATABASE_URL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        if _engine.dialect.name == 'sqlite':
+            event.listen(_engine, 'connect', _set_sqlite_pragmas)
+        logging.info(f'数据库引擎已创建: pool_size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW}')
+    return _engine
+
+
+def _dispose_engine_after_fork():
+    """子进程（如 RSS 服务）不能复用父进程连接池中的连接"""
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
+
+
 def init_db():
     """初始化数据库"""
-    # 创建数据库文件夹
-    os.makedirs('./db', exist_ok=True)
-    engine = create_engine('sqlite:///./db/forward.db')
+    engine = get_engine()
 
     # 首先创建所有表
     Base.metadata.create_all(engine)
@@ -472,10 +527,11 @@ def init_db():
     return engine
 
 def get_session():
-    """创建会话工厂"""
-    engine = create_engine('sqlite:///./db/forward.db')
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """从共享的会话工厂创建会话"""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory()
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
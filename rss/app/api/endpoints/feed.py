@@ -23,6 +23,7 @@ import subprocess
 import platform
 from pydantic import ValidationError
 from utils.constants import RSS_MEDIA_BASE_URL
+from utils.regex_service import regex_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -455,7 +456,7 @@ async def add_entry(rule_id: int, entry_data: Dict[str, Any] = Body(...)):
                         logger.info(f"开始尝试标题模式: {pattern.pattern}")
                         try:
                             logger.info(f"对内容应用正则表达式: {pattern.pattern}")
-                            match = re.search(pattern.pattern, processing_content)
+                            match = await regex_service.search(pattern.pattern, processing_content)
                             if match:
                                 logger.info(f"找到匹配: {match.groups()}")
                                 if match.groups():
@@ -489,7 +490,7 @@ async def add_entry(rule_id: int, entry_data: Dict[str, Any] = Body(...)):
                             logger.info(f"[步骤 {i+1}/{len(content_patterns)}] 对内容应用正则表达式: {pattern.pattern}")
                             logger.info(f"处理前的内容长度: {len(processing_content)}, 预览: {processing_content[:150]}..." if len(processing_content) > 150 else processing_content)
                             
-                            match = re.search(pattern.pattern, processing_content)
+                            match = await regex_service.search(pattern.pattern, processing_content)
                             if match and match.groups():
                                 extracted_content = match.group(1)
                                 processing_content = extracted_content  # 更新处理内容为提取结果
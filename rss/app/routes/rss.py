@@ -12,6 +12,7 @@ import logging
 import base64
 import re
 from utils.common import get_db_ops
+from utils.regex_service import regex_service
 import os
 import aiohttp
 from utils.constants import RSS_HOST, RSS_PORT, RSS_BASE_URL
@@ -424,8 +425,13 @@ async def test_regex(user = Depends(get_current_user),
         logger.info(f"测试类型: {pattern_type}")
         logger.info(f"测试文本长度: {len(test_text)} 字符")
         
-        # 执行正则匹配
-        match = re.search(pattern, test_text)
+        # 执行正则匹配（在时间预算内）
+        match = await regex_service.search(pattern, test_text)
+        if not match and regex_service.is_quarantined(pattern):
+            return JSONResponse({
+                "success": False,
+                "message": f"正则表达式执行超过 {regex_service.timeout:g} 秒，可能存在灾难性回溯，已被隔离，请修改后再试"
+            })
         
         # 检查是否有匹配
         if not match:
@@ -9,6 +9,8 @@ from telethon import TelegramClient, errors
 from ai import get_ai_provider
 import traceback
 from utils.constants import DEFAULT_TIMEZONE,DEFAULT_AI_MODEL,DEFAULT_SUMMARY_PROMPT
+from managers.mutation_batcher import mutation_batcher
+from managers.send_scheduler import send_scheduler, PRIORITY_LOW
 
 logger = logging.getLogger(__name__)
 
@@ -256,16 +258,20 @@ class SummaryScheduler:
                             logger.info(f"Retry attempt {attempt + 1}/{MAX_SEND_ATTEMPTS} for sending message to chat ID {target_chat_id}.")
                             try:
                                 if use_markdown:
-                                    current_message = await self.bot_client.send_message(
+                                    current_message = await send_scheduler.send_message(
+                                        self.bot_client,
                                         target_chat_id,
                                         message_to_send,
-                                        parse_mode='markdown'
+                                        parse_mode='markdown',
+                                        priority=PRIORITY_LOW
                                     )
                                 else:
                                     # Fallback to plain text
-                                    current_message = await self.bot_client.send_message(
+                                    current_message = await send_scheduler.send_message(
+                                        self.bot_client,
                                         target_chat_id,
-                                        message_to_send
+                                        message_to_send,
+                                        priority=PRIORITY_LOW
                                     )
                                 break  # Success, exit retry loop
 
@@ -301,7 +307,7 @@ class SummaryScheduler:
 
                     if rule.is_top_summary and summary_message:
                         try:
-                            await self.bot_client.pin_message(target_chat_id, summary_message)
+                            await mutation_batcher.pin(self.bot_client, target_chat_id, summary_message)
                         except Exception as pin_error:
                             logger.warning(f"置顶总结消息失败: {str(pin_error)}")
 
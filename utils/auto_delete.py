@@ -3,6 +3,7 @@ import os
 import logging
 from functools import wraps
 from utils.constants import BOT_MESSAGE_DELETE_TIMEOUT, USER_MESSAGE_DELETE_ENABLE
+from managers.mutation_batcher import mutation_batcher
 logger = logging.getLogger(__name__)
 
 # 从环境变量获取默认超时时间
@@ -118,7 +119,7 @@ async def async_delete_user_message(client, chat_id, message_id, seconds):
         await asyncio.sleep(seconds)
         
     try:
-        await client.delete_messages(chat_id, message_id)
+        await mutation_batcher.delete(client, chat_id, message_id)
     except Exception as e:
         logger.error(f"删除用户消息失败: {e}")
 
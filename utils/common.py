@@ -12,6 +12,8 @@ from utils.auto_delete import respond_and_delete,reply_and_delete,async_delete_u
 from datetime import datetime, timedelta
 
 from utils.constants import AI_SETTINGS_TEXT,MEDIA_SETTINGS_TEXT
+from utils.keyword_matcher import keyword_matchers, WHITELIST, BLACKLIST
+from utils.regex_service import regex_service
 
 logger = logging.getLogger(__name__)
 
@@ -395,15 +397,14 @@ async def check_keywords(rule, message_text, event = None):
     """
     reverse_blacklist = rule.enable_reverse_blacklist
     reverse_whitelist = rule.enable_reverse_whitelist
-    logger.info(f"反转黑名单: {reverse_blacklist}, 反转白名单: {reverse_whitelist}")
+    logger.debug(f"反转黑名单: {reverse_blacklist}, 反转白名单: {reverse_whitelist}")
 
     # 处理用户信息过滤
     if rule.is_filter_user_info and event:
         message_text = await process_user_info(event, rule.id, message_text)
 
-    logger.info("开始检查关键字规则")
-    logger.info(f"当前转发模式: {rule.forward_mode}")
     forward_mode = rule.forward_mode
+    logger.debug(f"规则 {rule.id} 开始检查关键字，当前转发模式: {forward_mode}")
 
     # 仅白名单模式
     if forward_mode == ForwardMode.WHITELIST:
@@ -425,82 +426,55 @@ async def check_keywords(rule, message_text, event = None):
     return False
 
 async def process_whitelist_mode(rule, message_text, reverse_blacklist):
-    """处理仅白名单模式"""
-    logger.info("进入仅白名单模式")
-    should_forward = False
+    """处理仅白名单模式
 
-    # 检查普通白名单关键词
-    whitelist_keywords = [k for k in rule.keywords if not k.is_blacklist]
-    logger.info(f"普通白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-    
-    for keyword in whitelist_keywords:
-        if await check_keyword_match(keyword, message_text):
-            should_forward = True
-            break
-    
-    if not should_forward:
-        logger.info("未匹配到普通白名单关键词，不转发")
+    必须匹配白名单；如果启用黑名单反转，黑名单作为第二重白名单也必须匹配
+    """
+    wanted = WHITELIST | BLACKLIST if reverse_blacklist else WHITELIST
+    matched = await keyword_matchers.match(rule, message_text, wanted)
+
+    if not matched & WHITELIST:
+        logger.info(f"规则 {rule.id} 未匹配到普通白名单关键词，不转发")
         return False
 
-    # 如果启用了黑名单反转，还需要匹配反转后的黑名单（作为第二重白名单）
-    if reverse_blacklist:
-        logger.info("检查反转后的黑名单关键词（作为白名单）")
-        reversed_blacklist = [k for k in rule.keywords if k.is_blacklist]
-        logger.info(f"反转后的黑名单关键词: {[k.keyword for k in reversed_blacklist]}")
-        
-        reversed_match = False
-        for keyword in reversed_blacklist:
-            if await check_keyword_match(keyword, message_text):
-                reversed_match = True
-                break
-        
-        if not reversed_match:
-            logger.info("未匹配到反转后的黑名单关键词，不转发")
-            return False
+    if reverse_blacklist and not matched & BLACKLIST:
+        logger.info(f"规则 {rule.id} 未匹配到反转后的黑名单关键词，不转发")
+        return False
 
-    logger.info("所有白名单条件都满足，允许转发")
+    logger.info(f"规则 {rule.id} 所有白名单条件都满足，允许转发")
     return True
 
 async def process_blacklist_mode(rule, message_text, reverse_whitelist):
-    """处理仅黑名单模式"""
-    logger.info("进入仅黑名单模式")
+    """处理仅黑名单模式
 
-    # 检查普通黑名单关键词
-    blacklist_keywords = [k for k in rule.keywords if k.is_blacklist]
-    logger.info(f"普通黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-    
-    for keyword in blacklist_keywords:
-        if await check_keyword_match(keyword, message_text):
-            logger.info(f"匹配到黑名单关键词 '{keyword.keyword}'，不转发")
-            return False
+    匹配黑名单则不转发；如果启用白名单反转，白名单作为第二重黑名单，匹配也不转发
+    """
+    wanted = WHITELIST | BLACKLIST if reverse_whitelist else BLACKLIST
+    matched = await keyword_matchers.match(rule, message_text, wanted)
 
-    # 如果启用了白名单反转，检查反转后的白名单（作为黑名单）
-    if reverse_whitelist:
-        logger.info("检查反转后的白名单关键词（作为黑名单）")
-        reversed_whitelist = [k for k in rule.keywords if not k.is_blacklist]
-        logger.info(f"反转后的白名单关键词: {[k.keyword for k in reversed_whitelist]}")
-        
-        for keyword in reversed_whitelist:
-            if await check_keyword_match(keyword, message_text):
-                logger.info(f"匹配到反转后的白名单关键词 '{keyword.keyword}'，不转发")
-                return False
+    if matched & BLACKLIST:
+        logger.info(f"规则 {rule.id} 匹配到黑名单关键词，不转发")
+        return False
+
+    if reverse_whitelist and matched & WHITELIST:
+        logger.info(f"规则 {rule.id} 匹配到反转后的白名单关键词，不转发")
+        return False
 
-    logger.info("未匹配到任何黑名单关键词，允许转发")
+    logger.info(f"规则 {rule.id} 未匹配到任何黑名单关键词，允许转发")
     return True
 
 async def check_keyword_match(keyword, message_text):
     """检查单个关键词是否匹配"""
-    logger.info(f"检查关键字: {keyword.keyword} (正则: {keyword.is_regex})")
     if keyword.is_regex:
         try:
-            if re.search(keyword.keyword, message_text):
-                logger.info(f"正则匹配成功: {keyword.keyword}")
+            if await regex_service.search(keyword.keyword, message_text):
+                logger.debug(f"正则匹配成功: {keyword.keyword}")
                 return True
         except re.error:
             logger.error(f"正则表达式错误: {keyword.keyword}")
     else:
         if keyword.keyword.lower() in message_text.lower():
-            logger.info(f"关键字匹配成功: {keyword.keyword}")
+            logger.debug(f"关键字匹配成功: {keyword.keyword}")
             return True
     return False
 
@@ -539,48 +513,23 @@ async def process_whitelist_then_blacklist_mode(rule, message_text, reverse_blac
     先检查白名单（必须匹配），然后检查黑名单（不能匹配）
     如果启用黑名单反转，则黑名单变成第二重白名单（必须匹配）
     """
-    logger.info("进入先白后黑模式")
+    matched = await keyword_matchers.match(rule, message_text)
 
-    # 检查普通白名单（必须匹配）
-    whitelist_match = False
-    whitelist_keywords = [k for k in rule.keywords if not k.is_blacklist]
-    logger.info(f"检查普通白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-    
-    for keyword in whitelist_keywords:
-        if await check_keyword_match(keyword, message_text):
-            whitelist_match = True
-            break
-    
-    if not whitelist_match:
-        logger.info("未匹配到白名单关键词，不转发")
+    if not matched & WHITELIST:
+        logger.info(f"规则 {rule.id} 未匹配到白名单关键词，不转发")
         return False
 
-    # 根据反转设置处理黑名单
-    blacklist_keywords = [k for k in rule.keywords if k.is_blacklist]
-    
     if reverse_blacklist:
         # 黑名单反转为白名单，必须匹配才转发
-        logger.info("黑名单已反转，作为第二重白名单检查")
-        logger.info(f"反转后的黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-        
-        blacklist_match = False
-        for keyword in blacklist_keywords:
-            if await check_keyword_match(keyword, message_text):
-                blacklist_match = True
-                break
-        
-        if not blacklist_match:
-            logger.info("未匹配到反转后的黑名单关键词，不转发")
+        if not matched & BLACKLIST:
+            logger.info(f"规则 {rule.id} 未匹配到反转后的黑名单关键词，不转发")
             return False
-    else:
+    elif matched & BLACKLIST:
         # 正常黑名单，匹配则不转发
-        logger.info(f"检查普通黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-        for keyword in blacklist_keywords:
-            if await check_keyword_match(keyword, message_text):
-                logger.info(f"匹配到黑名单关键词 '{keyword.keyword}'，不转发")
-                return False
+        logger.info(f"规则 {rule.id} 匹配到黑名单关键词，不转发")
+        return False
 
-    logger.info("所有条件都满足，允许转发")
+    logger.info(f"规则 {rule.id} 所有条件都满足，允许转发")
     return True
 
 async def process_blacklist_then_whitelist_mode(rule, message_text, reverse_whitelist):
@@ -589,41 +538,21 @@ async def process_blacklist_then_whitelist_mode(rule, message_text, reverse_whit
     先检查黑名单（不能匹配），然后检查白名单（必须匹配）
     如果启用白名单反转，则白名单变成第二重黑名单（不能匹配）
     """
-    logger.info("进入先黑后白模式")
+    matched = await keyword_matchers.match(rule, message_text)
 
-    # 检查普通黑名单（匹配则拒绝）
-    blacklist_keywords = [k for k in rule.keywords if k.is_blacklist]
-    logger.info(f"检查普通黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-    
-    for keyword in blacklist_keywords:
-        if await check_keyword_match(keyword, message_text):
-            logger.info(f"匹配到黑名单关键词 '{keyword.keyword}'，不转发")
-            return False
+    if matched & BLACKLIST:
+        logger.info(f"规则 {rule.id} 匹配到黑名单关键词，不转发")
+        return False
 
-    # 处理白名单
-    whitelist_keywords = [k for k in rule.keywords if not k.is_blacklist]
-    
     if reverse_whitelist:
         # 白名单反转为黑名单，匹配则不转发
-        logger.info("白名单已反转，作为第二重黑名单检查")
-        logger.info(f"反转后的白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-        
-        for keyword in whitelist_keywords:
-            if await check_keyword_match(keyword, message_text):
-                logger.info(f"匹配到反转后的白名单关键词 '{keyword.keyword}'，不转发")
-                return False
-    else:
-        # 正常白名单，必须匹配才转发
-        logger.info(f"检查普通白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-        whitelist_match = False
-        for keyword in whitelist_keywords:
-            if await check_keyword_match(keyword, message_text):
-                whitelist_match = True
-                break
-        
-        if not whitelist_match:
-            logger.info("未匹配到白名单关键词，不转发")
+        if matched & WHITELIST:
+            logger.info(f"规则 {rule.id} 匹配到反转后的白名单关键词，不转发")
             return False
+    elif not matched & WHITELIST:
+        # 正常白名单，必须匹配才转发
+        logger.info(f"规则 {rule.id} 未匹配到白名单关键词，不转发")
+        return False
 
-    logger.info("所有条件都满足，允许转发")
+    logger.info(f"规则 {rule.id} 所有条件都满足，允许转发")
     return True
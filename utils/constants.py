@@ -64,6 +64,128 @@ MEDIA_SIZE_COLS = int(os.getenv('MEDIA_SIZE_COLS', 6))
 MEDIA_EXTENSIONS_ROWS = int(os.getenv('MEDIA_EXTENSIONS_ROWS', 6))
 MEDIA_EXTENSIONS_COLS = int(os.getenv('MEDIA_EXTENSIONS_COLS', 6))
 
+# 媒体组收集的静默窗口（秒），窗口内没有新的组内消息即视为收集完成
+ALBUM_QUIET_WINDOW = float(os.getenv('ALBUM_QUIET_WINDOW', 0.5))
+# 媒体组收集的最长等待时间（秒）
+ALBUM_MAX_WAIT = float(os.getenv('ALBUM_MAX_WAIT', 5))
+
+# 同时处理的规则数全局上限（所有消息共用）
+FORWARD_MAX_CONCURRENCY = int(os.getenv('FORWARD_MAX_CONCURRENCY', 10))
+# 每个目标聊天的并发上限，为1时保证同一目标按消息顺序处理
+FORWARD_PER_TARGET_CONCURRENCY = int(os.getenv('FORWARD_PER_TARGET_CONCURRENCY', 1))
+
+# 消息处理工作协程数量
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 8))
+# 消息积压高水位，超过后暂停接收新消息
+INGESTION_HIGH_WATERMARK = int(os.getenv('INGESTION_HIGH_WATERMARK', 1000))
+# 消息积压低水位，降到此值以下后恢复接收
+INGESTION_LOW_WATERMARK = int(os.getenv('INGESTION_LOW_WATERMARK', 500))
+# 关闭时等待剩余消息处理完成的最长时间（秒）
+INGESTION_DRAIN_TIMEOUT = float(os.getenv('INGESTION_DRAIN_TIMEOUT', 30))
+
+# 用户正则表达式单次匹配的最长时间（秒），超时的正则会被隔离
+REGEX_TIMEOUT = float(os.getenv('REGEX_TIMEOUT', 1))
+# 执行可能回溯的正则表达式的子进程数量
+REGEX_WORKERS = int(os.getenv('REGEX_WORKERS', 2))
+# 超时的正则表达式被隔离的时长（秒），到期后重新执行，也可以用 /regex_release 命令提前解除
+REGEX_QUARANTINE_TTL = float(os.getenv('REGEX_QUARANTINE_TTL', 3600))
+# 正则表达式编译缓存大小
+REGEX_CACHE_SIZE = int(os.getenv('REGEX_CACHE_SIZE', 1024))
+# 正则引擎，设置为 re2 且安装了 google-re2 时，re2 支持的正则使用线性时间引擎执行
+REGEX_ENGINE = os.getenv('REGEX_ENGINE', 're')
+
+# 转发媒体时优先直接引用源消息的媒体，失败时才下载后重新上传
+MEDIA_SEND_BY_REFERENCE = os.getenv('MEDIA_SEND_BY_REFERENCE', 'true').lower() == 'true'
+# 已上传媒体的复用有效期（秒），有效期内发往其他目标时不再重新上传
+UPLOAD_CACHE_TTL = float(os.getenv('UPLOAD_CACHE_TTL', 3600))
+# 已上传媒体缓存的最大条数
+UPLOAD_CACHE_SIZE = int(os.getenv('UPLOAD_CACHE_SIZE', 1000))
+
+# 大文件并行下载的并发分片数，设置为1时关闭并行下载
+DOWNLOAD_CONNECTIONS = int(os.getenv('DOWNLOAD_CONNECTIONS', 4))
+# 并行下载的分片大小（KB），4 到 512 之间的 2 的幂
+DOWNLOAD_PART_SIZE_KB = int(os.getenv('DOWNLOAD_PART_SIZE_KB', 512))
+# 超过这个大小（MB）的文件使用并行下载
+DOWNLOAD_PARALLEL_MIN_SIZE_MB = float(os.getenv('DOWNLOAD_PARALLEL_MIN_SIZE_MB', 10))
+# 单个分片失败后的最大重试次数
+DOWNLOAD_PART_RETRIES = int(os.getenv('DOWNLOAD_PART_RETRIES', 3))
+# 媒体组中同时下载的文件数（全局共享）
+ALBUM_DOWNLOAD_CONCURRENCY = int(os.getenv('ALBUM_DOWNLOAD_CONCURRENCY', 5))
+
+# 临时媒体文件总大小配额（MB），超过时删除最久未使用的闲置文件
+TEMP_QUOTA_MB = float(os.getenv('TEMP_QUOTA_MB', 2048))
+# 没有引用的临时媒体文件保留时间（秒）
+TEMP_IDLE_MAX_AGE = float(os.getenv('TEMP_IDLE_MAX_AGE', 300))
+# 临时目录中其他遗留文件的保留时间（秒）
+TEMP_ORPHAN_MAX_AGE = float(os.getenv('TEMP_ORPHAN_MAX_AGE', 3600))
+# 临时文件清理间隔（秒）
+TEMP_SWEEP_INTERVAL = float(os.getenv('TEMP_SWEEP_INTERVAL', 60))
+
+# 所有目标聊天合计每秒最多发送的请求数
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 25))
+# 单个目标聊天每秒最多发送的请求数及允许的突发数
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 3))
+# FloodWait 等待时间超过这个值（秒）时不再重试
+SEND_MAX_FLOOD_WAIT = float(os.getenv('SEND_MAX_FLOOD_WAIT', 300))
+# 同一请求遇到 FloodWait 的最大重试次数
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 5))
+
+# 额外的机器人Token（逗号分隔），与主机器人一起分担发送
+EXTRA_BOT_TOKENS = [token.strip() for token in os.getenv('EXTRA_BOT_TOKENS', '').split(',') if token.strip()]
+# 额外机器人在目标聊天中的管理员权限检查结果的缓存时间（秒）
+BOT_POOL_PERMISSION_TTL = float(os.getenv('BOT_POOL_PERMISSION_TTL', 3600))
+
+# 用户模式下合并转发的窗口（秒），同一源聊天发往同一目标的消息在窗口内合并为一次请求，设置为0时关闭
+FORWARD_BATCH_WINDOW = float(os.getenv('FORWARD_BATCH_WINDOW', 1))
+# 单次合并转发的最大消息数，最大为100
+FORWARD_BATCH_SIZE = int(os.getenv('FORWARD_BATCH_SIZE', 100))
+
+# 删除、置顶、编辑已有消息的合并窗口（秒），设置为0时关闭
+MUTATION_BATCH_WINDOW = float(os.getenv('MUTATION_BATCH_WINDOW', 0.5))
+
+# 检查 config/ai_models.json 是否修改的间隔（秒）
+AI_MODELS_RELOAD_INTERVAL = float(os.getenv('AI_MODELS_RELOAD_INTERVAL', 5))
+# AI接口共用连接池的最大连接数
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', 20))
+# AI接口空闲连接的保持时间（秒）
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', 60))
+# 启动时预先初始化规则中使用的AI模型并建立连接
+AI_WARMUP = os.getenv('AI_WARMUP', 'true').lower() == 'true'
+
+# 缓存AI处理结果，相同的模型、提示词、消息和图片不再重复调用AI
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'true').lower() == 'true'
+# AI结果缓存的数据库文件
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', './db/ai_cache.db')
+# AI结果缓存的有效期（秒）
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', 86400))
+# 数据库中最多保留的AI结果条数
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 10000))
+# 内存中保留的AI结果条数
+AI_CACHE_MEMORY_SIZE = int(os.getenv('AI_CACHE_MEMORY_SIZE', 500))
+
+# 每个AI提供商同时进行的请求数上限，可用 <提供商>_MAX_CONCURRENCY 单独配置，如 OPENAI_MAX_CONCURRENCY
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 4))
+# 每个AI提供商每分钟的请求数上限，0 为不限制，可用 <提供商>_REQUESTS_PER_MINUTE 单独配置
+AI_REQUESTS_PER_MINUTE = float(os.getenv('AI_REQUESTS_PER_MINUTE', 60))
+# AI请求遇到限流或服务端错误时的最大重试次数
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+# AI请求重试的最长等待时间（秒）
+AI_MAX_BACKOFF = float(os.getenv('AI_MAX_BACKOFF', 30))
+# AI提供商连续失败多少次后熔断
+AI_BREAKER_THRESHOLD = int(os.getenv('AI_BREAKER_THRESHOLD', 5))
+# 熔断后的冷却时间（秒），期间AI处理直接跳过并保留原文
+AI_BREAKER_COOLDOWN = float(os.getenv('AI_BREAKER_COOLDOWN', 60))
+
+# 主模型响应时间超过其最近耗时的这个分位数时，同时请求规则的备用模型
+AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', 95))
+# 主模型耗时样本不足时使用的对冲等待时间（秒）
+AI_HEDGE_DELAY = float(os.getenv('AI_HEDGE_DELAY', 15))
+# 按分位数计算对冲等待时间所需的最少样本数
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', 20))
+# 转发时AI处理的截止时间（秒），超过后保留原文转发，0 为不限制
+AI_DEADLINE = float(os.getenv('AI_DEADLINE', 60))
+
 LOG_MAX_SIZE_MB = 10
 LOG_BACKUP_COUNT = 3
 
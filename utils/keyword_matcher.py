@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict, defaultdict
+
+from managers.routing_index import routing_index
+from utils.regex_service import regex_service
+
+logger = logging.getLogger(__name__)
+
+# 匹配结果位掩码
+WHITELIST = 1
+BLACKLIST = 2
+
+# 每个源聊天缓存最近扫描过的文本数量
+SCAN_CACHE_SIZE = 16
+
+# 不能安全合并到同一个正则交替式里的写法：反向引用、条件分组、开头的全局标志
+_UNMERGEABLE_PATTERN = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|^\(\?[aiLmsux]+\)')
+
+
+class AhoCorasick:
+    """
+    多模式子串匹配自动机
+
+    每个模式带一个位掩码，search 一次扫描文本，返回命中模式的掩码按位或的结果
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]
+        self._built = False
+
+    def add(self, pattern, mask):
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            node = next_node
+        self._output[node] |= mask
+        self._built = False
+
+    def build(self):
+        """计算失败指针，并把后缀节点的输出合并到当前节点"""
+        goto, fail, output = self._goto, self._fail, self._output
+        queue = list(goto[0].values())
+        for node in queue:
+            fail[node] = 0
+        index = 0
+        while index < len(queue):
+            node = queue[index]
+            index += 1
+            for ch, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                output[child] |= output[fail[child]]
+        self._built = True
+
+    def __len__(self):
+        return len(self._goto) - 1
+
+    def search(self, text, wanted=-1):
+        """
+        扫描文本
+
+        Args:
+            text: 要扫描的文本
+            wanted: 需要的掩码，全部命中后提前结束扫描
+
+        Returns:
+            int: 命中模式的掩码
+        """
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found |= output[node]
+                if found & wanted == wanted:
+                    break
+        return found
+
+
+def _compile_regexes(patterns):
+    """
+    预编译正则关键字
+
+    Args:
+        patterns: 正则表达式 -> 掩码
+
+    Returns:
+        tuple: (直接执行的 [(编译后的正则, 掩码)], 需要在时间预算内执行的 [(正则表达式, 掩码)])，
+               掩码相同且可以合并的正则合并为一个交替式
+    """
+    merged = defaultdict(list)
+    regexes = []
+    guarded = []
+    for pattern, mask in patterns.items():
+        try:
+            compiled = regex_service.compile(pattern)
+        except re.error:
+            logger.error(f"正则表达式错误: {pattern}")
+            continue
+        if not regex_service.is_linear(pattern):
+            # 可能出现灾难性回溯的正则单独执行，超时只隔离这一个正则
+            guarded.append((pattern, mask))
+        elif _UNMERGEABLE_PATTERN.search(pattern):
+            regexes.append((compiled, mask))
+        else:
+            merged[mask].append(pattern)
+
+    combined = []
+    for mask, group in merged.items():
+        try:
+            combined.append((regex_service.compile('|'.join(f'(?:{p})' for p in group)), mask))
+        except re.error:
+            # 合并失败时（例如重复的命名分组）逐个编译
+            combined.extend((regex_service.compile(p), mask) for p in group)
+    return combined + regexes, guarded
+
+
+class MultiPatternMatcher:
+    """
+    多名单关键字匹配器
+
+    每个关键字带一个名单掩码：
+    - 普通关键字转成小写放进 Aho-Corasick 自动机，与原来的
+      keyword.lower() in message_text.lower() 语义一致
+    - 正则关键字预编译，相同的正则只编译一次，与原来的 re.search 语义一致
+    - 可能回溯的正则通过 regex_service 在时间预算内执行
+    - 无效的正则在编译时记录并忽略
+    """
+
+    def __init__(self, entries):
+        """
+        Args:
+            entries: (关键字对象, 掩码) 的可迭代对象
+        """
+        self.automaton = AhoCorasick()
+        self._always = 0
+        self.keyword_count = 0
+        literals = defaultdict(int)
+        patterns = defaultdict(int)
+        for keyword, mask in entries:
+            self.keyword_count += 1
+            if keyword.is_regex:
+                patterns[keyword.keyword] |= mask
+                continue
+            literal = keyword.keyword.lower()
+            if literal:
+                literals[literal] |= mask
+            else:
+                # 空字符串总是包含在文本中
+                self._always |= mask
+        for literal, mask in literals.items():
+            self.automaton.add(literal, mask)
+        self.automaton.build()
+        self._regexes, self._guarded = _compile_regexes(patterns)
+
+    async def scan(self, text, wanted):
+        """
+        检查文本命中了哪些名单
+
+        Args:
+            text: 消息文本
+            wanted: 需要检查的名单掩码
+
+        Returns:
+            int: 命中名单的掩码
+        """
+        found = self._always & wanted
+        if found != wanted and len(self.automaton):
+            found |= self.automaton.search(text.lower(), wanted) & wanted
+        for regex, mask in self._regexes:
+            if found == wanted:
+                break
+            if mask & wanted & ~found and regex.search(text):
+                found |= mask & wanted
+        for pattern, mask in self._guarded:
+            if found == wanted:
+                break
+            if mask & wanted & ~found and await regex_service.search(pattern, text):
+                found |= mask & wanted
+        return found
+
+
+class KeywordMatcher(MultiPatternMatcher):
+    """单条规则的关键字匹配器"""
+
+    def __init__(self, keywords):
+        super().__init__(
+            (keyword, BLACKLIST if keyword.is_blacklist else WHITELIST) for keyword in keywords
+        )
+
+    async def match(self, text, wanted=WHITELIST | BLACKLIST):
+        """
+        Returns:
+            int: 命中名单的掩码（WHITELIST / BLACKLIST）
+        """
+        return await self.scan(text, wanted)
+
+
+class SourceKeywordMatcher(MultiPatternMatcher):
+    """
+    同一源聊天所有规则共用的关键字匹配器
+
+    第 i 条规则的白名单、黑名单分别占掩码的第 2i、2i+1 位，
+    一次扫描得到所有规则的命中结果，同一文本的扫描结果会被缓存，
+    供同一条消息的各个规则（以及AI处理后文本未变化时的再次检查）复用。
+    """
+
+    def __init__(self, rules, cache_size=SCAN_CACHE_SIZE):
+        self._offsets = {}
+        entries = []
+        for index, rule in enumerate(rules):
+            offset = index * 2
+            self._offsets[rule.id] = offset
+            entries.extend(
+                (keyword, (BLACKLIST if keyword.is_blacklist else WHITELIST) << offset)
+                for keyword in rule.keywords
+            )
+        super().__init__(entries)
+        self._all = (1 << (len(self._offsets) * 2)) - 1
+        self._cache_size = cache_size
+        self._scans = OrderedDict()
+
+    def __contains__(self, rule_id):
+        return rule_id in self._offsets
+
+    async def match(self, rule, text):
+        """
+        获取某条规则的命中结果
+
+        Returns:
+            int: 命中名单的掩码（WHITELIST / BLACKLIST）
+        """
+        scan = self._scans.get(text)
+        if scan is None:
+            # 同一文本只扫描一次，并发处理的其他规则等待同一个结果
+            scan = asyncio.ensure_future(self.scan(text, self._all))
+            self._scans[text] = scan
+            if len(self._scans) > self._cache_size:
+                self._scans.popitem(last=False)
+        else:
+            self._scans.move_to_end(text)
+        try:
+            found = await asyncio.shield(scan)
+        except Exception:
+            self._scans.pop(text, None)
+            raise
+        return (found >> self._offsets[rule.id]) & (WHITELIST | BLACKLIST)
+
+
+def _keyword_signature(rule):
+    return tuple((k.keyword, bool(k.is_regex), bool(k.is_blacklist)) for k in rule.keywords)
+
+
+class KeywordMatcherCache:
+    """
+    按规则快照版本缓存编译好的关键字匹配器
+
+    版本变化时重新检查关键字，关键字没有变化则继续使用原来的匹配器
+    """
+
+    def __init__(self):
+        self._matchers = {}
+        self._sources = {}
+        self._rule_sources = {}
+
+    def prepare(self, source_key, rules):
+        """
+        为源聊天的规则准备共用匹配器，在规则处理前调用
+
+        Args:
+            source_key: 源聊天标识
+            rules: 该源聊天的规则快照
+        """
+        if not rules:
+            return
+        version = getattr(rules[0], 'version', None)
+        if version is None:
+            return
+        cached = self._sources.get(source_key)
+        if cached and cached[0] == version:
+            return
+
+        signature = tuple((rule.id, _keyword_signature(rule)) for rule in rules)
+        if cached and cached[1] == signature:
+            matcher = cached[2]
+        else:
+            started = time.perf_counter()
+            matcher = SourceKeywordMatcher(rules)
+            logger.info(
+                f"源聊天 {source_key} 的 {len(rules)} 条规则关键字已编译，共 {matcher.keyword_count} 个，"
+                f"耗时 {(time.perf_counter() - started) * 1000:.1f}ms"
+            )
+        self._sources[source_key] = (version, signature, matcher)
+        for rule in rules:
+            self._rule_sources[rule.id] = (version, matcher)
+
+    async def match(self, rule, text, wanted=WHITELIST | BLACKLIST):
+        """
+        检查规则的关键字命中情况
+
+        Returns:
+            int: 命中名单的掩码（WHITELIST / BLACKLIST）
+        """
+        version = getattr(rule, 'version', None)
+        shared = self._rule_sources.get(rule.id)
+        if version is not None and shared and shared[0] == version and rule.id in shared[1]:
+            return await shared[1].match(rule, text) & wanted
+        return await self.get(rule).match(text, wanted)
+
+    def get(self, rule):
+        """获取单条规则的匹配器"""
+        version = getattr(rule, 'version', None)
+        if version is None:
+            # 不是路由索引中的规则快照，无法判断是否变化，直接编译
+            return KeywordMatcher(rule.keywords)
+
+        cached = self._matchers.get(rule.id)
+        if cached and cached[0] == version:
+            return cached[2]
+
+        signature = _keyword_signature(rule)
+        if cached and cached[1] == signature:
+            matcher = cached[2]
+        else:
+            matcher = KeywordMatcher(rule.keywords)
+            logger.info(f"规则 {rule.id} 的关键字已编译，共 {matcher.keyword_count} 个")
+        self._matchers[rule.id] = (version, signature, matcher)
+        return matcher
+
+    def prune(self, rule_ids, source_keys):
+        """删除已删除或停用的规则、不再有规则的源聊天的匹配器"""
+        for rule_id in [rule_id for rule_id in self._matchers if rule_id not in rule_ids]:
+            del self._matchers[rule_id]
+        for rule_id in [rule_id for rule_id in self._rule_sources if rule_id not in rule_ids]:
+            del self._rule_sources[rule_id]
+        for source_key in [source_key for source_key in self._sources if source_key not in source_keys]:
+            del self._sources[source_key]
+
+    def clear(self):
+        self._matchers.clear()
+        self._sources.clear()
+        self._rule_sources.clear()
+
+
+# 创建全局实例
+keyword_matchers = KeywordMatcherCache()
+
+# 路由索引重建后清理已删除的规则和源聊天
+routing_index.add_listener(keyword_matchers.prune)
@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# 每个耗时指标保留的最近样本数，用于计算分位数
+TIMING_SAMPLES = 500
+
+
+class Metrics:
+    """
+    进程内的简单指标收集：计数器、仪表值和耗时
+    """
+
+    def __init__(self, samples=TIMING_SAMPLES):
+        self._samples = samples
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = defaultdict(lambda: deque(maxlen=self._samples))
+        self._timing_totals = defaultdict(lambda: [0, 0.0])
+
+    def incr(self, name, value=1):
+        """计数器加值"""
+        self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        """设置仪表值"""
+        self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        """记录一次耗时（秒）"""
+        self._timings[name].append(seconds)
+        totals = self._timing_totals[name]
+        totals[0] += 1
+        totals[1] += seconds
+
+    def timer(self, name):
+        """记录代码块耗时的上下文管理器"""
+        return _Timer(self, name)
+
+    def counter(self, name):
+        return self._counters.get(name, 0)
+
+    def gauge(self, name, default=None):
+        return self._gauges.get(name, default)
+
+    def timing_count(self, name):
+        """耗时指标当前保留的样本数"""
+        return len(self._timings.get(name, ()))
+
+    def percentile(self, name, q):
+        """
+        获取耗时指标的分位数
+
+        Args:
+            name: 指标名
+            q: 分位（0-100）
+
+        Returns:
+            float: 最近样本中的分位数，没有样本时返回None
+        """
+        samples = self._timings.get(name)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self):
+        """获取所有指标的当前值"""
+        timings = {}
+        for name, (count, total) in self._timing_totals.items():
+            timings[name] = {
+                'count': count,
+                'avg': total / count if count else 0.0,
+                'p50': self.percentile(name, 50),
+                'p95': self.percentile(name, 95),
+                'max': max(self._timings[name]) if self._timings[name] else None,
+            }
+        return {
+            'counters': dict(self._counters),
+            'gauges': dict(self._gauges),
+            'timings': timings,
+        }
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._started
+        self._metrics.observe(self._name, self.elapsed)
+        return False
+
+
+# 创建全局实例
+metrics = Metrics()
@@ -0,0 +1,33 @@
+import time
+
+
+class TokenBucket:
+    """令牌桶，rate 为每秒补充的令牌数，capacity 为最多累积的令牌数"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """
+        预订一个令牌
+
+        Returns:
+            float: 令牌可用前需要等待的秒数
+        """
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refill_time(self):
+        """令牌补满还需要的秒数"""
+        if self.rate <= 0:
+            return 0
+        tokens = self.tokens + (time.monotonic() - self.updated) * self.rate
+        return max(0, (self.capacity - tokens) / self.rate)
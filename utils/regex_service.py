@@ -0,0 +1,387 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import OrderedDict
+
+from utils.constants import (
+    REGEX_TIMEOUT, REGEX_WORKERS, REGEX_CACHE_SIZE, REGEX_ENGINE, REGEX_QUARANTINE_TTL
+)
+from utils.metrics import metrics
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+re2 = None
+if REGEX_ENGINE == 're2':
+    try:
+        import re2
+    except ImportError:
+        pass
+
+logger = logging.getLogger(__name__)
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+_BACKREFS = {sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS}
+_ASSERTS = {sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+
+# 有限次重复的跨度超过这个值时按无限重复处理
+_LARGE_REPEAT = 16
+
+
+def _walk(items):
+    """遍历解析树，返回 (操作, 参数, 是否在可变重复内)"""
+    stack = [(items, False)]
+    while stack:
+        items, in_repeat = stack.pop()
+        for op, av in items:
+            yield op, av, in_repeat
+            if op in _REPEATS:
+                min_count, max_count, sub = av
+                stack.append((sub, in_repeat or max_count - min_count > 1))
+            elif op == sre_constants.SUBPATTERN:
+                stack.append((av[-1], in_repeat))
+            elif op == sre_constants.BRANCH:
+                stack.extend((sub, in_repeat) for sub in av[1])
+            elif op in _ASSERTS:
+                stack.append((av[1], in_repeat))
+            elif op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+                stack.append((av, in_repeat))
+
+
+def is_linear(pattern, flags=0):
+    """
+    粗略判断正则表达式是否不会出现灾难性回溯
+
+    满足以下条件时认为可以直接在事件循环中执行：
+    - 没有反向引用和条件分组
+    - 可变重复内部没有再嵌套可变重复、分支或断言
+    - 最多只有一个无限（或跨度很大）的重复
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, RecursionError):
+        return False
+    unbounded = 0
+    for op, av, in_repeat in _walk(list(parsed)):
+        if op in _BACKREFS:
+            return False
+        if in_repeat and (op == sre_constants.BRANCH or op in _ASSERTS):
+            return False
+        if op in _REPEATS:
+            min_count, max_count, _ = av
+            if in_repeat and max_count - min_count > 1:
+                return False
+            if max_count == sre_constants.MAXREPEAT or max_count - min_count > _LARGE_REPEAT:
+                unbounded += 1
+    return unbounded <= 1
+
+
+class RegexMatch:
+    """子进程中匹配结果的可序列化形式，提供与 re.Match 相同的常用方法"""
+
+    def __init__(self, match):
+        self._groups = (match.group(0),) + match.groups()
+        self._span = match.span()
+
+    def group(self, index=0):
+        return self._groups[index]
+
+    def groups(self):
+        return self._groups[1:]
+
+    def span(self):
+        return self._span
+
+    def __bool__(self):
+        return True
+
+
+def _worker_main(conn):
+    """子进程：执行可能回溯的正则表达式"""
+    while True:
+        try:
+            op, pattern, flags, text, repl = conn.recv()
+        except EOFError:
+            return
+        try:
+            compiled = re.compile(pattern, flags)
+            if op == 'search':
+                match = compiled.search(text)
+                result = RegexMatch(match) if match else None
+            else:
+                result = compiled.sub(repl, text)
+            conn.send(('ok', result))
+        except re.error as e:
+            conn.send(('error', str(e)))
+
+
+class _RegexWorker:
+    def __init__(self, context):
+        self._context = context
+        self.conn = None
+        self.process = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def restart(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+
+
+class RegexTimeout(Exception):
+    """正则表达式执行超时"""
+
+
+class RegexService:
+    """
+    用户正则表达式的统一入口
+
+    - 编译结果放在 LRU 缓存中
+    - 判断为线性的正则直接执行；其他正则在子进程中执行，超过时间预算则结束子进程，
+      并把正则加入隔离名单，同时通知管理员
+    - 隔离期间不再执行该正则（search 视为不匹配，sub 返回原文本），
+      隔离在 REGEX_QUARANTINE_TTL 秒后到期，管理员也可以用 /regex_release 命令提前解除
+    - REGEX_ENGINE=re2 且安装了 google-re2 时，re2 支持的正则直接用 re2 执行
+    """
+
+    def __init__(self, timeout=REGEX_TIMEOUT, workers=REGEX_WORKERS, cache_size=REGEX_CACHE_SIZE,
+                 quarantine_ttl=REGEX_QUARANTINE_TTL):
+        self.timeout = timeout
+        self.quarantine_ttl = quarantine_ttl
+        self._worker_count = workers
+        self._cache_size = cache_size
+        self._compiled = OrderedDict()
+        self._linear = OrderedDict()
+        self._quarantine = {}
+        self._workers = None
+        self._idle = None
+        self._reporter = None
+
+    def compile(self, pattern, flags=0):
+        """
+        编译正则表达式（带缓存）
+
+        Raises:
+            re.error: 正则表达式格式错误
+        """
+        key = (pattern, flags)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            metrics.incr('regex.cache_hits')
+            if isinstance(compiled, re.error):
+                raise compiled
+            return compiled
+
+        metrics.incr('regex.cache_misses')
+        try:
+            compiled = re.compile(pattern, flags)
+        except re.error as e:
+            compiled = e
+        self._compiled[key] = compiled
+        if len(self._compiled) > self._cache_size:
+            self._compiled.popitem(last=False)
+        if isinstance(compiled, re.error):
+            raise compiled
+        return compiled
+
+    def is_linear(self, pattern, flags=0):
+        """正则表达式是否可以直接在事件循环中执行（带缓存）"""
+        key = (pattern, flags)
+        linear = self._linear.get(key)
+        if linear is None:
+            linear = is_linear(pattern, flags)
+            self._linear[key] = linear
+            if len(self._linear) > self._cache_size:
+                self._linear.popitem(last=False)
+        return linear
+
+    def is_quarantined(self, pattern):
+        entry = self._quarantine.get(pattern)
+        if entry is None:
+            return False
+        if time.time() - entry['time'] < self.quarantine_ttl:
+            return True
+        # 隔离到期，重新执行；再次超时会重新隔离
+        del self._quarantine[pattern]
+        metrics.incr('regex.quarantine_expired')
+        logger.info(f'正则表达式隔离已到期，恢复执行: {pattern}')
+        return False
+
+    def quarantined(self):
+        """隔离中的正则表达式及原因"""
+        for pattern in list(self._quarantine):
+            self.is_quarantined(pattern)
+        return dict(self._quarantine)
+
+    def release(self, pattern):
+        """解除隔离"""
+        return self._quarantine.pop(pattern, None) is not None
+
+    def set_reporter(self, reporter):
+        """
+        设置隔离通知的回调
+
+        Args:
+            reporter: 签名为 async reporter(text) 的协程函数
+        """
+        self._reporter = reporter
+
+    def _linear_engine(self, pattern, flags):
+        """返回可以直接执行的编译结果，没有则返回None"""
+        if self.is_linear(pattern, flags):
+            return self.compile(pattern, flags)
+        self.compile(pattern, flags)
+        if re2 is not None and not flags:
+            key = (pattern, 're2')
+            compiled = self._compiled.get(key)
+            if compiled is None:
+                try:
+                    compiled = re2.compile(pattern)
+                except Exception:
+                    # re2 不支持的写法（反向引用、环视等）
+                    compiled = False
+                self._compiled[key] = compiled
+                if len(self._compiled) > self._cache_size:
+                    self._compiled.popitem(last=False)
+            if compiled:
+                return compiled
+        return None
+
+    async def search(self, pattern, text, flags=0):
+        """
+        在时间预算内执行 search
+
+        Returns:
+            匹配结果（re.Match 或 RegexMatch），没有匹配、正则已隔离或超时返回None
+
+        Raises:
+            re.error: 正则表达式格式错误
+        """
+        if self.is_quarantined(pattern):
+            return None
+        compiled = self._linear_engine(pattern, flags)
+        if compiled is not None:
+            return compiled.search(text)
+        try:
+            return await self._offload('search', pattern, flags, text)
+        except RegexTimeout:
+            return None
+
+    async def sub(self, pattern, repl, text, flags=0):
+        """
+        在时间预算内执行 sub
+
+        Returns:
+            str: 替换后的文本，正则已隔离或超时返回原文本
+
+        Raises:
+            re.error: 正则表达式或替换内容格式错误
+        """
+        if self.is_quarantined(pattern):
+            return text
+        compiled = self._linear_engine(pattern, flags)
+        if compiled is not None:
+            return compiled.sub(repl, text)
+        try:
+            return await self._offload('sub', pattern, flags, text, repl)
+        except RegexTimeout:
+            return text
+
+    def start(self):
+        """
+        启动正则表达式子进程
+
+        子进程通过 fork 创建，应在进程启动时、事件循环和线程池开始工作之前调用，
+        避免在已有其他线程的进程中 fork
+        """
+        if self._workers is not None:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self._workers = [_RegexWorker(context) for _ in range(self._worker_count)]
+        self._idle = asyncio.Queue()
+        for worker in self._workers:
+            self._idle.put_nowait(worker)
+        logger.info(f'正则表达式子进程已启动: {self._worker_count} 个')
+
+    def _reset_after_fork(self):
+        """fork 出的子进程（如 RSS 服务）不能与父进程共用正则子进程和管道"""
+        self._workers = None
+        self._idle = None
+
+    async def _offload(self, op, pattern, flags, text, repl=None):
+        if self._workers is None:
+            # 没有在启动时调用 start 的进程（如独立运行的脚本）
+            self.start()
+        worker = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # 子进程空闲且管道中没有未读的回复时才能直接给下一个请求使用
+        clean = False
+        try:
+            worker.conn.send((op, pattern, flags, text, repl))
+            ready = await loop.run_in_executor(None, worker.conn.poll, self.timeout)
+            if not ready:
+                elapsed = time.perf_counter() - started
+                worker.restart()
+                clean = True
+                await self._quarantine_pattern(pattern, elapsed, len(text))
+                raise RegexTimeout(pattern)
+            status, result = worker.conn.recv()
+            clean = True
+        except (EOFError, OSError) as e:
+            # 子进程异常退出，重启后当作本次没有匹配
+            logger.error(f'正则表达式子进程异常: {str(e)}，正在重启')
+            raise RegexTimeout(pattern)
+        finally:
+            if not clean:
+                # 请求已经发出却没有读到回复（调用方被取消或子进程异常），
+                # 子进程可能仍在回溯，管道中也可能残留这次的回复
+                worker.restart()
+            self._idle.put_nowait(worker)
+            metrics.observe('regex.offload_time', time.perf_counter() - started)
+        if status == 'error':
+            raise re.error(result)
+        return result
+
+    async def _quarantine_pattern(self, pattern, elapsed, text_length):
+        self._quarantine[pattern] = {
+            'time': time.time(),
+            'elapsed': elapsed,
+            'text_length': text_length,
+        }
+        metrics.incr('regex.quarantined')
+        message = (
+            f'正则表达式执行超过 {self.timeout:g} 秒（文本长度 {text_length}），已被隔离 {self.quarantine_ttl:g} 秒，'
+            f'请修改或删除该正则，或使用 /regex_release 提前解除：\n{pattern}'
+        )
+        logger.warning(message)
+        if self._reporter:
+            try:
+                await self._reporter(message)
+            except Exception as e:
+                logger.error(f'发送正则隔离通知失败: {str(e)}')
+
+
+# 创建全局实例
+regex_service = RegexService()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=regex_service._reset_after_fork)
@@ -0,0 +1,198 @@
+import logging
+import re
+
+from managers.routing_index import routing_index
+from utils.regex_service import regex_service
+
+logger = logging.getLogger(__name__)
+
+# 全文替换的特殊规则
+FULL_REPLACE_PATTERN = '.*'
+
+# 正则元字符，模式中不包含这些字符时按普通字符串替换
+_REGEX_METACHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _is_literal(pattern):
+    return bool(pattern) and not (_REGEX_METACHARS & set(pattern))
+
+
+def _overlaps(a, b):
+    """两个字符串在文本中的出现位置是否可能重叠（包括包含关系）"""
+    if a in b or b in a:
+        return True
+    for size in range(1, min(len(a), len(b))):
+        if a[-size:] == b[:size] or b[-size:] == a[:size]:
+            return True
+    return False
+
+
+class _RegexStep:
+    def __init__(self, pattern, content):
+        self.pattern = pattern
+        self.content = content
+        self.regex = regex_service.compile(pattern)
+        # 可能回溯的正则通过 regex_service 在时间预算内执行
+        self.linear = regex_service.is_linear(pattern)
+
+    async def apply(self, text):
+        if self.linear:
+            return self.regex.sub(self.content, text)
+        return await regex_service.sub(self.pattern, self.content, text)
+
+    def describe(self):
+        return f'正则 "{self.pattern}" -> "{self.content}"'
+
+
+class _LiteralStep:
+    """
+    一组互不影响的普通字符串替换，一次扫描完成
+
+    组内的模式两两不会重叠，前面规则替换出的内容不包含后面模式的任何字符，
+    删除（替换为空）只能是组内最后一条，保证与逐条顺序替换的结果一致
+    """
+
+    def __init__(self):
+        self.replacements = {}
+        self.regex = None
+
+    def compile(self):
+        if len(self.replacements) > 1:
+            # 组内模式互不重叠，交替式的顺序不影响结果
+            self.regex = re.compile('|'.join(re.escape(p) for p in self.replacements))
+
+    def accepts(self, pattern, content):
+        """判断新的字符串替换能否加入本组"""
+        if not self.replacements:
+            return True
+        if any(content == '' for content in self.replacements.values()):
+            # 删除后两侧文本拼接可能产生新的匹配
+            return False
+        pattern_chars = set(pattern)
+        for existing_pattern, existing_content in self.replacements.items():
+            if pattern_chars & set(existing_content):
+                return False
+            if _overlaps(pattern, existing_pattern):
+                return False
+        return True
+
+    def add(self, pattern, content):
+        self.replacements[pattern] = content
+
+    async def apply(self, text):
+        if self.regex is None:
+            pattern, content = next(iter(self.replacements.items()))
+            return text.replace(pattern, content)
+        replacements = self.replacements
+        return self.regex.sub(lambda m: replacements[m.group(0)], text)
+
+    def describe(self):
+        return '字符串 ' + ', '.join(f'"{p}" -> "{c}"' for p, c in self.replacements.items())
+
+
+class ReplacePipeline:
+    """
+    编译好的替换规则流水线
+
+    与逐条执行 re.sub 的结果一致：
+    - 遇到 '.*' 规则时整段文本替换为其内容，不再执行其他规则
+    - 连续的、互不影响的普通字符串替换合并为一次扫描
+    - 其他规则预编译后按顺序执行，格式错误的规则编译时记录并跳过
+    """
+
+    def __init__(self, replace_rules):
+        self.full_replacement = None
+        self.steps = []
+        literal_group = None
+        for replace_rule in replace_rules:
+            pattern = replace_rule.pattern
+            content = replace_rule.content or ''
+            if pattern == FULL_REPLACE_PATTERN:
+                self.full_replacement = content
+                self.steps = []
+                break
+            if _is_literal(pattern) and '\\' not in content:
+                if literal_group is None or not literal_group.accepts(pattern, content):
+                    literal_group = _LiteralStep()
+                    self.steps.append(literal_group)
+                literal_group.add(pattern, content)
+                continue
+            literal_group = None
+            try:
+                self.steps.append(_RegexStep(pattern, content))
+            except re.error as e:
+                logger.error(f'替换规则格式错误: {pattern}, 错误: {str(e)}')
+        for step in self.steps:
+            if isinstance(step, _LiteralStep):
+                step.compile()
+
+    async def apply(self, text):
+        """
+        对文本执行所有替换
+
+        Returns:
+            str: 替换后的文本
+        """
+        if self.full_replacement is not None:
+            return self.full_replacement
+        for step in self.steps:
+            try:
+                text = await step.apply(text)
+            except re.error as e:
+                # 替换内容中的分组引用错误等
+                logger.error(f'替换规则格式错误: {step.describe()}, 错误: {str(e)}')
+        return text
+
+    def describe(self):
+        """流水线各步骤的说明"""
+        if self.full_replacement is not None:
+            return [f'全文替换 -> "{self.full_replacement}"']
+        return [step.describe() for step in self.steps]
+
+
+def _replace_signature(rule):
+    return tuple((r.pattern, r.content or '') for r in rule.replace_rules)
+
+
+class ReplacePipelineCache:
+    """
+    按规则快照版本缓存替换流水线
+
+    版本变化时重新检查替换规则，没有变化则继续使用原来的流水线
+    """
+
+    def __init__(self):
+        self._pipelines = {}
+
+    def get(self, rule):
+        version = getattr(rule, 'version', None)
+        if version is None:
+            return ReplacePipeline(rule.replace_rules)
+
+        cached = self._pipelines.get(rule.id)
+        if cached and cached[0] == version:
+            return cached[2]
+
+        signature = _replace_signature(rule)
+        if cached and cached[1] == signature:
+            pipeline = cached[2]
+        else:
+            pipeline = ReplacePipeline(rule.replace_rules)
+            logger.info(f"规则 {rule.id} 的替换规则已编译: {pipeline.describe()}")
+        self._pipelines[rule.id] = (version, signature, pipeline)
+        return pipeline
+
+    def prune(self, rule_ids, source_keys):
+        """删除已删除或停用的规则的流水线"""
+        for rule_id in [rule_id for rule_id in self._pipelines if rule_id not in rule_ids]:
+            del self._pipelines[rule_id]
+
+    def clear(self):
+        self._pipelines.clear()
+
+
+# 创建全局实例
+replace_pipelines = ReplacePipelineCache()
+
+# 路由索引重建后清理已删除的规则
+routing_index.add_listener(replace_pipelines.prune)
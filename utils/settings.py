@@ -6,6 +6,9 @@ from utils.file_creator import create_default_configs, AI_MODELS_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# AI模型配置文件路径
+AI_MODELS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'ai_models.json')
+
 def load_ai_models(type="list"):
     """
     加载AI模型配置
@@ -19,7 +22,7 @@ def load_ai_models(type="list"):
         根据type参数返回不同格式的模型配置
     """
     try:
-        models_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'ai_models.json')
+        models_path = AI_MODELS_PATH
         
         # 如果配置文件不存在，创建默认配置
         if not os.path.exists(models_path):